@@ -1,44 +1,250 @@
-from typing import Optional, Type
+import asyncio
+import logging
+import os
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import List, Optional, Type
 
 import pygame
 
-from scenes.abstract import AbstractScene
-from scenes.tank import TankScene
-from scenes.particles import ParticleScene
+from scenes.abstract import AbstractPymunkScene, AbstractScene
+from scenes.audit import Auditor, audit
+from scenes.capture import FrameCapture
+from scenes.dirty import DirtyRenderer
+from scenes.governor import Governor
+from scenes.input import InputSource, LiveInput, set_source
+from scenes.memory import report as memory_report
+from scenes.registry import DEFAULT_SCENE, SCENES, ScenePreloader, get_next_scene, get_scene_class
+
+log = logging.getLogger()
 
 
 class Game:
-    def __init__(self):
+    def __init__(
+        self,
+        res=(2300, 700),
+        fps: int = 60,
+        scene: Optional[str] = DEFAULT_SCENE,
+        dirty_rects: bool = False,
+        rewind: bool = False,
+    ):
+        """
+        :param scene: Registered scene whose assets are preloaded while the window opens,
+            None for scenes outside the registry
+        :param dirty_rects: Update only the parts of the display that changed, in the scenes that can tell
+        :param rewind: Take snapshots of the pymunk scenes to rewind them
+        """
         self.sc = None
-        self.res = (2300, 700)
+        self.res = res
         self.scene: Optional[AbstractScene] = None
+        self.scene_name = scene
+        self.seed: Optional[int] = None
         self.clock = pygame.time.Clock()
-        self.fps = 60
+        self.fps = fps
+        self.frame_times: List[float] = []
+        self.capture: Optional[FrameCapture] = None
+        self.preloader: Optional[ScenePreloader] = None
+        self.auditor: Optional[Auditor] = None
+        self.governor: Optional[Governor] = None
+        self.dirty_rects = dirty_rects
+        self.rewind = rewind
 
     def __enter__(self):
         pygame.init()
         pygame.mixer.init()
+        self.preloader = ScenePreloader()
+        if self.scene_name is not None:
+            self.preloader.request(self.scene_name)
         self.sc = pygame.display.set_mode(self.res)
         return self
 
     def __exit__(self, exc_class, exc_message, traceback_obj):
+        self.preloader.close()
         pygame.quit()
 
-    def load_scene(self, scene: Type[AbstractScene]):
-        self.scene = scene(self.sc, self.fps)
+    def load_scene(self, scene: Type[AbstractScene], seed: Optional[int] = None, **kwargs):
+        self.scene = scene(self.sc, self.fps, seed=seed, **kwargs)
+        self.seed = seed
+        if self.dirty_rects and isinstance(self.scene, AbstractPymunkScene):
+            self.scene.dirty_renderer = DirtyRenderer()
+        if self.rewind and isinstance(self.scene, AbstractPymunkScene):
+            self.scene.record_rewind()
+
+    def switch_scene(self, name: str, seed: Optional[int] = None, **kwargs):
+        """
+        Builds a registered scene and starts preloading the one that follows it, so that the next
+        switch doesn't have to decode anything.
+        """
+        self.preloader.request(name)
+        self.preloader.wait(name)
+        self.load_scene(get_scene_class(name), seed=seed, **kwargs)
+        self.scene_name = name
+        self.preloader.request(get_next_scene(name))
+
+    @staticmethod
+    def update_display(rects: Optional[List[pygame.Rect]]) -> None:
+        """
+        :param rects: Changed areas as returned by the scene's render, None for the whole display
+        """
+        if rects is None:
+            pygame.display.update()
+        else:
+            pygame.display.update(rects)
 
-    def run(self):
+    def run(self, source: Optional[InputSource] = None):
+        """
+        :param source: Where the input comes from. Sources that are not realtime (replays)
+            run without waiting for the frame clock.
+        """
+        source = source or LiveInput()
+        set_source(source)
+        fps = self.fps if source.realtime else 0
         while True:
-            for event in pygame.event.get():
+            start = perf_counter()
+            for event in source.poll():
                 if event.type == pygame.QUIT:
                     return
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_TAB and self.scene_name is not None:
+                    self.switch_scene(get_next_scene(self.scene_name), seed=self.seed)
+                    continue
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F2:
+                    # Asked for with a key, so shown at the default level
+                    log.warning("Memory of %s:\n%s", type(self.scene).__name__, memory_report(self.scene))
+                    continue
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3 and hasattr(self.scene, "space"):
+                    log.warning(self.auditor.report() if self.auditor else audit(self.scene).report())
+                    continue
                 self.scene.handle_event(event)
             self.scene.update()
-            self.scene.render()
-            pygame.display.update()
-            self.clock.tick(self.fps)
+            if self.auditor:
+                self.auditor.update(self.scene)
+            rects = self.scene.render()
+            if self.capture:
+                self.capture.capture(self.sc)
+            self.update_display(rects)
+            self.frame_times.append(perf_counter() - start)
+            if self.governor:
+                self.governor.update(self.scene, self.frame_times[-1])
+            self.clock.tick(fps)
+
+    async def serve(self, server, source: Optional[InputSource] = None):
+        """
+        The same loop as `run`, driven by asyncio so that the server receives the client input
+        between the frames. The server replicates the scene after every update.
+        """
+        source = source or LiveInput()
+        set_source(source)
+        await server.start()
+        try:
+            while True:
+                start = perf_counter()
+                for event in source.poll():
+                    if event.type == pygame.QUIT:
+                        return
+                    self.scene.handle_event(event)
+                self.scene.update()
+                if self.auditor:
+                    self.auditor.update(self.scene)
+                server.tick()
+                rects = self.scene.render()
+                if self.capture:
+                    self.capture.capture(self.sc)
+                self.update_display(rects)
+                elapsed = perf_counter() - start
+                self.frame_times.append(elapsed)
+                await asyncio.sleep(max(1 / self.fps - elapsed, 0))
+        finally:
+            server.close()
+
+
+def main():
+    from scenes.replay import InputRecorder, InputReplay, ReplayHeader, save_trace
+
+    parser = ArgumentParser(description="Pygame tank")
+    parser.add_argument(
+        "--scene", choices=list(SCENES), default=DEFAULT_SCENE, help="scene to start with, tab switches to the next one"
+    )
+    parser.add_argument("--record", metavar="PATH", help="record the input of the session to a replay log")
+    parser.add_argument("--replay", metavar="PATH", help="replay a recorded log headless at maximum speed")
+    parser.add_argument("--trace", metavar="PATH", help="save the frame times of the run")
+    parser.add_argument("--seed", type=int, help="seed of the random generator")
+    parser.add_argument("--noise-seed", type=int, help="seed of the terrain noise")
+    parser.add_argument("--headless", action="store_true", help="use the dummy video and audio drivers")
+    parser.add_argument("--capture", metavar="PATH", help="record frames to a .raw file or a PNG directory")
+    parser.add_argument("--serve", metavar="PORT", type=int, help="host the scene for localhost clients")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="join a hosted scene")
+    parser.add_argument("--spectate", action="store_true", help="join without a tank")
+    parser.add_argument("--audit", action="store_true", help="compare the space with the scene every few seconds")
+    parser.add_argument(
+        "--fixed-quality", action="store_true", help="don't lower the quality when frames go over budget"
+    )
+    parser.add_argument("--log-level", default="WARNING", help="e.g. INFO to see the quality changes")
+    parser.add_argument(
+        "--rewind", action="store_true", help="keep snapshots to pause with backspace and scrub with [ and ]"
+    )
+    parser.add_argument(
+        "--dirty-rects", action="store_true", help="redraw and update only the parts of the display that changed"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    if args.serve is not None and args.scene not in ("tank", "battle"):
+        parser.error("only the tank scenes can be served")
+
+    if args.headless or args.replay:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    if args.connect:
+        from scenes.net import NetClientScene, StateClient
+
+        host, port = args.connect.rsplit(":", 1)
+        client = StateClient(host, int(port), player=not args.spectate)
+        with Game(scene=None) as g:
+            g.load_scene(NetClientScene, client=client)
+            try:
+                g.run()
+            finally:
+                client.close()
+        return
+
+    source: Optional[InputSource] = None
+    header: Optional[ReplayHeader] = None
+    if args.replay:
+        pygame.init()
+        source = InputReplay(args.replay)
+        header = source.header
+    else:
+        rng_seed = args.seed if args.seed is not None else random.randrange(2**63)
+        header = ReplayHeader(rng_seed, args.noise_seed, 60, (2300, 700))
+        if args.record:
+            source = InputRecorder(args.record, header)
+
+    random.seed(header.rng_seed)
+    with Game(header.size, header.fps, scene=args.scene, dirty_rects=args.dirty_rects, rewind=args.rewind) as g:
+        if args.audit:
+            g.auditor = Auditor()
+        # Recorded and replayed sessions must not depend on how fast the machine is
+        if not (args.fixed_quality or args.record or args.replay):
+            g.governor = Governor(header.fps)
+        g.switch_scene(args.scene, seed=header.noise_seed)
+        if args.capture:
+            g.capture = FrameCapture(args.capture, g.sc)
+        try:
+            if args.serve is not None:
+                from scenes.net import StateServer
+
+                asyncio.run(g.serve(StateServer(g.scene, port=args.serve), source))
+            else:
+                g.run(source)
+        finally:
+            if source is not None:
+                source.close()
+            if g.capture:
+                g.capture.close()
+        if args.trace:
+            save_trace(args.trace, g.frame_times)
 
 
-with Game() as g:
-    g.load_scene(TankScene)
-    g.run()
+if __name__ == "__main__":
+    main()
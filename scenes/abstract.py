@@ -1,19 +1,46 @@
 from abc import ABC
 from logging import getLogger
-from typing import Any, List
+from typing import Any, Dict, List, Optional, Tuple
 
+import pygame
 import pymunk
 from pygame.event import Event
 from pygame.surface import Surface
 
+from scenes.broadphase import BROADPHASE_TREE, Broadphase
+from scenes.camera import Camera
+from scenes.dirty import DirtyRenderer, Sprite, get_sprite
+from scenes.lifecycle import Bounds, Lifecycle, get_default_bounds
+from scenes.rewind import RewindBuffer
+from scenes.utils import ScreenTransform
+
 log = getLogger()
 
 
 class AbstractScene(ABC):
-    def __init__(self, display: Surface, fps: int) -> None:
+    lifecycle: Lifecycle
+
+    # Images and sounds the scene uses, decoded ahead of time by the scene preloader
+    assets: Tuple[str, ...] = ()
+
+    # Most entities of a type the scene keeps, see Lifecycle
+    budgets: Dict[type, int] = {}
+    # Entities of these types are despawned once they are further than world_margin from the view
+    despawn_types: Tuple[type, ...] = ()
+    world_margin: float = 500
+
+    def __init__(self, display: Surface, fps: int, seed: Optional[int] = None) -> None:
+        """
+        :param seed: Seed of the procedural content (e.g. terrain noise), the built-in default when None
+        """
         self.display: Surface = display
         self.size_sc: tuple = display.get_size()
         self.fps: int = fps
+        self.seed: Optional[int] = seed
+        self.lifecycle = Lifecycle(self.budgets, self.despawn_types)
+
+    def get_world_bounds(self) -> Bounds:
+        return get_default_bounds(*self.size_sc, self.world_margin)
 
     def handle_event(self, event: Event) -> None:
         raise NotImplementedError()
@@ -28,10 +55,24 @@ class AbstractScene(ABC):
 class AbstractPymunkScene(AbstractScene):
     space: pymunk.Space
     objects: List[Any]
-    camera_shift: pymunk.Vec2d
+    camera: Camera
+    rewind: RewindBuffer
+
+    # Snapshots for the rewind are taken once `record_rewind` was called
+    rewind_recording: bool = False
+    rewind_interval: int = 4
+    rewind_max_bytes: int = 32 * 1024 * 1024
+
+    # BROADPHASE_TREE or BROADPHASE_HASH, see Broadphase
+    broadphase_mode: str = BROADPHASE_TREE
+
+    background: Tuple[int, int, int] = (235, 146, 52)
+    # Redraws only what moved when set, see `render`
+    dirty_renderer: Optional[DirtyRenderer] = None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.broadphase = Broadphase(self.broadphase_mode)
         self.reset_scene()
 
     def handle_event(self, event: Event) -> None:
@@ -42,12 +83,99 @@ class AbstractPymunkScene(AbstractScene):
         self.space = pymunk.Space()
         self.space.gravity = 0, -1000  # Set the friction coefficient of the space object
         self.space.damping = 0.5
-        self.camera_shift = pymunk.Vec2d(0, 0)
+        self.broadphase.attach(self.space)
+        self.camera = self.create_camera()
+        self.rewind = RewindBuffer(
+            self.space,
+            self.get_rewind_state,
+            self.set_rewind_state,
+            self.fps,
+            recording=self.rewind_recording,
+            interval=self.rewind_interval,
+            max_bytes=self.rewind_max_bytes,
+        )
+
+    def create_camera(self) -> Camera:
+        return Camera(self.display.get_rect())
+
+    def get_entity_lists(self) -> List[List[Any]]:
+        """
+        The lists the lifecycle service despawns entities from.
+        """
+        return [self.objects]
+
+    def get_world_bounds(self) -> Bounds:
+        left, bottom, right, top = get_default_bounds(self.camera.get_visible_width(), 0, self.world_margin)
+        return left - self.camera_shift.x, bottom, right - self.camera_shift.x, top
+
+    @property
+    def camera_shift(self) -> pymunk.Vec2d:
+        return self.camera.shift
+
+    def get_rewind_state(self) -> Any:
+        return tuple(self.objects), self.camera.get_state()
+
+    def set_rewind_state(self, state: Any) -> None:
+        objects, camera = state
+        self.objects = list(objects)
+        self.camera.set_state(camera)
+
+    def record_rewind(self, enabled: bool = True) -> None:
+        """
+        Takes rewind snapshots from now on, also after the scene is reset.
+        """
+        self.rewind_recording = enabled
+        self.rewind.recording = enabled
+
+    def handle_rewind_event(self, event: Event) -> bool:
+        """
+        Backspace pauses and resumes the scene, the square brackets scrub through the stored snapshots.
+        """
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key == pygame.K_BACKSPACE:
+            self.rewind.toggle_pause()
+            return True
+        if event.key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+            self.rewind.scrub(-1 if event.key == pygame.K_LEFTBRACKET else 1)
+            return True
+        return False
 
     def update(self):
+        self.rewind.update()
+        self.broadphase.update()
         self.space.step(1 / self.fps)
+        self.lifecycle.update(self.get_entity_lists(), self.space, self.get_world_bounds())
 
-    def render(self):
-        self.display.fill((235, 146, 52))
+    def render(self) -> Optional[List[pygame.Rect]]:
+        """
+        :return: The areas of the display that changed, None for all of it
+        """
+        display = self.camera.get_surface(self.display)
+        if self.dirty_renderer is not None:
+            rects = self.dirty_renderer.render(
+                display, self.camera.get_transform(), self.get_static_key(), self.render_static, self.get_sprites
+            )
+            if rects is None:
+                return None
+            return [rect.move(self.camera.viewport.topleft) for rect in rects]
+        display.fill(self.background)
+        transform = self.camera.get_transform()
         for obj in self.objects:
-            obj.render(self.display, self.camera_shift)
+            obj.render(display, transform)
+        return None
+
+    def get_static_key(self) -> Any:
+        """
+        Changes whenever the static layer drawn by `render_static` changes, besides the camera.
+        """
+        return None
+
+    def render_static(self, display: Surface, t: ScreenTransform) -> None:
+        display.fill(self.background)
+
+    def get_sprites(self, t: ScreenTransform) -> List[Sprite]:
+        """
+        What isn't on the static layer, see `DirtyRenderer`.
+        """
+        return [get_sprite(obj, t) for obj in self.objects]
@@ -0,0 +1,102 @@
+import hashlib
+import mmap
+import os
+from logging import getLogger
+from typing import Tuple
+
+import pygame
+from pygame.mixer import Sound
+
+log = getLogger()
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "audio")
+SOUND_EXTENSIONS = (".mp3", ".flac", ".wav", ".ogg")
+
+
+def get_cache_path(path: str, settings: Tuple[int, int, int], cache_dir: str = CACHE_DIR) -> str:
+    """
+    The cache file name depends on the content of the source file and on the mixer format,
+    so an edited asset or a different mixer never picks up stale samples.
+    """
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    frequency, size, channels = settings
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}-{digest}-{frequency}-{size}-{channels}.pcm")
+
+
+def read_sound(cache_path: str) -> Sound:
+    with open(cache_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return Sound(buffer=buffer)
+
+
+def write_sound(cache_path: str, sound: Sound) -> None:
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(sound.get_raw())
+    os.replace(tmp_path, cache_path)
+
+
+def load_cached_sound(path: str, cache_dir: str = CACHE_DIR) -> Sound:
+    """
+    Loads a sound from the PCM cache, decoding the source file and filling the cache on a miss.
+    """
+    cache_path = get_cache_path(path, pygame.mixer.get_init(), cache_dir)
+    if os.path.exists(cache_path) and os.path.getsize(cache_path) > 0:
+        return read_sound(cache_path)
+    sound = Sound(path)
+    try:
+        write_sound(cache_path, sound)
+    except OSError as e:
+        log.warning(f"Can't write the audio cache {cache_path}: {e}")
+    return sound
+
+
+def build_cache(assets_dir: str = "./scenes/assets", cache_dir: str = CACHE_DIR) -> int:
+    count = 0
+    for name in sorted(os.listdir(assets_dir)):
+        if name.lower().endswith(SOUND_EXTENSIONS):
+            load_cached_sound(os.path.join(assets_dir, name), cache_dir)
+            count += 1
+    return count
+
+
+def measure_startup(assets_dir: str = "./scenes/assets") -> None:
+    import shutil
+    import tempfile
+    from time import perf_counter
+
+    paths = [
+        os.path.join(assets_dir, n) for n in sorted(os.listdir(assets_dir)) if n.lower().endswith(SOUND_EXTENSIONS)
+    ]
+    cache_dir = tempfile.mkdtemp(prefix="audio-cache-")
+    try:
+        start = perf_counter()
+        for path in paths:
+            Sound(path)
+        decode_time = perf_counter() - start
+
+        start = perf_counter()
+        build_cache(assets_dir, cache_dir)
+        build_time = perf_counter() - start
+
+        start = perf_counter()
+        for path in paths:
+            load_cached_sound(path, cache_dir)
+        cached_time = perf_counter() - start
+    finally:
+        shutil.rmtree(cache_dir)
+
+    print(f"{len(paths)} sounds, mixer {pygame.mixer.get_init()}")
+    print(f"decode without cache: {decode_time * 1000:8.1f} ms")
+    print(f"decode and build:     {build_time * 1000:8.1f} ms")
+    print(f"load from cache:      {cached_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.mixer.init()
+    measure_startup()
+    pygame.mixer.quit()
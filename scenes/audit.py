@@ -0,0 +1,229 @@
+import os
+import tracemalloc
+from collections import Counter, deque
+from logging import getLogger
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from pymunk import Body, Constraint, Shape, Space
+
+from scenes.abstract import AbstractScene
+from scenes.bundle import ROOT
+from scenes.memory import SKIPPED_TYPES
+from scenes.rewind import RewindBuffer
+
+log = getLogger()
+
+# Frames between two audits
+AUDIT_INTERVAL = 300
+# A count that went up in this many audits in a row is reported as growing
+GROWTH_AUDITS = 5
+# Frames of the creation traceback kept by tracemalloc, enough to get past the component classes
+TRACE_FRAMES = 16
+# Lines of the repository shown per creation site
+SITE_FRAMES = 2
+# Holds old bodies on purpose, walking it would mark everything as tracked
+NOT_WALKED = SKIPPED_TYPES + (AbstractScene, RewindBuffer)
+
+PYMUNK_TYPES = (Body, Shape, Constraint)
+# Attributes that hold the chipmunk struct of each pymunk type
+HANDLES = ((Body, "_body"), (Shape, "_shape"), (Constraint, "_constraint"))
+
+
+def get_entity_lists(scene: Any) -> List[List[Any]]:
+    return scene.get_entity_lists() if hasattr(scene, "get_entity_lists") else []
+
+
+def get_tracked(scene: Any) -> Set[Any]:
+    """
+    The bodies, shapes and constraints reachable from the entities and the attributes of the
+    scene, without descending into the pymunk objects themselves.
+    """
+    found: Set[Any] = set()
+    seen: Set[int] = set()
+    stack: List[Any] = list(get_entity_lists(scene))
+    stack.extend(vars(scene).values())
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, NOT_WALKED):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, PYMUNK_TYPES):
+            found.add(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, "__dict__"):
+                stack.extend(vars(obj).values())
+            for cls in type(obj).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    if name != "__weakref__" and hasattr(obj, name):
+                        stack.append(getattr(obj, name))
+    return found
+
+
+def get_creation_site(obj: Any) -> str:
+    """
+    The innermost SITE_FRAMES lines of the repository that led to the object, e.g. the component
+    that created it and the scene code that created the component. "?" when tracemalloc was not
+    tracing at the time.
+    """
+    for cls, name in HANDLES:
+        if isinstance(obj, cls):
+            obj = getattr(obj, name, obj)
+            break
+    traceback = tracemalloc.get_object_traceback(obj)
+    if traceback is None:
+        return "?"
+    lines = [
+        f"{os.path.relpath(frame.filename, ROOT)}:{frame.lineno}"
+        for frame in reversed(traceback)
+        if frame.filename.startswith(ROOT) and "site-packages" not in frame.filename
+    ]
+    return " < ".join(lines[:SITE_FRAMES]) or f"{traceback[-1].filename}:{traceback[-1].lineno}"
+
+
+class Audit:
+    """
+    The differences between the space of a scene and what the scene tracks. Orphans are bodies,
+    shapes and constraints in the space that no entity references; a shape of a tracked body and a
+    constraint between tracked bodies count as tracked. Missing bodies belong to entities in the
+    entity lists but are not in the space.
+    """
+
+    def __init__(self, space: Space, tracked: Set[Any], entities: List[Any]) -> None:
+        bodies, shapes, constraints = space.bodies, space.shapes, space.constraints
+        self.counts = {"bodies": len(bodies), "shapes": len(shapes), "constraints": len(constraints)}
+        static = space.static_body
+        orphans: List[Any] = [b for b in bodies if b not in tracked]
+        orphans.extend(s for s in shapes if s not in tracked and s.body not in tracked and s.body is not static)
+        orphans.extend(
+            c for c in constraints if c not in tracked and not all(b in tracked or b is static for b in (c.a, c.b))
+        )
+        # type and creation site of the orphans
+        self.orphans: Counter = Counter((type(o).__name__, get_creation_site(o)) for o in orphans)
+        self.missing: Counter = Counter(
+            type(entity).__name__
+            for entity in entities
+            if isinstance(getattr(entity, "body", None), Body) and entity.body.space is not space
+        )
+
+    def get_totals(self) -> Dict[str, int]:
+        """
+        :return: The counts of the space together with the orphans and missing bodies of every type
+        """
+        totals = dict(self.counts)
+        for (name, _), n in self.orphans.items():
+            key = f"orphan {name}"
+            totals[key] = totals.get(key, 0) + n
+        totals.update((f"missing {name}", n) for name, n in self.missing.items())
+        return totals
+
+    def report(self) -> str:
+        lines = [", ".join(f"{n} {name}" for name, n in self.counts.items())]
+        lines.extend(
+            f"  orphan {name:16s} x{n:5d} created at {site}"
+            for (name, site), n in sorted(self.orphans.items(), key=lambda item: -item[1])
+        )
+        lines.extend(f"  missing {name:15s} x{n:5d} not in the space" for name, n in self.missing.most_common())
+        if len(lines) == 1:
+            lines.append("  the space matches the scene")
+        return "\n".join(lines)
+
+
+def audit(scene: Any) -> Audit:
+    entities = [entity for entities in get_entity_lists(scene) for entity in entities]
+    return Audit(scene.space, get_tracked(scene), entities)
+
+
+class Auditor:
+    """
+    Audits a scene every `interval` frames, logs the orphans and the counts that keep growing over
+    the last GROWTH_AUDITS audits, which is what a leak looks like during a soak run.
+
+    :param trace: Start tracemalloc, so that orphans are reported with the line that created them.
+        Objects created before that have no creation site.
+    """
+
+    def __init__(self, interval: int = AUDIT_INTERVAL, trace: bool = True) -> None:
+        self.interval = interval
+        self.frame = 0
+        self.last: Optional[Audit] = None
+        self.history: Deque[Dict[str, int]] = deque(maxlen=GROWTH_AUDITS + 1)
+        self.scene: Any = None
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def get_growing(self) -> List[Tuple[str, int, int]]:
+        """
+        :return: Name, first and last value of the counts that went up in every one of the last audits
+        """
+        if len(self.history) <= GROWTH_AUDITS:
+            return []
+        history = list(self.history)
+        growing = []
+        for name in history[-1]:
+            values = [totals.get(name, 0) for totals in history]
+            if all(a < b for a, b in zip(values, values[1:])):
+                growing.append((name, values[0], values[-1]))
+        return growing
+
+    def update(self, scene: Any) -> Optional[Audit]:
+        if scene is not self.scene:
+            # Counts of another scene don't compare
+            self.scene = scene
+            self.history.clear()
+            self.frame = 0
+        self.frame += 1
+        if self.frame % self.interval:
+            return None
+        self.last = audit(scene)
+        self.history.append(self.last.get_totals())
+        if self.last.orphans or self.last.missing:
+            log.warning(f"Audit of {type(scene).__name__}: {self.last.report()}")
+        for name, first, last in self.get_growing():
+            log.warning(f"{type(scene).__name__}: {name} grew from {first} to {last} over {GROWTH_AUDITS} audits")
+        return self.last
+
+    def report(self) -> str:
+        if self.last is None:
+            return "No audit yet"
+        growing = "".join(f"\n  {name} grows: {first} -> {last}" for name, first, last in self.get_growing())
+        return f"Audit of {type(self.scene).__name__} at frame {self.frame}: {self.last.report()}{growing}"
+
+
+def soak(seconds: float = 60, fps: int = 60) -> None:
+    """
+    Plays the scenes with a steady stream of clicks and shots, audits them and prints the last
+    audit of each.
+    """
+    import pygame
+    from pygame.event import Event
+
+    from scenes.registry import SCENES, get_scene_class
+
+    pygame.init()
+    display = pygame.display.set_mode((2300, 700))
+    auditor = Auditor(interval=fps * 5)
+    for name in SCENES:
+        scene = get_scene_class(name)(display, fps)
+        for frame in range(int(seconds * fps)):
+            if frame % 20 == 0:
+                scene.handle_event(Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+            if frame % 5 == 0:
+                pos = (200 + frame * 37 % 1800, 100)
+                scene.handle_event(Event(pygame.MOUSEBUTTONDOWN, button=1, pos=pos))
+            scene.update()
+            auditor.update(scene)
+        print(auditor.report())
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    import sys
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    soak(float(sys.argv[1]) if len(sys.argv) > 1 else 60)
@@ -0,0 +1,317 @@
+import os
+import random
+import signal
+from logging import getLogger
+from multiprocessing import Pool, cpu_count
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pygame
+from pygame.surface import Surface
+from pymunk import Vec2d
+
+from scenes.bundle import ROOT
+from scenes.components.bullet import Bullet, use_swept_collision
+from scenes.components.tank import GUN_MAX_ANGLE, Tank
+from scenes.utils import ScreenTransform, to_transform
+
+log = getLogger()
+
+FIRING_TABLE_PATH = os.path.join(ROOT, ".cache", "firing_table.npz")
+FPS = 60
+# Frames for the tank to land and the gun to reach its angle before the shot
+SETTLE_FRAMES = 90
+# A shot that hasn't hit anything after this many frames counts as a miss
+MAX_FLIGHT_FRAMES = 600
+# Terrain generated to the right of the tank before the shot, so long shots land on the ground
+SWEEP_REACH = 6000
+
+# A shot counts as a miss when it explodes deeper than one brick under the ground, it went
+# through the top bricks before the collision was found, or when it never explodes
+MISS_DEPTH = 5
+
+# seed, spawn x, gun angle
+Run = Tuple[int, float, float]
+# impact x, impact y, tank pitch, flight frames
+RunResult = Tuple[float, float, float, int]
+
+
+def set_gun_angle(tank: Tank, angle: float) -> None:
+    """
+    Holds the gun at an angle to the turret, within the range the player can reach.
+    """
+    angle = min(max(angle, 0), GUN_MAX_ANGLE)
+    tank.gun_joint.min = tank.gun_joint.max = angle
+
+
+_display: Optional[Surface] = None
+
+
+def init_worker() -> None:
+    global _display
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.display.init()
+    _display = pygame.display.set_mode((2300, 700))
+    # SDL turns SIGTERM into a quit event, the pool stops its workers with it
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def prepare_shot(seed: int, x: float, angle: float) -> Any:
+    """
+    A fresh headless tank scene with the tank settled at `x`, its gun at `angle` and the terrain
+    generated far enough for the shot.
+    """
+    from scenes.components.controller import ScriptedController
+    from scenes.tank import TankScene
+
+    random.seed(seed)
+    scene = TankScene(_display, FPS, seed=seed)
+    tank = scene.tank
+    tank.controller = ScriptedController([], loop=False)
+    offset = Vec2d(x - tank.tank_base.body.position.x, 0)
+    for body in tank.get_bodies():
+        body.position += offset
+    set_gun_angle(tank, angle)
+    # The view starts a bit behind the tank, so the columns under it are kept
+    view = Vec2d(-(x - 500), 0)
+    while scene.floor.bricks[-1].top_brick.body.position.x < x + SWEEP_REACH:
+        scene.floor.update(view, SWEEP_REACH + 500)
+    for _ in range(SETTLE_FRAMES):
+        scene.update()
+    return scene
+
+
+def fly(scene: Any, bullet: Bullet) -> int:
+    """
+    :return: Frames until the bullet exploded, 0 when it left the world or flew too long
+    """
+    scene.objects.append(bullet)
+    for frame in range(1, MAX_FLIGHT_FRAMES + 1):
+        scene.update()
+        if bullet not in scene.objects:
+            return frame if bullet._exploded else 0
+    return 0
+
+
+def simulate(run: Run) -> RunResult:
+    """
+    Fires one shot from a fresh headless tank scene and returns where the bullet exploded,
+    NaN when it missed.
+    """
+    scene = prepare_shot(*run)
+    tank = scene.tank
+    pitch = tank.tank_base.body.angle
+    bullet = tank.shot()
+    frames = fly(scene, bullet)
+    if frames:
+        impact = bullet.body.position
+        return impact.x, impact.y, pitch, frames
+    return np.nan, np.nan, pitch, MAX_FLIGHT_FRAMES
+
+
+def get_impact_depth(scene: Any, bullet: Bullet, tops: np.ndarray) -> float:
+    """
+    :param tops: Tops of the terrain columns before the shot, the explosion takes some away
+    :return: Distance of the lowest point of the bullet below the highest column under it
+    """
+    floor = scene.floor
+    x, y = bullet.body.position
+    r = bullet.shape.radius
+    left = floor.bricks[0].top_brick.shape.bb.left
+    first, last = int((x - r - left) // floor.step), int((x + r - left) // floor.step)
+    return float(tops[max(first, 0) : max(last + 1, 1)].max()) - (y - r)
+
+
+def count_misses(
+    seeds: Sequence[int] = (0, 1, 2),
+    positions: Sequence[float] = (400, 1000, 1600),
+    angles: Sequence[float] = tuple(np.linspace(0, GUN_MAX_ANGLE, 12).tolist()),
+) -> None:
+    """
+    Fires a grid of shots with and without the swept collision of the bullets and prints how many
+    of them missed, see MISS_DEPTH, and the cost of their flight.
+    """
+    from time import perf_counter
+
+    init_worker()
+    for swept in (False, True):
+        use_swept_collision(swept)
+        depths: List[float] = []
+        elapsed = 0.0
+        flight_frames = 0
+        for seed in seeds:
+            for x in positions:
+                for angle in angles:
+                    scene = prepare_shot(seed, x, angle)
+                    tops = scene.floor.get_column_tops()[1].copy()
+                    bullet = scene.tank.shot()
+                    start = perf_counter()
+                    frames = fly(scene, bullet)
+                    elapsed += perf_counter() - start
+                    flight_frames += frames or MAX_FLIGHT_FRAMES
+                    depths.append(get_impact_depth(scene, bullet, tops) if frames else np.inf)
+        misses = sum(depth > MISS_DEPTH for depth in depths)
+        hits = [depth for depth in depths if depth != np.inf]
+        print(
+            f"{'swept' if swept else 'stepped':7s}: {misses} of {len(depths)} shots missed, impact depth mean "
+            f"{np.mean(hits):4.1f} px, max {np.max(hits):4.1f} px, {elapsed / flight_frames * 1000:.2f} ms per frame"
+        )
+    use_swept_collision(True)
+
+
+class FiringTable:
+    """
+    Impact points of shots over a grid of terrain seeds, tank positions and gun angles, as
+    computed by `sweep`. Lookups interpolate between the angles of the nearest tank position.
+    """
+
+    def __init__(
+        self,
+        seeds: np.ndarray,
+        positions: np.ndarray,
+        angles: np.ndarray,
+        impacts: np.ndarray,
+        pitches: np.ndarray,
+        frames: np.ndarray,
+    ) -> None:
+        self.seeds, self.positions, self.angles = seeds, positions, angles
+        # (seeds, positions, angles, 2)
+        self.impacts = impacts
+        # (seeds, positions)
+        self.pitches = pitches
+        # (seeds, positions, angles)
+        self.frames = frames
+
+    @classmethod
+    def load(cls, path: str = FIRING_TABLE_PATH) -> "FiringTable":
+        with np.load(path) as data:
+            return cls(*(data[name] for name in ("seeds", "positions", "angles", "impacts", "pitches", "frames")))
+
+    def save(self, path: str = FIRING_TABLE_PATH) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez_compressed(
+            path,
+            seeds=self.seeds,
+            positions=self.positions,
+            angles=self.angles,
+            impacts=self.impacts,
+            pitches=self.pitches,
+            frames=self.frames,
+        )
+
+    def predict(self, seed: Optional[int], x: float, angle: float) -> Optional[Vec2d]:
+        """
+        :return: Impact point of a shot from a tank at `x` with its gun at `angle` to the turret,
+            None for terrain or a tank position that is not in the table or a shot that misses
+        """
+        matches = np.flatnonzero(self.seeds == seed) if seed is not None else ()
+        if not len(matches):
+            return None
+        # A tank more than half a grid step past the swept positions stands on terrain the table never saw
+        half_step = np.diff(self.positions).max() / 2 if len(self.positions) > 1 else 0
+        if not self.positions.min() - half_step <= x <= self.positions.max() + half_step:
+            return None
+        position = np.abs(self.positions - x).argmin()
+        impacts = self.impacts[matches[0], position]
+        hits = ~np.isnan(impacts[:, 0])
+        if hits.sum() < 2 or not self.angles[hits][0] <= angle <= self.angles[hits][-1]:
+            return None
+        # Shots are relative to the tank position they were fired from
+        dx = np.interp(angle, self.angles[hits], impacts[hits, 0]) - self.positions[position]
+        y = np.interp(angle, self.angles[hits], impacts[hits, 1])
+        return Vec2d(x + dx, y)
+
+
+def sweep(
+    seeds: Sequence[int], positions: Sequence[float], angles: Sequence[float], processes: Optional[int] = None
+) -> FiringTable:
+    """
+    Simulates every combination on a process pool, one headless scene per shot.
+    """
+    runs: List[Run] = [(seed, x, angle) for seed in seeds for x in positions for angle in angles]
+    with Pool(processes or cpu_count(), initializer=init_worker) as pool:
+        results = np.array(pool.map(simulate, runs, chunksize=4), dtype=np.float64)
+    shape = (len(seeds), len(positions), len(angles))
+    return FiringTable(
+        np.array(seeds, dtype=np.int64),
+        np.array(positions, dtype=np.float32),
+        np.array(angles, dtype=np.float32),
+        results[:, :2].reshape(*shape, 2).astype(np.float32),
+        results[:, 2].reshape(shape)[:, :, 0].astype(np.float32),
+        results[:, 3].reshape(shape).astype(np.int16),
+    )
+
+
+class AimAssist:
+    """
+    Marks where the player's current shot would land, looked up in the firing table.
+    """
+
+    def __init__(self, table: FiringTable, tank: Tank, seed: Optional[int]) -> None:
+        self.table = table
+        self.tank = tank
+        self.seed = seed
+        self.enabled = False
+
+    def render(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> pygame.Rect:
+        if not self.enabled:
+            return pygame.Rect(0, 0, 0, 0)
+        impact = self.table.predict(self.seed, self.tank.tank_base.body.position.x, self.tank.get_gun_angle())
+        if impact is None:
+            return pygame.Rect(0, 0, 0, 0)
+        t = to_transform(display, camera_shift)
+        x, y = t.point(impact)
+        area = pygame.draw.circle(display, (255, 255, 255), (x, y), 12 * t.scale, 2)
+        return area.union(pygame.draw.line(display, (255, 255, 255), (x, y - 20 * t.scale), (x, y + 20 * t.scale), 2))
+
+
+_table: Optional[FiringTable] = None
+_table_checked = False
+
+
+def load_firing_table() -> Optional[FiringTable]:
+    """
+    The firing table of this process, None until `python -m scenes.ballistics` has written one.
+    """
+    global _table, _table_checked
+    if not _table_checked:
+        _table_checked = True
+        if os.path.exists(FIRING_TABLE_PATH):
+            try:
+                _table = FiringTable.load()
+            except (OSError, ValueError, KeyError) as e:
+                log.warning(f"Can't load the firing table: {e}")
+    return _table
+
+
+def main(seeds: Iterable[int] = (0, 1, 2, 3), processes: Optional[int] = None) -> None:
+    from time import perf_counter
+
+    seeds = list(seeds)
+    positions = np.linspace(300, 1900, 9).tolist()
+    angles = np.linspace(0, GUN_MAX_ANGLE, 11).tolist()
+    start = perf_counter()
+    table = sweep(seeds, positions, angles, processes)
+    elapsed = perf_counter() - start
+    table.save()
+    runs = table.frames.size
+    misses = int(np.isnan(table.impacts[..., 0]).sum())
+    print(
+        f"{runs} shots on {processes or cpu_count()} processes in {elapsed:.1f} s "
+        f"({elapsed / runs * 1000:.0f} ms per shot), {misses} misses, "
+        f"{os.path.getsize(FIRING_TABLE_PATH) / 1024:.1f} KiB written to {FIRING_TABLE_PATH}"
+    )
+    start = perf_counter()
+    for _ in range(1000):
+        table.predict(seeds[0], 1000, GUN_MAX_ANGLE / 2)
+    print(f"lookup {(perf_counter() - start) * 1000:.1f} us")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["misses"]:
+        count_misses()
+    else:
+        main([int(seed) for seed in sys.argv[1:]] or (0, 1, 2, 3))
@@ -0,0 +1,121 @@
+from time import perf_counter
+from typing import Any, Optional, Sequence
+
+from pymunk import Vec2d
+
+from scenes.components.controller import AIController, Controller
+from scenes.components.fleet import PROXY_MARGIN, AnyTank, TankFleet
+from scenes.components.tank import Tank
+from scenes.components.terrain import Terrain
+from scenes.tank import TankScene
+
+
+class BattleScene(TankScene):
+    """
+    The tank scene with a fleet of AI-driven tanks next to the player's one. The AI tanks far
+    from the camera are simulated as proxies.
+
+    :param proxy_margin: See `TankFleet`, None simulates every tank in full
+    """
+
+    tank_count: int
+    spacing: int = 300
+    fleet: TankFleet
+
+    def __init__(self, *args, tank_count: int = 24, proxy_margin: Optional[float] = PROXY_MARGIN, **kwargs):
+        self.tank_count = tank_count
+        self.proxy_margin = proxy_margin
+        super().__init__(*args, **kwargs)
+
+    def reset_scene(self):
+        super().reset_scene()
+        self.fleet = TankFleet(self.floor, self.proxy_margin)
+        self.fleet.add(self.tank, pinned=True)
+        for i in range(1, self.tank_count):
+            controller = AIController(self.get_player_x, seed=i)
+            tank = Tank(
+                250 + i * self.spacing,
+                360,
+                self.space,
+                controller=controller,
+                group=next(self.groups),
+                engine_sound=False,
+            )
+            self.fleet.add(tank)
+        self.objects.remove(self.tank)
+        self.objects.insert(0, self.fleet)
+
+    def create_terrain(self) -> Terrain:
+        width = max(self.display.get_width(), 250 + self.tank_count * self.spacing)
+        return Terrain(Vec2d(0, 0), Vec2d(width, 0), 100, 300, self.space, seed=self.seed)
+
+    def get_tanks(self) -> Sequence[AnyTank]:
+        return self.fleet.tanks
+
+    def add_tank(self, controller: Controller) -> Tank:
+        x = self.get_player_x() + 300
+        tank = Tank(x, 360, self.space, controller=controller, group=next(self.groups), engine_sound=False)
+        # The caller may hold on to the bodies of the tank
+        return self.fleet.add(tank, pinned=True)
+
+    def get_rewind_state(self) -> Any:
+        # Swaps replace the tanks of the fleet
+        return tuple(self.fleet.tanks), super().get_rewind_state()
+
+    def set_rewind_state(self, state: Any) -> None:
+        tanks, base = state
+        self.fleet.tanks = list(tanks)
+        super().set_rewind_state(base)
+
+    def get_player_x(self) -> float:
+        return self.tank.tank_base.body.position.x
+
+    def update_tanks(self):
+        left = -self.camera_shift.x
+        self.fleet.update_detail(left, left + self.camera.get_visible_width())
+        for tank, command in zip(self.fleet, self.fleet.update()):
+            if command.fire:
+                self.fire(tank)
+
+    def fire(self, tank: AnyTank) -> None:
+        if tank is self.tank:
+            super().fire(tank)
+            return
+        self.objects.append(tank.shot())
+
+
+def benchmark(counts=(1, 8, 16, 32, 64), frames: int = 120) -> None:
+    import pygame
+
+    from scenes.components.proxy_tank import ProxyTank
+
+    pygame.init()
+    pygame.mixer.init()
+    display = pygame.display.set_mode((2300, 700))
+    for count, proxy_margin in ((count, margin) for count in counts for margin in (None, PROXY_MARGIN)):
+        scene = BattleScene(display, 60, tank_count=count, proxy_margin=proxy_margin)
+        # Settles the swaps of the tanks that start far from the camera
+        for _ in range(count):
+            scene.update()
+        update_time = render_time = 0.0
+        for _ in range(frames):
+            start = perf_counter()
+            scene.update()
+            update_time += perf_counter() - start
+            start = perf_counter()
+            scene.render()
+            render_time += perf_counter() - start
+        proxies = sum(isinstance(tank, ProxyTank) for tank in scene.fleet)
+        print(
+            f"{count:4d} tanks, {proxies:3d} proxies: update {update_time / frames * 1000:7.2f} ms, "
+            f"render {render_time / frames * 1000:7.2f} ms, {len(scene.space.bodies)} bodies"
+        )
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    import os
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    benchmark()
@@ -0,0 +1,146 @@
+from logging import getLogger
+from typing import Optional, Tuple
+
+from pymunk import Body, Space
+
+log = getLogger()
+
+BROADPHASE_TREE = "tree"
+BROADPHASE_HASH = "hash"
+
+# Cell size relative to the mean size of the moving shapes, and its limits
+CELL_SIZE_FACTOR = 2.5
+MIN_CELL_SIZE = 8.0
+MAX_CELL_SIZE = 256.0
+# Suggested cells per shape, chipmunk recommends about 10
+CELLS_PER_SHAPE = 10
+# Frames between looks at the shape statistics
+CHECK_INTERVAL = 60
+# The hash is re-tuned when the shape count or the cell size estimate changes by this factor
+RETUNE_RATIO = 1.5
+
+
+def get_shape_stats(space: Space) -> Tuple[int, float]:
+    """
+    :return: Number of shapes in the space and the mean bounding box size (larger side) of the
+        shapes on moving bodies. Static shapes are indexed once, so only the moving ones are
+        looked up every step.
+    """
+    total = size = 0.0
+    for body in space.bodies:
+        if body.body_type == Body.STATIC:
+            continue
+        for shape in body.shapes:
+            bb = shape.bb
+            size += max(bb.right - bb.left, bb.top - bb.bottom)
+            total += 1
+    return len(space.shapes), size / total if total else MIN_CELL_SIZE
+
+
+def get_cell_size(mean_size: float) -> float:
+    return min(max(mean_size * CELL_SIZE_FACTOR, MIN_CELL_SIZE), MAX_CELL_SIZE)
+
+
+class Broadphase:
+    """
+    Chooses the broadphase of a space. The default bounding box tree needs no tuning, the spatial
+    hash suits spaces full of similarly sized shapes and is sized from the shapes in the space:
+    the cell size follows the mean size of the moving shapes and the cell count the shape count.
+    Both are measured again every CHECK_INTERVAL frames and the hash is rebuilt when they drift.
+
+    :param mode: BROADPHASE_TREE or BROADPHASE_HASH
+    """
+
+    def __init__(self, mode: str = BROADPHASE_TREE) -> None:
+        if mode not in (BROADPHASE_TREE, BROADPHASE_HASH):
+            raise ValueError(f"Unknown broadphase {mode!r}, expected {BROADPHASE_TREE!r} or {BROADPHASE_HASH!r}")
+        self.mode = mode
+        self.space: Optional[Space] = None
+        self.frame = 0
+        self.shape_count = 0
+        self.cell_size = 0.0
+        self.retunes = 0
+
+    def attach(self, space: Space) -> None:
+        """
+        Called with every new space of the scene. The hash is tuned on the first update, once the
+        scene has filled the space.
+        """
+        self.space = space
+        self.frame = 0
+        self.shape_count = 0
+
+    def tune(self) -> None:
+        shape_count, mean_size = get_shape_stats(self.space)
+        self.shape_count = max(shape_count, 1)
+        self.cell_size = get_cell_size(mean_size)
+        self.space.use_spatial_hash(self.cell_size, self.shape_count * CELLS_PER_SHAPE)
+        self.retunes += 1
+        log.debug(f"Spatial hash: {self.cell_size:.0f} px cells, {self.shape_count * CELLS_PER_SHAPE} cells")
+
+    def update(self) -> None:
+        if self.mode != BROADPHASE_HASH or self.space is None:
+            return
+        self.frame += 1
+        if not self.shape_count:
+            self.tune()
+            return
+        if self.frame % CHECK_INTERVAL:
+            return
+        shape_count, mean_size = get_shape_stats(self.space)
+        cell_size = get_cell_size(mean_size)
+        count_ratio = max(shape_count, 1) / self.shape_count
+        size_ratio = cell_size / self.cell_size
+        if not (1 / RETUNE_RATIO < count_ratio < RETUNE_RATIO and 1 / RETUNE_RATIO < size_ratio < RETUNE_RATIO):
+            self.tune()
+
+
+def benchmark(frames: int = 900, repeats: int = 3) -> None:
+    """
+    Prints the update time of the benchmark scenes with either broadphase, the best of a few runs
+    since the battles don't play out the same way every time.
+    """
+    import random
+    from time import perf_counter
+
+    import pygame
+    from pygame.event import Event
+
+    from scenes.battle import BattleScene
+    from scenes.particles import ParticleScene
+    from scenes.tank import TankScene
+
+    pygame.init()
+    display = pygame.display.set_mode((2300, 700))
+    for scene_type in (TankScene, BattleScene, ParticleScene):
+        for mode in (BROADPHASE_TREE, BROADPHASE_HASH):
+            times = []
+            for _ in range(repeats):
+                random.seed(1)
+                scene = type(scene_type.__name__, (scene_type,), {"broadphase_mode": mode})(display, 60, seed=1)
+                update_time = 0.0
+                for frame in range(frames):
+                    if frame % 20 == 0:
+                        scene.handle_event(Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+                    if frame % 5 == 0:
+                        pos = (200 + frame * 37 % 1800, 100)
+                        scene.handle_event(Event(pygame.MOUSEBUTTONDOWN, button=1, pos=pos))
+                    start = perf_counter()
+                    scene.update()
+                    update_time += perf_counter() - start
+                times.append(update_time / frames * 1000)
+            bp = scene.broadphase
+            tuning = f", {bp.cell_size:.0f} px cells, tuned {bp.retunes}x" if mode == BROADPHASE_HASH else ""
+            print(
+                f"{scene_type.__name__:14s} {mode:4s}: update {min(times):.2f} ms (best of {repeats}), "
+                f"{len(scene.space.shapes)} shapes{tuning}"
+            )
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    import os
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    benchmark()
@@ -0,0 +1,197 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from logging import getLogger
+from typing import Any, Dict, Optional
+
+import pygame
+from pygame.mixer import Sound
+from pygame.surface import Surface
+
+from scenes.audio_cache import SOUND_EXTENSIONS
+
+log = getLogger()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS_DIR = os.path.join(ROOT, "scenes", "assets")
+BUNDLE_PATH = os.path.join(ROOT, ".cache", "assets.bundle")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+# Magic, format version, length of the JSON index that follows and the offset of the data,
+# which the entry offsets are relative to
+HEADER = struct.Struct("<4sIII")
+MAGIC = b"PTAB"
+VERSION = 1
+# Entries start at multiples of this, so the pixel rows of the mapped images are aligned
+ALIGNMENT = 64
+
+
+def resolve(path: str) -> str:
+    """
+    Asset paths like "./scenes/assets/body.png" are relative to the repository, not to the
+    working directory.
+    """
+    return path if os.path.isabs(path) else os.path.normpath(os.path.join(ROOT, path))
+
+
+def get_key(path: str) -> str:
+    return os.path.relpath(resolve(path), ROOT).replace(os.sep, "/")
+
+
+def get_source_stamp(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class AssetBundle:
+    """
+    Images decoded to RGBA and sounds decoded to PCM in one indexed file, memory-mapped so that
+    the surfaces are built straight on the mapped pages. An entry whose source file changed since
+    the bundle was built, or a sound decoded for another mixer format, is stale and not used.
+    """
+
+    def __init__(self, path: str = BUNDLE_PATH) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_size, data_start = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise ValueError(f"{path} is not an asset bundle of version {VERSION}")
+        self.index: Dict[str, Dict[str, Any]] = json.loads(self.buffer[HEADER.size : HEADER.size + index_size])
+        self.view = memoryview(self.buffer)[data_start:]
+
+    def get_entry(self, path: str, kind: str) -> Optional[Dict[str, Any]]:
+        entry = self.index.get(get_key(path))
+        if entry is None or entry["kind"] != kind:
+            return None
+        try:
+            if entry["source"] != get_source_stamp(resolve(path)):
+                log.info(f"The bundled {path} is stale, loading the file")
+                return None
+        except OSError:
+            pass
+        return entry
+
+    def get_image(self, path: str) -> Optional[Surface]:
+        entry = self.get_entry(path, "image")
+        if entry is None:
+            return None
+        data = self.view[entry["offset"] : entry["offset"] + entry["size"]]
+        return pygame.image.frombuffer(data, tuple(entry["dimensions"]), "RGBA")
+
+    def get_sound(self, path: str) -> Optional[Sound]:
+        entry = self.get_entry(path, "sound")
+        if entry is None or entry["mixer"] != list(pygame.mixer.get_init() or ()):
+            return None
+        return Sound(buffer=self.view[entry["offset"] : entry["offset"] + entry["size"]])
+
+
+_bundle: Optional[AssetBundle] = None
+_bundle_checked = False
+_lock = threading.Lock()
+
+
+def get_bundle() -> Optional[AssetBundle]:
+    """
+    The bundle of this process, opened on first use. None when there is no usable bundle.
+    """
+    global _bundle, _bundle_checked
+    with _lock:
+        if not _bundle_checked:
+            _bundle_checked = True
+            if os.path.exists(BUNDLE_PATH):
+                try:
+                    _bundle = AssetBundle(BUNDLE_PATH)
+                except (OSError, ValueError) as e:
+                    log.warning(f"Can't open the asset bundle: {e}")
+        return _bundle
+
+
+def build_bundle(assets_dir: str = ASSETS_DIR, path: str = BUNDLE_PATH) -> int:
+    """
+    Decodes every asset and writes the bundle. Sounds are decoded for the current mixer format
+    and are left out when the mixer is not initialised.
+    """
+    mixer = pygame.mixer.get_init()
+    index: Dict[str, Dict[str, Any]] = {}
+    blobs = []
+    offset = 0
+    for name in sorted(os.listdir(assets_dir)):
+        source = os.path.join(assets_dir, name)
+        entry: Dict[str, Any] = {"source": get_source_stamp(source)}
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            image = pygame.image.load(source)
+            data = pygame.image.tostring(image, "RGBA")
+            entry.update(kind="image", dimensions=list(image.get_size()))
+        elif name.lower().endswith(SOUND_EXTENSIONS) and mixer:
+            data = Sound(source).get_raw()
+            entry.update(kind="sound", mixer=list(mixer))
+        else:
+            continue
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        entry.update(offset=offset, size=len(data))
+        index[get_key(source)] = entry
+        blobs.append((offset, data))
+        offset += len(data)
+
+    index_bytes = json.dumps(index).encode()
+    data_start = -(-(HEADER.size + len(index_bytes)) // ALIGNMENT) * ALIGNMENT
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(index_bytes), data_start))
+        f.write(index_bytes)
+        for offset, data in blobs:
+            f.seek(data_start + offset)
+            f.write(data)
+    os.replace(tmp_path, path)
+    return len(index)
+
+
+def measure_load(bundled: bool) -> None:
+    """
+    Prints how long loading every asset takes in a fresh process, from the bundle or from the files.
+    """
+    from time import perf_counter
+
+    # Run as a script this module is __main__, resources uses the imported copy
+    from scenes import bundle, resources
+
+    pygame.mixer.init()
+    paths = [os.path.join(ASSETS_DIR, name) for name in sorted(os.listdir(ASSETS_DIR))]
+    start = perf_counter()
+    if not bundled:
+        bundle._bundle_checked = True
+    for path in paths:
+        if path.lower().endswith(IMAGE_EXTENSIONS + SOUND_EXTENSIONS):
+            resources.load_asset(path)
+    print(f"{perf_counter() - start:.4f}")
+    pygame.mixer.quit()
+
+
+def measure() -> None:
+    import subprocess
+    import sys
+
+    results = []
+    for mode in ("files", "bundle"):
+        args = [sys.executable, "-m", "scenes.bundle", mode]
+        output = subprocess.run(args, capture_output=True, text=True, check=True, cwd=ROOT).stdout.split()
+        results.append(float(output[-1]) * 1000)
+    print(f"loading all assets: files {results[0]:7.1f} ms, bundle {results[1]:7.1f} ms")
+
+
+if __name__ == "__main__":
+    import sys
+
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    if len(sys.argv) == 2:
+        measure_load(sys.argv[1] == "bundle")
+    else:
+        pygame.mixer.init()
+        print(f"{build_bundle()} assets written to {BUNDLE_PATH}")
+        pygame.mixer.quit()
+        measure()
@@ -0,0 +1,89 @@
+from typing import Tuple, Union
+
+import pygame
+from pygame.surface import Surface
+from pymunk import Vec2d
+
+from scenes.utils import LOD_FULL, LOD_REDUCED, ScreenTransform
+
+ZOOM_STEP = 1.25
+
+
+class Camera:
+    """
+    Follows a world x-coordinate and zooms around it. The bottom of the viewport always shows y = 0,
+    so zooming out reveals more of the world to the sides and above the ground.
+
+    :param viewport: Area of the display the scene is drawn to
+    :param anchor_x: Viewport x-coordinate at which the followed point is kept
+    :param smoothing: Fraction of the distance to the target position and zoom covered every frame,
+        1 follows rigidly
+    :param lod_zoom: Below this zoom the renderers switch to the reduced level of detail
+    """
+
+    def __init__(
+        self,
+        viewport: Union[pygame.Rect, Tuple[int, int, int, int]],
+        anchor_x: float = 0,
+        smoothing: float = 1,
+        zoom: float = 1,
+        min_zoom: float = 0.25,
+        max_zoom: float = 2,
+        lod_zoom: float = 0.75,
+    ) -> None:
+        self.viewport = pygame.Rect(viewport)
+        self.anchor_x = anchor_x
+        self.smoothing = smoothing
+        self.min_zoom, self.max_zoom = min_zoom, max_zoom
+        self.lod_zoom = lod_zoom
+        self.focus_x = self.target_x = 0.0
+        self.zoom = self.target_zoom = zoom
+
+    @property
+    def shift(self) -> Vec2d:
+        return Vec2d(self.anchor_x / self.zoom - self.focus_x, 0)
+
+    @property
+    def lod(self) -> int:
+        return LOD_REDUCED if self.zoom < self.lod_zoom else LOD_FULL
+
+    def follow(self, x: float) -> None:
+        self.target_x = x
+
+    def zoom_by(self, factor: float) -> None:
+        self.target_zoom = min(max(self.target_zoom * factor, self.min_zoom), self.max_zoom)
+
+    def snap(self) -> None:
+        self.focus_x, self.zoom = self.target_x, self.target_zoom
+
+    def update(self) -> None:
+        self.focus_x += (self.target_x - self.focus_x) * self.smoothing
+        # Zoom is interpolated in log space so zooming in and out feel equally fast
+        self.zoom *= (self.target_zoom / self.zoom) ** self.smoothing
+        if abs(self.target_zoom - self.zoom) < 1e-3:
+            self.zoom = self.target_zoom
+
+    def get_visible_width(self) -> float:
+        return self.viewport.width / self.zoom
+
+    def get_transform(self) -> ScreenTransform:
+        return ScreenTransform(self.viewport.height, self.shift, self.zoom, self.lod)
+
+    def get_surface(self, display: Surface) -> Surface:
+        if self.viewport == display.get_rect():
+            return display
+        return display.subsurface(self.viewport)
+
+    def to_world(self, pos: Tuple[int, int]) -> Vec2d:
+        """
+        :param pos: Display coordinates, e.g. of a mouse event
+        """
+        x, y = pos[0] - self.viewport.x, self.viewport.bottom - pos[1]
+        shift = self.shift
+        return Vec2d(x / self.zoom - shift.x, y / self.zoom - shift.y)
+
+    def get_state(self) -> tuple:
+        return self.focus_x, self.target_x, self.zoom, self.target_zoom
+
+    def set_state(self, state: tuple) -> None:
+        self.focus_x, self.target_x, self.zoom, self.target_zoom = state
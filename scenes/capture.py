@@ -0,0 +1,149 @@
+import mmap
+import os
+import struct
+import threading
+from logging import getLogger
+from queue import Empty, Queue
+from typing import Iterator, List, Optional, Tuple
+
+import pygame
+from pygame.surface import Surface
+
+log = getLogger()
+
+RAW_MAGIC = b"TNKF"
+# magic, width, height, pitch, bits per pixel, red, green, blue and alpha masks, frame count
+RAW_HEADER = struct.Struct("<4sHHIB4II")
+FRAME_INDEX = struct.Struct("<I")
+
+
+class FrameCapture:
+    """
+    Copies the display into a ring of pre-allocated buffers and leaves writing them out to a
+    background thread. When every buffer is still waiting for the writer the frame is dropped,
+    so capturing never blocks the game loop.
+
+    Paths ending with `.raw` get all the frames in one memory-mapped file, any other path is
+    a directory for a PNG sequence.
+    """
+
+    def __init__(self, path: str, surface: Surface, slots: int = 8, every: int = 1) -> None:
+        self.path = path
+        self.raw = path.endswith(".raw")
+        self.size = surface.get_size()
+        self.pitch = surface.get_pitch()
+        self.bitsize = surface.get_bitsize()
+        self.masks = surface.get_masks()
+        self.frame_bytes = self.pitch * surface.get_height()
+        self.every = every
+
+        self.slots: List[bytearray] = [bytearray(self.frame_bytes) for _ in range(slots)]
+        self.free: "Queue[int]" = Queue()
+        self.filled: "Queue[Optional[Tuple[int, int]]]" = Queue()
+        for i in range(slots):
+            self.free.put(i)
+
+        self.frame = 0
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+
+        self.file = None
+        self.map: Optional[mmap.mmap] = None
+        if self.raw:
+            self.open_raw(capacity=64)
+        else:
+            os.makedirs(path, exist_ok=True)
+        self.writer = threading.Thread(target=self.write_loop, name="frame-capture", daemon=True)
+        self.writer.start()
+
+    def open_raw(self, capacity: int) -> None:
+        self.file = open(self.path, "w+b")
+        self.file.truncate(self.get_offset(capacity))
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.write_header()
+
+    def get_offset(self, frame: int) -> int:
+        return RAW_HEADER.size + frame * (FRAME_INDEX.size + self.frame_bytes)
+
+    def write_header(self) -> None:
+        width, height = self.size
+        header = RAW_HEADER.pack(RAW_MAGIC, width, height, self.pitch, self.bitsize, *self.masks, self.written)
+        self.map[: RAW_HEADER.size] = header
+
+    def capture(self, surface: Surface) -> bool:
+        self.frame += 1
+        if self.frame % self.every:
+            return False
+        try:
+            i = self.free.get_nowait()
+        except Empty:
+            self.dropped += 1
+            return False
+        memoryview(self.slots[i])[:] = surface.get_buffer()
+        self.filled.put((i, self.frame))
+        self.captured += 1
+        return True
+
+    def write_loop(self) -> None:
+        surface = None
+        if not self.raw:
+            width = self.pitch * 8 // self.bitsize
+            surface = Surface((width, self.size[1]), 0, self.bitsize, self.masks)
+        while True:
+            item = self.filled.get()
+            if item is None:
+                return
+            i, frame = item
+            try:
+                if self.raw:
+                    self.write_raw(self.slots[i], frame)
+                else:
+                    surface.get_buffer().write(bytes(self.slots[i]))
+                    image = surface.subsurface((0, 0), self.size)
+                    pygame.image.save(image, os.path.join(self.path, f"{frame:06d}.png"))
+                self.written += 1
+            except (OSError, pygame.error) as e:
+                log.warning(f"Can't write frame {frame}: {e}")
+            finally:
+                self.free.put(i)
+
+    def write_raw(self, data: bytearray, frame: int) -> None:
+        end = self.get_offset(self.written + 1)
+        if end > len(self.map):
+            self.map.close()
+            self.file.truncate(self.get_offset((self.written + 1) * 2))
+            self.map = mmap.mmap(self.file.fileno(), 0)
+        offset = self.get_offset(self.written)
+        self.map[offset : offset + FRAME_INDEX.size] = FRAME_INDEX.pack(frame)
+        self.map[offset + FRAME_INDEX.size : end] = data
+
+    def close(self) -> None:
+        self.filled.put(None)
+        self.writer.join()
+        if self.raw:
+            self.write_header()
+            self.map.close()
+            self.file.truncate(self.get_offset(self.written))
+            self.file.close()
+        log.info(self.report())
+
+    def report(self) -> str:
+        return f"Capture: {self.captured} frames captured, {self.written} written, {self.dropped} dropped"
+
+
+def read_raw_frames(path: str) -> Iterator[Tuple[int, Surface]]:
+    """
+    Yields the frame numbers and the frames stored in a `.raw` capture.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, width, height, pitch, bitsize, r, g, b, a, count = RAW_HEADER.unpack_from(data)
+        if magic != RAW_MAGIC:
+            raise ValueError(f"{path} is not a frame capture")
+        frame_bytes = pitch * height
+        surface = Surface((pitch * 8 // bitsize, height), 0, bitsize, (r, g, b, a))
+        for n in range(count):
+            offset = RAW_HEADER.size + n * (FRAME_INDEX.size + frame_bytes)
+            (frame,) = FRAME_INDEX.unpack_from(data, offset)
+            surface.get_buffer().write(data[offset + FRAME_INDEX.size : offset + FRAME_INDEX.size + frame_bytes])
+            yield frame, surface.subsurface((0, 0), (width, height))
@@ -1,21 +1,43 @@
-from typing import Sequence
+from typing import Any, Sequence
 
 import pygame
 from pygame.event import Event
 
 from scenes.abstract import AbstractPymunkScene
+from scenes.camera import Camera
 from scenes.components.ball import Ball
 from scenes.components.car import CarBody
 from scenes.components.random_floor import RandomFloor
-from scenes.utils import convert
+from scenes.input import get_pressed
 
 
 class CarScene(AbstractPymunkScene):
+    budgets = {Ball: 200}
+    despawn_types = (Ball,)
+    world_margin = 300
+
+    cb: CarBody
+    floor: RandomFloor
+
     def reset_scene(self):
         super().reset_scene()
         self.cb = CarBody(288, 150, 100, 50, self.space)
-        floor = RandomFloor(0, self.display.get_width(), 0, 100, 30, self.space)
-        self.objects.extend((floor, self.cb))
+        self.floor = RandomFloor(0, self.display.get_width(), 0, 100, 30, self.space)
+        self.objects.extend((self.floor, self.cb))
+        self.camera.anchor_x = self.cb.body.position.x
+        self.camera.follow(self.cb.body.position.x)
+        self.camera.snap()
+
+    def create_camera(self) -> Camera:
+        return Camera(self.display.get_rect(), smoothing=0.15)
+
+    def get_rewind_state(self) -> Any:
+        return super().get_rewind_state(), self.floor.get_state()
+
+    def set_rewind_state(self, state: Any) -> None:
+        base, floor = state
+        super().set_rewind_state(base)
+        self.floor.set_state(floor)
 
     def update_center_of_gravity(self, pressed_keys: Sequence[bool]):
         gx, gy = self.cb.body.center_of_gravity
@@ -41,26 +63,27 @@ class CarScene(AbstractPymunkScene):
         self.cb.motor.rate *= 0.8
 
     def update(self):
+        if self.rewind.paused:
+            return
         super().update()
-        keys = pygame.key.get_pressed()
+        keys = get_pressed()
         self.update_center_of_gravity(keys)
         self.update_motor_rate(keys)
 
         if self.cb.body.position[1] < 0:
             self.reset_scene()
+            return
 
-        for obj in self.objects:
-            if isinstance(obj, Ball):
-                x, y = obj.body.position
-                if y < 0:
-                    self.objects.remove(obj)
+        self.camera.follow(self.cb.body.position.x)
+        self.camera.update()
+        self.floor.update(self.camera_shift, self.camera.get_visible_width())
 
     def handle_event(self, event: Event) -> None:
+        if self.handle_rewind_event(event) or self.rewind.paused:
+            return
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_r:
                 self.reset_scene()
         if event.type == pygame.MOUSEBUTTONDOWN:
-            x, y = event.dict["pos"]
-            if len(self.objects) <= 200:
-                ball = Ball(*convert((x, y), self.display.get_height()), 5, self.space)
-                self.objects.append(ball)
+            ball = Ball(*self.camera.to_world(event.dict["pos"]), 5, self.space)
+            self.objects.append(ball)
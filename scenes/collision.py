@@ -0,0 +1,182 @@
+from enum import IntFlag
+from typing import Dict, Set, Tuple
+
+from pymunk import Body, ShapeFilter, Space
+
+
+class Layer(IntFlag):
+    TANK = 1 << 0
+    TERRAIN_TOP = 1 << 1
+    TERRAIN_UNDERLYING = 1 << 2
+    DEBRIS = 1 << 3
+    BULLET = 1 << 4
+    PROP = 1 << 5
+    CAR = 1 << 6
+    FLOOR = 1 << 7
+
+
+# Pairs of layers that collide, every other pair never produces a collision pair. Shapes without
+# a layer keep the default filter and collide with everything.
+INTERACTIONS = (
+    (Layer.TANK, Layer.TANK),
+    (Layer.TANK, Layer.TERRAIN_TOP),
+    (Layer.TANK, Layer.TERRAIN_UNDERLYING),
+    (Layer.TANK, Layer.DEBRIS),
+    (Layer.TANK, Layer.BULLET),
+    # Debris lands on the surface and never reaches the layer under it
+    (Layer.DEBRIS, Layer.TERRAIN_TOP),
+    (Layer.BULLET, Layer.TERRAIN_TOP),
+    (Layer.BULLET, Layer.TERRAIN_UNDERLYING),
+    (Layer.CAR, Layer.CAR),
+    (Layer.CAR, Layer.FLOOR),
+    *((Layer.PROP, layer) for layer in Layer),
+)
+
+
+def build_masks() -> Dict[Layer, int]:
+    masks = {layer: 0 for layer in Layer}
+    for a, b in INTERACTIONS:
+        masks[a] |= b
+        masks[b] |= a
+    return masks
+
+
+MASKS = build_masks()
+
+_use_layers = True
+
+
+def use_layers(enabled: bool) -> None:
+    """
+    Switches the layer matrix off, leaving only the collision groups, to compare the pair counts.
+    Applies to the shapes created afterwards.
+    """
+    global _use_layers
+    _use_layers = enabled
+
+
+def layer_filter(layer: Layer, group: int = 0) -> ShapeFilter:
+    if not _use_layers:
+        return ShapeFilter(group=group)
+    return ShapeFilter(group=group, categories=layer, mask=MASKS[layer])
+
+
+def query_filter(layers: int) -> ShapeFilter:
+    """
+    Filter for space queries that should only return shapes of the given layers.
+    """
+    return ShapeFilter(mask=layers)
+
+
+def collides(a: ShapeFilter, b: ShapeFilter) -> bool:
+    """
+    The filter test of the broadphase: shapes of the same non-zero group never collide, otherwise
+    both shapes have to be in the mask of the other one.
+    """
+    if a.group and a.group == b.group:
+        return False
+    return bool(a.categories & b.mask) and bool(b.categories & a.mask)
+
+
+def count_pairs(space: Space) -> Tuple[int, int, int]:
+    """
+    :return: Shape pairs with overlapping bounding boxes the broadphase could test, how many of
+        them pass the collision filters, and the number of arbiters (pairs in contact)
+    """
+    candidates: Set[Tuple[int, int]] = set()
+    passed = 0
+    for shape in space.shapes:
+        if shape.body.body_type == Body.STATIC:
+            continue
+        for other in space.bb_query(shape.bb, ShapeFilter()):
+            if other.body is shape.body:
+                continue
+            key = (min(id(shape), id(other)), max(id(shape), id(other)))
+            if key in candidates:
+                continue
+            candidates.add(key)
+            passed += collides(shape.filter, other.filter)
+
+    arbiters: Set[Tuple[int, int]] = set()
+
+    def add_arbiter(arbiter) -> None:
+        a, b = arbiter.shapes
+        arbiters.add((min(id(a), id(b)), max(id(a), id(b))))
+
+    for body in space.bodies:
+        if body.body_type != Body.STATIC:
+            body.each_arbiter(add_arbiter)
+    return len(candidates), passed, len(arbiters)
+
+
+class CollisionCounter:
+    """
+    Averages the pair and arbiter counts over the sampled frames.
+    """
+
+    def __init__(self) -> None:
+        self.samples = 0
+        self.candidates = self.passed = self.arbiters = 0
+
+    def sample(self, space: Space) -> None:
+        candidates, passed, arbiters = count_pairs(space)
+        self.samples += 1
+        self.candidates += candidates
+        self.passed += passed
+        self.arbiters += arbiters
+
+    def report(self) -> str:
+        n = max(self.samples, 1)
+        return (
+            f"{self.candidates / n:8.0f} bb pairs, {self.passed / n:8.0f} pass the filters, "
+            f"{self.arbiters / n:6.0f} arbiters"
+        )
+
+
+def describe_matrix() -> str:
+    names = [layer.name for layer in Layer]
+    lines = [" " * 20 + " ".join(f"{name[:4]:>4}" for name in names)]
+    for a in Layer:
+        marks = " ".join(f"{'x' if MASKS[a] & b else '.':>4}" for b in Layer)
+        lines.append(f"{a.name:>20}{' ' + marks}")
+    return "\n".join(lines)
+
+
+def benchmark(frames: int = 600) -> None:
+    import random
+    from time import perf_counter
+
+    import pygame
+    from pygame.event import Event
+
+    from scenes.battle import BattleScene
+
+    pygame.init()
+    display = pygame.display.set_mode((2300, 700))
+    print(describe_matrix())
+    for enabled in (False, True):
+        use_layers(enabled)
+        random.seed(1)
+        scene = BattleScene(display, 60, tank_count=8, seed=1)
+        counter = CollisionCounter()
+        step_time = 0.0
+        for frame in range(frames):
+            if frame % 20 == 0:
+                scene.handle_event(Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+            start = perf_counter()
+            scene.update()
+            step_time += perf_counter() - start
+            if frame % 10 == 0:
+                counter.sample(scene.space)
+        label = "layers" if enabled else "groups only"
+        print(f"{label:>12}: {counter.report()}, update {step_time / frames * 1000:.2f} ms")
+    use_layers(True)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    import os
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    benchmark()
@@ -1,14 +1,17 @@
 from math import cos, sin
-from typing import Tuple
+from typing import Tuple, Union
 
 import pygame
 import pymunk
 from pygame.surface import Surface
 
-from scenes.utils import convert
+from scenes.dirty import get_pose
+from scenes.utils import ScreenTransform, to_transform
 
 
 class Ball:
+    __slots__ = ("body", "shape", "r", "color")
+
     def __init__(
         self,
         x: int,
@@ -28,12 +31,15 @@ class Ball:
         self.color = color
         space.add(self.body, self.shape)
 
-    def render(self, display: Surface, camera_shift: pymunk.Vec2d = pymunk.Vec2d(0, 0)) -> None:
-        h = display.get_height()
-        pos = self.body.position + camera_shift
-        pygame.draw.circle(display, self.color, convert(pos, h), self.r)
+    def get_pose(self, t: ScreenTransform) -> tuple:
+        return get_pose((self.body,), t)
+
+    def render(
+        self, display: Surface, camera_shift: Union[pymunk.Vec2d, ScreenTransform] = pymunk.Vec2d(0, 0)
+    ) -> pygame.Rect:
+        t = to_transform(display, camera_shift)
+        center = t.point(self.body.position)
+        area = pygame.draw.circle(display, self.color, center, self.r * t.scale)
         alpha = self.body.angle
         line_end = cos(alpha) * self.r, sin(alpha) * self.r
-        pygame.draw.line(
-            display, (0, 0, 0), convert(pos, h), convert(self.body.local_to_world(line_end) + camera_shift, h), 1
-        )
+        return area.union(pygame.draw.line(display, (0, 0, 0), center, t.point(self.body.local_to_world(line_end)), 1))
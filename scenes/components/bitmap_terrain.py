@@ -0,0 +1,254 @@
+from collections import deque
+from time import perf_counter
+from typing import Deque, List, Optional, Tuple, Union
+
+import numpy as np
+import pygame
+import pymunk
+from pygame.surface import Surface
+from pymunk.autogeometry import march_hard, simplify_curves
+from pymunk.space import Space
+from pymunk.vec2d import Vec2d
+
+from scenes.collision import Layer, layer_filter
+from scenes.components.terrain import TOP_COLOR, UNDERLYING_COLOR, Terrain
+from scenes.utils import ScreenTransform, to_transform
+
+# World units per bitmap cell
+CELL = 4
+# Cells per chunk horizontally; an explosion narrower than a chunk dirties at most two chunks
+CHUNK_CELLS = 32
+CHUNK_WIDTH = CELL * CHUNK_CELLS
+# Height of the bitmap in world units, the ground never reaches above it
+HEIGHT = 384
+ROWS = HEIGHT // CELL
+# Rows at the bottom that stay solid, so craters never open a hole out of the world
+BEDROCK_ROWS = 2
+# Chunks generated per frame at most while the view moves
+CHUNKS_PER_FRAME = 1
+# Largest distance (in world units) between the simplified outline and the marched one
+SIMPLIFY_TOLERANCE = 1.0
+SEGMENT_RADIUS = 1
+# Craters are at most a chunk wide, so one explosion rebuilds two chunks at most
+MAX_CRATER_RADIUS = CHUNK_WIDTH // 2
+KEY_COLOR = (255, 0, 255)
+
+
+class BitmapChunk:
+    """
+    A strip of the terrain bitmap and the static segments along the outline of its solid cells.
+    Rows go from the bottom of the world up. The grid has one more column than the chunk, a copy
+    of the first column of the next chunk, so the outlines of neighbouring chunks meet.
+
+    Chunks are never changed in place: carving creates a new chunk, so rewind snapshots can keep
+    the old ones and put them back into the space.
+    """
+
+    __slots__ = ("index", "grid", "body", "shapes", "surface", "surface_scale")
+
+    def __init__(self, index: int, grid: np.ndarray, space: Space, shape_filter: pymunk.ShapeFilter) -> None:
+        self.index = index
+        self.grid = grid
+        self.body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        self.shapes = self.create_shapes(shape_filter)
+        self.surface: Optional[Surface] = None
+        self.surface_scale = 0.0
+        space.add(self.body, *self.shapes)
+
+    @property
+    def left(self) -> float:
+        return self.index * CHUNK_WIDTH
+
+    def create_shapes(self, shape_filter: pymunk.ShapeFilter) -> List[pymunk.Segment]:
+        """
+        Marches the rows around the outline only, the rows below and above it are all solid or
+        all empty and have no outline.
+        """
+        edges = np.flatnonzero((self.grid[1:] != self.grid[:-1]).any(axis=1))
+        if not len(edges):
+            return []
+        low, high = max(edges[0] - 1, 0), min(edges[-1] + 2, ROWS - 1)
+        rows = self.grid.tolist()
+        left = self.left
+
+        def sample(point: Tuple[float, float]) -> float:
+            return 1.0 if rows[int(point[1] // CELL)][int((point[0] - left) // CELL)] else 0.0
+
+        # Samples are taken at the cell centers
+        bb = pymunk.BB(left + CELL / 2, low * CELL + CELL / 2, left + CHUNK_WIDTH + CELL / 2, high * CELL + CELL / 2)
+        shapes = []
+        for line in march_hard(bb, CHUNK_CELLS + 1, high - low + 1, 0.5, sample):
+            points = simplify_curves(line, SIMPLIFY_TOLERANCE)
+            for a, b in zip(points, points[1:]):
+                shape = pymunk.Segment(self.body, a, b, SEGMENT_RADIUS)
+                shape.friction = 1
+                shape.filter = shape_filter
+                shapes.append(shape)
+        return shapes
+
+    def add(self, space: Space) -> None:
+        if self.body.space is not space:
+            space.add(self.body, *self.shapes)
+
+    def remove(self, space: Space) -> None:
+        if self.body.space is space:
+            space.remove(self.body, *self.shapes)
+
+    def get_surface(self, scale: float) -> Surface:
+        """
+        The chunk drawn at the given scale, cached until the scale changes.
+        """
+        if self.surface is None or self.surface_scale != scale:
+            solid = self.grid[:, :CHUNK_CELLS]
+            top = solid & ~np.vstack((solid[1:], np.zeros((1, CHUNK_CELLS), dtype=bool)))
+            pixels = np.empty((CHUNK_CELLS, ROWS, 3), dtype=np.uint8)
+            pixels[...] = KEY_COLOR
+            pixels[solid.T] = UNDERLYING_COLOR
+            pixels[top.T] = TOP_COLOR
+            surface = pygame.surfarray.make_surface(pixels[:, ::-1])
+            size = max(round(CHUNK_WIDTH * scale), 1), max(round(HEIGHT * scale), 1)
+            self.surface = pygame.transform.scale(surface, size)
+            self.surface.set_colorkey(KEY_COLOR)
+            self.surface_scale = scale
+        return self.surface
+
+
+class BitmapTerrain:
+    """
+    Destructible terrain stored as a bitmap in chunks. Explosions carve circles out of it, which
+    allows overhangs and tunnels; only the chunks a crater touches get new collision segments and
+    are drawn again. The ground profile comes from the same noise as the column terrain.
+    """
+
+    def __init__(
+        self, start: Vec2d, end: Vec2d, min_y: int, max_y: int, space: Space, seed: Optional[int] = None
+    ) -> None:
+        self.min_y, self.max_y = min_y, max_y
+        self.noise = Terrain.create_noise(seed)
+        self.space = space
+        self.filter = layer_filter(Layer.TERRAIN_TOP)
+        self.chunks: List[BitmapChunk] = []
+        self.rebuild_times: Deque[float] = deque(maxlen=1000)
+        # Bumped whenever a chunk is added, removed or carved
+        self.revision = 0
+        first, last = int(start.x // CHUNK_WIDTH), int(end.x // CHUNK_WIDTH)
+        for index in range(first, last + 1):
+            self.chunks.append(self.create_chunk(index))
+
+    def get_y(self, x: float) -> float:
+        return self.min_y + (self.max_y - self.min_y) / 2 * self.noise.noise2(x / 1000, 0)
+
+    def create_chunk(self, index: int) -> BitmapChunk:
+        xs = index * CHUNK_WIDTH + (np.arange(CHUNK_CELLS + 1) + 0.5) * CELL
+        heights = np.array([self.get_y(x) for x in xs.tolist()])
+        ys = (np.arange(ROWS) + 0.5) * CELL
+        grid = ys[:, None] < heights[None, :]
+        grid[:BEDROCK_ROWS] = True
+        return BitmapChunk(index, grid, self.space, self.filter)
+
+    def get_state(self) -> tuple:
+        return tuple(self.chunks)
+
+    def set_state(self, state: tuple) -> None:
+        """
+        The rewind buffer leaves the static bodies alone, the chunks are swapped in the space here.
+        """
+        kept = set(state)
+        for chunk in self.chunks:
+            if chunk not in kept:
+                chunk.remove(self.space)
+        self.chunks = list(state)
+        for chunk in self.chunks:
+            chunk.add(self.space)
+        self.revision += 1
+
+    def update(self, shift: Vec2d, reach: float = 2100) -> None:
+        """
+        :param shift: Camera shift
+        :param reach: Distance from the left edge of the view up to which chunks are generated
+        """
+        for _ in range(CHUNKS_PER_FRAME):
+            if self.chunks[-1].left + CHUNK_WIDTH >= -shift.x + reach:
+                break
+            self.chunks.append(self.create_chunk(self.chunks[-1].index + 1))
+            self.revision += 1
+        # Chunks a whole chunk left of the view are dropped
+        while len(self.chunks) > 1 and self.chunks[0].left + 2 * CHUNK_WIDTH < -shift.x:
+            self.chunks.pop(0).remove(self.space)
+            self.revision += 1
+
+    def detach_tops(self, center: Vec2d, radius: int) -> None:
+        """
+        Carves a circle out of the terrain. Named after the column terrain's method, so the
+        scenes can use either terrain.
+        """
+        start = perf_counter()
+        cx, cy = center
+        radius = min(radius, MAX_CRATER_RADIUS)
+        for i, chunk in enumerate(self.chunks):
+            # The grid reaches one cell into the next chunk
+            if not (chunk.left - radius <= cx <= chunk.left + CHUNK_WIDTH + CELL + radius):
+                continue
+            xs = chunk.left + (np.arange(CHUNK_CELLS + 1) + 0.5) * CELL
+            ys = (np.arange(ROWS) + 0.5) * CELL
+            inside = (xs[None, :] - cx) ** 2 + (ys[:, None] - cy) ** 2 < radius**2
+            inside[:BEDROCK_ROWS] = False
+            if not (chunk.grid & inside).any():
+                continue
+            chunk.remove(self.space)
+            self.chunks[i] = BitmapChunk(chunk.index, chunk.grid & ~inside, self.space, self.filter)
+            self.revision += 1
+        self.rebuild_times.append(perf_counter() - start)
+
+    def render(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> List[pygame.Rect]:
+        self.render_columns(display, camera_shift)
+        return self.render_debris(display, camera_shift)
+
+    def render_columns(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> None:
+        """
+        The chunks only change with the `revision`.
+        """
+        t = to_transform(display, camera_shift)
+        width = display.get_width()
+        for chunk in self.chunks:
+            x, y = t.point((chunk.left, HEIGHT))
+            if x > width or x + CHUNK_WIDTH * t.scale < 0:
+                continue
+            display.blit(chunk.get_surface(t.scale), (x, y))
+
+    def render_debris(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> List[pygame.Rect]:
+        """
+        Carved cells vanish, there is no debris. Named after the column terrain's method like `detach_tops`.
+        """
+        return []
+
+    def get_debris_pose(self, t: ScreenTransform) -> tuple:
+        return ()
+
+
+def benchmark(explosions: int = 200) -> None:
+    """
+    Prints the rebuild cost of carving craters into the terrain.
+    """
+    from random import Random
+
+    rng = Random(1)
+    space = Space()
+    terrain = BitmapTerrain(Vec2d(0, 0), Vec2d(2300, 0), 100, 300, space, seed=1)
+    start = perf_counter()
+    terrain.create_chunk(100).remove(space)
+    print(f"{len(terrain.chunks)} chunks, generating one takes {(perf_counter() - start) * 1000:.2f} ms")
+    for _ in range(explosions):
+        x = rng.uniform(0, 2300)
+        terrain.detach_tops(Vec2d(x, terrain.get_y(x) + rng.uniform(-40, 10)), 30)
+    times = np.array(terrain.rebuild_times) * 1000
+    shapes = [len(chunk.shapes) for chunk in terrain.chunks]
+    print(
+        f"{explosions} explosions: rebuild mean {times.mean():.2f} ms, 99th percentile "
+        f"{np.percentile(times, 99):.2f} ms, max {times.max():.2f} ms; "
+        f"{np.mean(shapes):.1f} segments per chunk, {len(space.shapes)} in the space"
+    )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,10 +1,13 @@
+from typing import Union
+
 import pymunk
 from pygame import draw
 from pygame.surface import Surface
 
+from scenes.collision import Layer, layer_filter
 from scenes.components import Ball
 from scenes.components.pj import PJ
-from scenes.utils import convert
+from scenes.utils import ScreenTransform, to_transform
 
 
 class CarBody:
@@ -28,7 +31,7 @@ class CarBody:
 
         self.shape = pymunk.Poly(self.body, vertices=vertices)
         self.shape.density = 0.5
-        self.collision_filter = pymunk.ShapeFilter(group=0b1)
+        self.collision_filter = layer_filter(Layer.CAR, group=0b1)
         self.shape.filter = self.collision_filter
 
         space.add(self.body, self.shape)
@@ -89,21 +92,20 @@ class CarBody:
         attachment.collide_bodies = False
         self.space.add(attachment)
 
-    def render(self, display: Surface):
-        h = display.get_height()
-        vert = [convert(self.body.local_to_world(v), h) for v in self.shape.get_vertices()]
-        draw.polygon(display, (52, 122, 235), vert)
-        cx, cy = convert(self.body.local_to_world(self.body.center_of_gravity), h)
+    def render(self, display: Surface, camera_shift: Union[pymunk.Vec2d, ScreenTransform] = pymunk.Vec2d(0, 0)):
+        t = to_transform(display, camera_shift)
+        draw.polygon(display, (52, 122, 235), t.body(self.body, self.shape.get_vertices()))
+        cx, cy = t.point(self.body.local_to_world(self.body.center_of_gravity))
         draw.circle(display, (161, 190, 237), (cx, cy), self.r, 1)
 
-        self.rear_wheel.render(display)
-        self.rear_sleeve.render(display)
-        self.rear_joint.render(display)
-        self.rear_suspension.render(display)
+        self.rear_wheel.render(display, t)
+        self.rear_sleeve.render(display, t)
+        self.rear_joint.render(display, t)
+        self.rear_suspension.render(display, t)
 
-        self.front_wheel.render(display)
-        self.front_sleeve.render(display)
-        self.front_joint.render(display)
-        self.front_suspension.render(display)
+        self.front_wheel.render(display, t)
+        self.front_sleeve.render(display, t)
+        self.front_joint.render(display, t)
+        self.front_suspension.render(display, t)
 
-        self.frame_obj.render(display)
+        self.frame_obj.render(display, t)
@@ -0,0 +1,127 @@
+from random import Random
+from typing import TYPE_CHECKING, Callable, Optional, Sequence
+
+import pygame
+
+from scenes.input import get_pressed
+
+if TYPE_CHECKING:
+    from scenes.components.tank import Tank
+
+
+class TankCommand:
+    """
+    :param throttle: -1 to drive backward, 1 to drive forward, 0 to let the motor slow down
+    :param elevation: 1 to raise the gun, -1 to lower it
+    :param fire: Request a shot in the current frame
+    """
+
+    __slots__ = ("throttle", "elevation", "fire")
+
+    def __init__(self, throttle: int = 0, elevation: int = 0, fire: bool = False) -> None:
+        self.throttle = throttle
+        self.elevation = elevation
+        self.fire = fire
+
+
+IDLE = TankCommand()
+
+
+class Controller:
+    def get_command(self, tank: "Tank") -> TankCommand:
+        raise NotImplementedError()
+
+
+class KeyboardController(Controller):
+    """
+    Reads the live keyboard state. Shots are left to the scene, which fires on KEYDOWN events.
+    """
+
+    def __init__(
+        self,
+        forward: int = pygame.K_d,
+        backward: int = pygame.K_a,
+        raise_gun: int = pygame.K_UP,
+        lower_gun: int = pygame.K_DOWN,
+    ) -> None:
+        self.forward, self.backward = forward, backward
+        self.raise_gun, self.lower_gun = raise_gun, lower_gun
+
+    def get_command(self, tank: "Tank") -> TankCommand:
+        keys = get_pressed()
+        throttle = 1 if keys[self.forward] else -1 if keys[self.backward] else 0
+        elevation = 1 if keys[self.raise_gun] else -1 if keys[self.lower_gun] else 0
+        return TankCommand(throttle, elevation)
+
+
+class ScriptedController(Controller):
+    def __init__(self, commands: Sequence[TankCommand], loop: bool = True) -> None:
+        self.commands = commands
+        self.loop = loop
+        self.frame = 0
+
+    def get_command(self, tank: "Tank") -> TankCommand:
+        if self.frame >= len(self.commands):
+            if not self.loop or not self.commands:
+                return IDLE
+            self.frame = 0
+        command = self.commands[self.frame]
+        self.frame += 1
+        return command
+
+
+class AIController(Controller):
+    """
+    Drives towards the target, keeps a preferred distance to it and fires with a cooldown.
+    """
+
+    def __init__(
+        self,
+        get_target: Callable[[], Optional[float]],
+        distance: float = 600,
+        cooldown: int = 120,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.get_target = get_target
+        self.distance = distance
+        self.cooldown = cooldown
+        self.rng = Random(seed)
+        self.reload = self.rng.randint(0, cooldown)
+        self.elevation = 0
+
+    def get_command(self, tank: "Tank") -> TankCommand:
+        target_x = self.get_target()
+        if target_x is None:
+            return IDLE
+        gap = target_x - tank.tank_base.body.position.x
+        throttle = 0
+        if abs(gap) > self.distance:
+            throttle = 1 if gap > 0 else -1
+
+        if self.rng.random() < 0.05:
+            self.elevation = self.rng.choice((-1, 0, 1))
+
+        self.reload -= 1
+        fire = self.reload <= 0
+        if fire:
+            self.reload = self.cooldown
+        return TankCommand(throttle, self.elevation, fire)
+
+
+class RemoteController(Controller):
+    """
+    Returns the last command pushed from outside, e.g. received over the network.
+    A requested shot is kept until the tank fires it.
+    """
+
+    def __init__(self) -> None:
+        self.command = IDLE
+
+    def push(self, command: TankCommand) -> None:
+        self.command = TankCommand(command.throttle, command.elevation, command.fire or self.command.fire)
+
+    def get_command(self, tank: "Tank") -> TankCommand:
+        command = self.command
+        if command.fire:
+            self.command = TankCommand(command.throttle, command.elevation)
+        return command
@@ -1,16 +1,21 @@
 import pygame
-from typing import Optional
+from typing import Optional, Union
 from math import sqrt
 from pymunk import Vec2d
 
+from scenes.resources import load_image
+from scenes.utils import ScreenTransform, to_transform
+
 
 class Explosion:
     def __init__(self, filename: str, stages: int) -> None:
-        self.tile = pygame.image.load(filename)
+        self.tile = load_image(filename)
         self.stages = stages
+        # Stages advanced per frame, more make the explosion shorter and cheaper
+        self.stage_step = 1
         self.count = 0
         self.active = False
-        self.pos: Optional[pygame.Vector2] = None
+        self.pos: Optional[Vec2d] = None
 
     def get_area(self, stage: int) -> pygame.Rect:
         img_width, img_height = self.tile.get_size()
@@ -24,24 +29,37 @@ class Explosion:
         x, y = sub_width * col, sub_width * row
         return pygame.Rect((x, y), (sub_width, sub_height))
 
-    def play(self, pos: pygame.Vector2) -> None:
+    def play(self, pos: Vec2d) -> None:
+        """
+        :param pos: World position of the muzzle
+        """
         if self.active:
             return
         self.active = True
-        self.pos = pos + pygame.Vector2(90, 0)
+        self.pos = Vec2d(*pos) + Vec2d(90, 0)
+
+    def get_state(self) -> tuple:
+        return self.active, self.count, self.pos
+
+    def set_state(self, state: tuple) -> None:
+        self.active, self.count, self.pos = state
 
     def update(self):
         if self.active:
-            self.count += 1
+            self.count += self.stage_step
 
         if self.count >= self.stages:
             self.count = 0
             self.active = False
             self.pos = None
 
-    def render(self, display: pygame.Surface, camera_shift: Vec2d) -> None:
+    def render(self, display: pygame.Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> pygame.Rect:
         if not self.pos:
-            return
+            return pygame.Rect(0, 0, 0, 0)
+        t = to_transform(display, camera_shift)
         cropped = self.tile.subsurface(self.get_area(self.count))
-        dest = cropped.get_rect(center=self.pos + camera_shift)
-        display.blit(cropped, dest)
+        if t.scale != 1:
+            width, height = cropped.get_size()
+            cropped = pygame.transform.scale(cropped, (max(round(width * t.scale), 1), max(round(height * t.scale), 1)))
+        dest = cropped.get_rect(center=t.point(self.pos))
+        return display.blit(cropped, dest)
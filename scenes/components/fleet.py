@@ -0,0 +1,116 @@
+from typing import List, Optional, Set, Union
+
+import numpy as np
+from pygame import Rect
+from pygame.surface import Surface
+from pymunk import Vec2d
+
+from scenes.components.controller import TankCommand
+from scenes.components.proxy_tank import ProxyTank, update_proxies
+from scenes.components.tank import GUN_MAX_ANGLE, GUN_STEP, MOTOR_ACCELERATION, MOTOR_DECAY, Tank
+from scenes.components.terrain import Terrain
+from scenes.utils import ScreenTransform, to_transform
+
+TANK_MARGIN = 300
+# Tanks farther than this from the visible range are simulated as proxies
+PROXY_MARGIN = 600
+# Proxies come back as full tanks this much closer than PROXY_MARGIN, so tanks on the border don't flip
+PROXY_HYSTERESIS = 200
+# Swaps done per frame, building a full tank takes about a millisecond
+SWAPS_PER_FRAME = 2
+
+AnyTank = Union[Tank, ProxyTank]
+
+
+class TankFleet:
+    """
+    Updates many tanks in one pass: the controller commands are collected first, the new motor
+    rates and gun limits are computed for the whole fleet with numpy and only then written back
+    to the pymunk objects.
+
+    With a terrain, tanks far from the camera are swapped for a `ProxyTank` and back when they
+    come closer, see `update_detail`.
+
+    :param proxy_margin: Distance from the visible range at which tanks become proxies, None keeps
+        every tank full
+    """
+
+    tanks: List[AnyTank]
+
+    def __init__(self, terrain: Optional[Terrain] = None, proxy_margin: Optional[float] = PROXY_MARGIN) -> None:
+        self.tanks = []
+        self.pinned: Set[Tank] = set()
+        self.terrain = terrain
+        self.proxy_margin = proxy_margin if terrain is not None else None
+        self.swaps = 0
+
+    def __len__(self) -> int:
+        return len(self.tanks)
+
+    def __iter__(self):
+        return iter(self.tanks)
+
+    def add(self, tank: Tank, pinned: bool = False) -> Tank:
+        """
+        :param pinned: Never swap the tank for a proxy, e.g. because others keep its bodies
+        """
+        self.tanks.append(tank)
+        if pinned:
+            self.pinned.add(tank)
+        return tank
+
+    def get_proxies(self) -> List[ProxyTank]:
+        return [tank for tank in self.tanks if isinstance(tank, ProxyTank)]
+
+    def update_detail(self, left: float, right: float) -> None:
+        """
+        Swaps the tanks between the full and the proxy model by their distance from the visible
+        range of x-coordinates. The pose, the velocities, the motor rate and the gun angle carry
+        over, the damage to a full tank does not.
+        """
+        if self.proxy_margin is None:
+            return
+        swaps = 0
+        for i, tank in enumerate(self.tanks):
+            if swaps >= SWAPS_PER_FRAME:
+                break
+            x = tank.tank_base.body.position.x
+            if isinstance(tank, ProxyTank):
+                margin = self.proxy_margin - PROXY_HYSTERESIS
+                if left - margin < x < right + margin:
+                    self.tanks[i] = tank.to_tank()
+                    swaps += 1
+            elif tank not in self.pinned and not left - self.proxy_margin < x < right + self.proxy_margin:
+                self.tanks[i] = ProxyTank.from_tank(tank)
+                swaps += 1
+        self.swaps += swaps
+
+    def update(self, dt: float = 1 / 60) -> List[TankCommand]:
+        if not self.tanks:
+            return []
+        commands = [tank.controller.get_command(tank) for tank in self.tanks]
+        throttle = np.fromiter((c.throttle for c in commands), dtype=np.float64, count=len(commands))
+        elevation = np.fromiter((c.elevation for c in commands), dtype=np.float64, count=len(commands))
+
+        rates = np.fromiter((t.get_motor_rate() for t in self.tanks), dtype=np.float64, count=len(self.tanks))
+        rates = np.where(throttle != 0, rates + MOTOR_ACCELERATION * throttle, rates * MOTOR_DECAY)
+
+        relative = np.fromiter((t.get_gun_angle() for t in self.tanks), dtype=np.float64, count=len(self.tanks))
+        gun_delta = np.where((elevation > 0) & (relative > 0), -GUN_STEP, 0.0)
+        gun_delta += np.where((elevation < 0) & (relative < GUN_MAX_ANGLE), GUN_STEP, 0.0)
+
+        for tank, rate, delta in zip(self.tanks, rates.tolist(), gun_delta.tolist()):
+            tank.apply_controls(rate, delta)
+            tank.sound_effects.update(speed=rate)
+        update_proxies(self.get_proxies(), self.terrain, dt)
+        return commands
+
+    def render(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> List[Rect]:
+        t = to_transform(display, camera_shift)
+        width = display.get_width()
+        areas = []
+        for tank in self.tanks:
+            x, _ = t.point(tank.tank_base.body.position)
+            if -TANK_MARGIN < x < width + TANK_MARGIN:
+                areas.append(tank.render(display, t))
+        return areas
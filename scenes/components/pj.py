@@ -1,10 +1,10 @@
-from typing import Tuple
+from typing import Tuple, Union
 
 import pygame
 import pymunk
 from pymunk import DampedSpring, PinJoint, PivotJoint
 
-from scenes.utils import convert
+from scenes.utils import ScreenTransform, to_transform
 
 
 class PJ:
@@ -12,14 +12,14 @@ class PJ:
         self.joint = joint
         self.color = color
 
-    def render(self, display: pygame.surface.Surface) -> None:
-        h = display.get_height()
+    def render(
+        self, display: pygame.surface.Surface, camera_shift: Union[pymunk.Vec2d, ScreenTransform] = pymunk.Vec2d(0, 0)
+    ) -> None:
+        t = to_transform(display, camera_shift)
         if isinstance(self.joint, (PivotJoint, PinJoint, DampedSpring)):
             anchor_a = self.joint.a.local_to_world(self.joint.anchor_a)
             anchor_b = self.joint.b.local_to_world(self.joint.anchor_b)
         else:
             anchor_a = self.joint.a.position
             anchor_b = self.joint.b.position
-        x1 = convert(anchor_a, h)
-        x2 = convert(anchor_b, h)
-        pygame.draw.line(display, self.color, x1, x2, 3)
+        pygame.draw.line(display, self.color, t.point(anchor_a), t.point(anchor_b), 3)
@@ -0,0 +1,308 @@
+from functools import lru_cache
+from math import degrees
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+from pygame import Rect
+from pygame.surface import Surface
+from pymunk import Body, PivotJoint, Space
+from pymunk.vec2d import Vec2d
+
+from scenes.collision import Layer, layer_filter
+from scenes.components.bullet import Bullet
+from scenes.components.controller import Controller
+from scenes.components.tank import (
+    GUN_IMAGE,
+    GUN_MAX_ANGLE,
+    MOTOR_WHEEL_IMAGE,
+    TURRET_IMAGE,
+    WHEEL_IMAGE,
+    WHEEL_R,
+    Tank,
+    TankBase,
+    TankSoundEffects,
+)
+from scenes.components.terrain import Terrain
+from scenes.dirty import union
+from scenes.resources import rotate_image
+from scenes.utils import ScreenTransform, to_transform
+
+# Distance the wheels can move up from where they sit on the full tank
+SUSPENSION_TRAVEL = 8
+# Compression of the springs under the weight of the tank
+SUSPENSION_SAG = 3
+# Share of the critical damping of the springs
+SUSPENSION_DAMPING = 0.5
+# Drive and braking force as a share of the load of a wheel, the full tank accelerates at about half g
+TRACTION = 0.5
+# Rate at which the drive closes the gap to the speed of the wheels, per second
+TRACTION_RESPONSE = 8
+
+
+class TankTemplate:
+    """
+    Layout of the full tank relative to its hull, measured on a tank built in a scratch space:
+    where the parts are drawn, where the gun pivots and the bullet leaves it, and the mass and
+    moment of the whole tank around the hull.
+    """
+
+    def __init__(self, tank: Tank) -> None:
+        base = tank.tank_base.body
+        origin = base.position
+        bodies = tank.get_bodies()[:-1]
+        self.mass = sum(body.mass for body in bodies)
+        center = base.local_to_world(base.center_of_gravity)
+        self.moment = sum(
+            body.moment + body.mass * (body.local_to_world(body.center_of_gravity) - center).get_length_sqrd()
+            for body in bodies
+        )
+        self.wheels = [w.body.position - origin for w in tank.wheels]
+        self.motor_wheel = tank.motor_wheel.body.position - origin
+        self.turret = tank.turret.body.position - origin
+        joint = next(c for c in tank.gun.body.constraints if isinstance(c, PivotJoint) and c.a is tank.turret.body)
+        pivot = tank.turret.body.local_to_world(joint.anchor_a)
+        self.gun_pivot = pivot - origin
+        self.gun = tank.gun.body.position - pivot
+        self.muzzle = tank.bullet.body.position - pivot
+        self.gun_limit_gap = tank.gun_joint.max - tank.gun_joint.min
+        # Ray starts of the suspension in the hull frame, above the centers of the wheels
+        self.probes = np.array([tuple(p) for p in (*self.wheels, self.motor_wheel)]) + (0, SUSPENSION_TRAVEL)
+
+
+@lru_cache(maxsize=1)
+def get_template() -> TankTemplate:
+    return TankTemplate(Tank(0, 0, Space(), engine_sound=False))
+
+
+class ProxyTank:
+    """
+    A stand-in for a tank far from the camera: one rigid hull with the mass of the whole tank,
+    held up by a spring under every wheel. The springs look for the ground with rays against the
+    terrain heights, which `update_proxies` casts for all the proxies of a fleet at once, and the
+    wheels in contact push the hull towards the speed the motor rate would give the wheels. The
+    gun is only an angle, and the parts are drawn where they sit on the full tank.
+
+    :param group: Collision group of the tank, like the one of the full tank
+    """
+
+    def __init__(
+        self,
+        position: Vec2d,
+        angle: float,
+        space: Space,
+        controller: Controller,
+        group: int,
+        engine_sound: bool = False,
+    ) -> None:
+        self.template = get_template()
+        self.space = space
+        self.controller = controller
+        self.group = group
+        self.collision_filter = layer_filter(Layer.TANK, group)
+        self.bullet_filter = layer_filter(Layer.BULLET, group)
+        self.tank_base = TankBase(0, 0, self.collision_filter, space)
+        self.tank_base.shape.mass = self.template.mass
+        body = self.tank_base.body
+        body.moment = self.template.moment
+        # Pymunk keeps the center of gravity in place when the angle changes, so it goes first
+        body.angle = angle
+        body.position = position
+        self.motor_rate = 0.0
+        self.gun_angle = 0.0
+        self.wheel_angle = 0.0
+        self.sound_effects = TankSoundEffects(engine=engine_sound)
+
+    @classmethod
+    def from_tank(cls, tank: Tank) -> "ProxyTank":
+        """
+        Replaces a full tank in its space with a proxy in the same pose and motion.
+        """
+        base = tank.tank_base.body
+        group = tank.collision_filter.group
+        proxy = cls(base.position, base.angle, tank.space, tank.controller, group, tank.sound_effects.engine)
+        proxy.tank_base.body.velocity = base.velocity
+        proxy.tank_base.body.angular_velocity = base.angular_velocity
+        proxy.motor_rate = tank.get_motor_rate()
+        proxy.gun_angle = min(max(tank.get_gun_angle(), 0), GUN_MAX_ANGLE)
+        tank.remove()
+        return proxy
+
+    def to_tank(self) -> Tank:
+        """
+        Replaces the proxy in its space with a full tank in the same pose and motion.
+        """
+        body = self.tank_base.body
+        self.space.remove(body, self.tank_base.shape)
+        engine_sound = self.sound_effects.engine
+        tank = Tank(0, 0, self.space, controller=self.controller, group=self.group, engine_sound=engine_sound)
+        tank.place(body.position, body.angle, body.velocity, body.angular_velocity)
+        # The gun and the bullet it holds turn around the pivot on the turret
+        pivot = body.local_to_world(self.template.gun_pivot)
+        for part in (tank.gun.body, tank.bullet.body):
+            offset = (part.position - pivot).rotated(self.gun_angle)
+            part.angle += self.gun_angle
+            part.position = pivot + offset
+        tank.gun_joint.min = self.gun_angle
+        tank.gun_joint.max = self.gun_angle + self.template.gun_limit_gap
+        # The motor keeps the wheels turning at its rate relative to the hull
+        tank.motor.rate = self.motor_rate
+        for wheel in (*tank.wheels, tank.motor_wheel):
+            wheel.body.angular_velocity = body.angular_velocity - self.motor_rate
+        return tank
+
+    def get_motor_rate(self) -> float:
+        return self.motor_rate
+
+    def get_gun_angle(self) -> float:
+        return self.gun_angle
+
+    def apply_controls(self, rate: float, gun_delta: float) -> None:
+        self.motor_rate = rate
+        self.gun_angle = min(max(self.gun_angle + gun_delta, 0), GUN_MAX_ANGLE)
+
+    def get_bodies(self) -> List[Body]:
+        return [self.tank_base.body]
+
+    def get_state(self) -> tuple:
+        return self.motor_rate, self.gun_angle, self.wheel_angle
+
+    def set_state(self, state: tuple) -> None:
+        self.motor_rate, self.gun_angle, self.wheel_angle = state
+
+    def shot(self) -> Bullet:
+        self.sound_effects.play_shot()
+        body = self.tank_base.body
+        angle = body.angle + self.gun_angle
+        x, y = body.local_to_world(self.template.gun_pivot) + self.template.muzzle.rotated(self.gun_angle + body.angle)
+        bullet = Bullet(x, y, 5, self.space)
+        bullet.shape.elasticity = 0.1
+        bullet.body.mass = 400
+        bullet.shape.filter = self.bullet_filter
+        force = bullet.start(angle)
+        body.apply_force_at_local_point((-force[0] * 4, -force[1] * 4), (0, 0))
+        return bullet
+
+    def render(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> Rect:
+        t = to_transform(display, camera_shift)
+        body = self.tank_base.body
+        template = self.template
+        wheel_angle = degrees(body.angle) + self.wheel_angle
+        areas = [
+            self.blit_part(display, t, WHEEL_IMAGE, body.local_to_world(offset), wheel_angle)
+            for offset in template.wheels
+        ]
+        areas.append(
+            self.blit_part(display, t, MOTOR_WHEEL_IMAGE, body.local_to_world(template.motor_wheel), wheel_angle)
+        )
+        areas.append(self.tank_base.render(display, t))
+        gun_angle = body.angle + self.gun_angle
+        gun = body.local_to_world(template.gun_pivot) + template.gun.rotated(gun_angle)
+        areas.append(self.blit_part(display, t, GUN_IMAGE, gun, degrees(gun_angle)))
+        turret = body.local_to_world(template.turret)
+        areas.append(self.blit_part(display, t, TURRET_IMAGE, turret, degrees(body.angle)))
+        return union(areas)
+
+    @staticmethod
+    def blit_part(display: Surface, t: ScreenTransform, path: str, position: Vec2d, angle: float) -> Rect:
+        image = rotate_image(path, t.scale, angle)
+        return display.blit(image, image.get_rect(center=t.point(position)))
+
+
+def update_proxies(proxies: Sequence[ProxyTank], terrain: Optional[Terrain], dt: float) -> None:
+    """
+    Casts the suspension rays of all the proxies in one batch and applies the spring, damping and
+    traction forces of the wheels that touch the ground. The rays go down along the hull.
+    """
+    if not proxies or terrain is None:
+        return
+    template = proxies[0].template
+    n = len(proxies)
+    bodies = [p.tank_base.body for p in proxies]
+    positions = np.array([tuple(b.position) for b in bodies])
+    velocities = np.array([tuple(b.velocity) for b in bodies])
+    angles = np.fromiter((b.angle for b in bodies), np.float64, n)
+    spins = np.fromiter((b.angular_velocity for b in bodies), np.float64, n)
+    rates = np.fromiter((p.motor_rate for p in proxies), np.float64, n)
+    cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+
+    # Offsets of the ray starts from the hull position, (proxies, wheels)
+    px, py = template.probes[:, 0], template.probes[:, 1]
+    rx, ry = cos * px - sin * py, sin * px + cos * py
+    ux, uy = np.broadcast_to(-sin, rx.shape), np.broadcast_to(cos, rx.shape)
+    length = SUSPENSION_TRAVEL + WHEEL_R + SUSPENSION_SAG
+    starts = np.stack((positions[:, 0, None] + rx, positions[:, 1, None] + ry), axis=-1)
+    ends = starts - np.stack((ux, uy), axis=-1) * length
+    hits = terrain.raycast(starts.reshape(-1, 2), ends.reshape(-1, 2)).reshape(rx.shape)
+    contact = hits <= 1
+    compression = np.where(contact, (1 - np.minimum(hits, 1)) * length, 0)
+
+    wheels = len(px)
+    gravity = abs(proxies[0].space.gravity.y)
+    mass = template.mass / wheels
+    stiffness = mass * gravity / SUSPENSION_SAG
+    damping = 2 * SUSPENSION_DAMPING * np.sqrt(stiffness * mass)
+    # Velocity of the hull at the ray starts
+    vx = velocities[:, 0, None] - spins[:, None] * ry
+    vy = velocities[:, 1, None] + spins[:, None] * rx
+    load = np.where(contact, np.maximum(stiffness * compression - damping * (vx * ux + vy * uy), 0), 0)
+    speed = vx * cos + vy * sin
+    target = (rates * WHEEL_R)[:, None]
+    drive = np.clip(mass * (target - speed) * TRACTION_RESPONSE, -TRACTION * load, TRACTION * load)
+    fx = load * ux + drive * cos
+    fy = load * uy + drive * sin
+    torques = (rx * fy - ry * fx).sum(axis=1)
+    ground_speeds = np.where(contact.any(axis=1), speed.mean(axis=1), target[:, 0])
+    for proxy, body, force, torque, ground_speed in zip(
+        proxies, bodies, np.stack((fx.sum(axis=1), fy.sum(axis=1)), axis=-1).tolist(), torques.tolist(), ground_speeds
+    ):
+        body.apply_force_at_world_point(force, body.position)
+        body.torque += torque
+        proxy.wheel_angle -= degrees(ground_speed * dt / WHEEL_R)
+
+
+def benchmark(counts=(8, 32, 64), frames: int = 300, fps: int = 60) -> None:
+    """
+    Prints the time per frame of the physics and the fleet update of tanks driving back and forth
+    over the terrain, all simulated in full and all as proxies.
+    """
+    from time import perf_counter
+
+    from scenes.components.controller import ScriptedController, TankCommand
+    from scenes.components.fleet import TankFleet
+
+    drive = [TankCommand(1)] * 90 + [TankCommand(0)] * 30 + [TankCommand(-1)] * 90 + [TankCommand(0)] * 30
+    for count in counts:
+        results = []
+        for proxies in (False, True):
+            space = Space()
+            space.gravity = 0, -1000
+            space.damping = 0.5
+            terrain = Terrain(Vec2d(0, 0), Vec2d(300 * count + 600, 0), 100, 300, space, seed=1)
+            fleet = TankFleet(terrain, proxy_margin=None)
+            for i in range(count):
+                controller = ScriptedController(drive[i % len(drive) :] + drive[: i % len(drive)])
+                tank = Tank(300 + i * 300, 360, space, controller=controller, group=16 + i, engine_sound=False)
+                fleet.add(ProxyTank.from_tank(tank) if proxies else tank)
+            # Lands the tanks
+            for _ in range(fps):
+                fleet.update(1 / fps)
+                space.step(1 / fps)
+            start = perf_counter()
+            for _ in range(frames):
+                fleet.update(1 / fps)
+                space.step(1 / fps)
+            results.append((perf_counter() - start) / frames * 1000)
+            results.append(len(space.bodies) - 2 * len(terrain.bricks))
+        full, full_bodies, proxy, proxy_bodies = results
+        print(
+            f"{count:3d} tanks: full {full:6.2f} ms ({full_bodies} bodies), proxies {proxy:6.2f} ms "
+            f"({proxy_bodies} bodies), {full / proxy:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    import os
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    benchmark()
@@ -1,62 +1,128 @@
+from collections import deque
 from itertools import pairwise
-from random import randint
-from typing import List, Tuple
+from random import Random, randrange
+from typing import Deque, List, Optional, Union
 
+import numpy as np
 import pymunk
 from pygame import draw
 from pygame.surface import Surface
 
-from scenes.components.segment import Segment
-from scenes.utils import convert
+from scenes.collision import Layer, layer_filter
+from scenes.utils import ScreenTransform, to_transform
+
+CHUNK_SEGMENTS = 8
+SEGMENT_RADIUS = 2
+FLOOR_FILTER = layer_filter(Layer.FLOOR)
+
+
+class FloorChunk:
+    """
+    A run of floor segments attached to one static body. The points, shared with the neighbouring
+    chunks at the ends, are kept in a float32 array of shape (CHUNK_SEGMENTS + 1, 2).
+    """
+
+    __slots__ = ("index", "points", "body", "shapes")
+
+    def __init__(self, index: int, points: np.ndarray, space: pymunk.Space) -> None:
+        self.index = index
+        self.points = points
+        self.body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        self.shapes: List[pymunk.Segment] = []
+        for a, b in pairwise(points.tolist()):
+            shape = pymunk.Segment(self.body, a, b, SEGMENT_RADIUS)
+            shape.friction = 1
+            shape.filter = FLOOR_FILTER
+            self.shapes.append(shape)
+        space.add(self.body, *self.shapes)
+
+    def add(self, space: pymunk.Space) -> None:
+        if self.body.space is not space:
+            space.add(self.body, *self.shapes)
+
+    def remove(self, space: pymunk.Space) -> None:
+        if self.body.space is space:
+            space.remove(self.body, *self.shapes)
 
 
 class RandomFloor:
-    def __init__(self, start_x: float, end_x: float, min_y: float, max_y: float, segments: int, space: pymunk.Space):
-        self.space = space
-        self.points: List[Tuple[int, int]] = []
-        total_width = end_x - start_x
-        self.seg_width = total_width / segments
-        self.points.append((int(start_x), int((min_y + max_y) / 2)))
-        for seg in range(segments):
-            last_x, last_y = self.points[-1]
-            next_x = int(last_x + self.seg_width)
-            next_y = randint(int(min_y), int(max_y))
-            self.points.append((next_x, next_y))
-
-        self.segments = [self.create_segment(p1, p2) for p1, p2 in pairwise(self.points)]
+    """
+    Random polyline floor streamed in chunks around the view. Every point is derived from the seed
+    and its index, so an evicted chunk comes back the same when the view returns to it.
+    """
 
+    def __init__(
+        self,
+        start_x: float,
+        end_x: float,
+        min_y: float,
+        max_y: float,
+        segments: int,
+        space: pymunk.Space,
+        seed: Optional[int] = None,
+    ):
+        self.space = space
+        self.seg_width = (end_x - start_x) / segments
+        self.chunk_width = self.seg_width * CHUNK_SEGMENTS
         self.start_x = start_x
         self.end_x = end_x
         self.min_y, self.max_y = int(min_y), int(max_y)
+        # Drawn from the global generator, so seeded runs and replays get the same floor
+        self.seed = randrange(2**32) if seed is None else seed
+        self.chunks: Deque[FloorChunk] = deque()
+        for index in range((segments + CHUNK_SEGMENTS - 1) // CHUNK_SEGMENTS):
+            self.chunks.append(self.create_chunk(index))
+
+    def get_y(self, n: int) -> int:
+        if n == 0:
+            return (self.min_y + self.max_y) // 2
+        return Random(f"{self.seed}:{n}").randint(self.min_y, self.max_y)
+
+    def create_chunk(self, index: int) -> FloorChunk:
+        first = index * CHUNK_SEGMENTS
+        points = np.empty((CHUNK_SEGMENTS + 1, 2), dtype=np.float32)
+        for i in range(CHUNK_SEGMENTS + 1):
+            points[i] = self.start_x + (first + i) * self.seg_width, self.get_y(first + i)
+        return FloorChunk(index, points, self.space)
+
+    def get_chunk_left(self, index: int) -> float:
+        return self.start_x + index * self.chunk_width
+
+    def update(self, shift: pymunk.Vec2d, width: float) -> None:
+        """
+        Keeps the chunks that overlap the view, widened by a chunk on both sides, and evicts the rest.
+
+        :param shift: Camera shift
+        :param width: Visible width in world units
+        """
+        left = -shift.x - self.chunk_width
+        right = -shift.x + width + self.chunk_width
+        chunks = self.chunks
+        while len(chunks) > 1 and self.get_chunk_left(chunks[0].index + 1) < left:
+            chunks.popleft().remove(self.space)
+        while len(chunks) > 1 and self.get_chunk_left(chunks[-1].index) > right:
+            chunks.pop().remove(self.space)
+        while self.get_chunk_left(chunks[0].index) > left:
+            chunks.appendleft(self.create_chunk(chunks[0].index - 1))
+        while self.get_chunk_left(chunks[-1].index + 1) < right:
+            chunks.append(self.create_chunk(chunks[-1].index + 1))
+
+    def get_state(self) -> tuple:
+        return tuple(self.chunks)
+
+    def set_state(self, state: tuple) -> None:
+        """
+        The rewind buffer leaves the static bodies alone, the chunks are swapped in the space here.
+        """
+        kept = set(state)
+        for chunk in self.chunks:
+            if chunk not in kept:
+                chunk.remove(self.space)
+        self.chunks = deque(state)
+        for chunk in self.chunks:
+            chunk.add(self.space)
 
-    def create_segment(self, p1: Tuple[int, int], p2: Tuple[int, int]) -> Segment:
-        s = Segment(p1, p2, 2, self.space, btype=pymunk.Body.STATIC)
-        s.shape.friction = 1
-        return s
-
-    def update(self, shift: pymunk.Vec2d) -> None:
-        ls = self.segments[0]
-        rs = self.segments[-1]
-        if ls.shape.a.x < shift.x:
-            self.segments.insert(
-                0,
-                self.create_segment(
-                    (ls.shape.a.x - self.seg_width, randint(self.min_y, self.max_y)),
-                    (ls.shape.a.x, ls.shape.a.y),
-                ),
-            )
-
-        val = shift.x + rs.shape.b.x - 1700
-        if val < 0:
-            self.segments.append(
-                self.create_segment(
-                    (rs.shape.b.x, rs.shape.b.y), (rs.shape.b.x + self.seg_width, randint(self.min_y, self.max_y))
-                )
-            )
-
-    def render(self, display: Surface, camera_shift: pymunk.Vec2d) -> None:
-        h = display.get_height()
-        for segment in self.segments:
-            a = convert(segment.shape.a + camera_shift, h)
-            b = convert(segment.shape.b + camera_shift, h)
-            draw.line(display, (255, 255, 255), a, b, 1)
+    def render(self, display: Surface, camera_shift: Union[pymunk.Vec2d, ScreenTransform]) -> None:
+        t = to_transform(display, camera_shift)
+        points = np.concatenate([chunk.points for chunk in self.chunks])
+        draw.lines(display, (255, 255, 255), False, t.points(points).tolist(), 1)
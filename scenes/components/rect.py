@@ -1,14 +1,33 @@
+from functools import lru_cache
 from math import inf
-from typing import Tuple
+from typing import List, Sequence, Tuple, Union
 
+import numpy as np
 import pygame
 import pymunk
 from pygame.surface import Surface
 
-from scenes.utils import convert
+from scenes.utils import ScreenTransform, body_arrays, to_transform
+
+Verts = Tuple[Tuple[int, int], ...]
+
+
+@lru_cache(maxsize=None)
+def get_verts(width: int, height: int) -> Verts:
+    """
+    Vertices of a centered rectangle, shared by all rectangles of the same size.
+    """
+    return (
+        (-width // 2, -height // 2),
+        (width // 2, -height // 2),
+        (width // 2, height // 2),
+        (-width // 2, height // 2),
+    )
 
 
 class Rect:
+    __slots__ = ("color", "body", "verts", "shape", "lifespan")
+
     def __init__(
         self,
         x: int,
@@ -20,27 +39,41 @@ class Rect:
         btype: int = pymunk.Body.DYNAMIC,
         lifespan: float = inf,
     ) -> None:
-        self.space = space
         self.color = color
         self.body = pymunk.Body(body_type=btype)
         self.body.position = x, y
-        verts = (
-            (-width // 2, -height // 2),
-            (width // 2, -height // 2),
-            (width // 2, height // 2),
-            (-width // 2, height // 2),
-        )
-        self.shape = pymunk.Poly(self.body, verts)
+        self.verts = get_verts(width, height)
+        self.shape = pymunk.Poly(self.body, self.verts)
         self.shape.density = 1
         self.lifespan = lifespan
         space.add(self.body, self.shape)
 
-    def update(self):
+    def update(self, space: pymunk.Space):
         self.lifespan -= 1
         if self.lifespan <= 0:
-            self.space.remove(self.body, self.shape)
+            space.remove(self.body, self.shape)
+
+    def render(
+        self, display: Surface, camera_shift: Union[pymunk.Vec2d, ScreenTransform] = pymunk.Vec2d(0, 0)
+    ) -> pygame.Rect:
+        t = to_transform(display, camera_shift)
+        return pygame.draw.polygon(display, self.color, t.body(self.body, self.verts))
+
+
+def render_rects(
+    display: Surface, camera_shift: Union[pymunk.Vec2d, ScreenTransform], rects: Sequence[Rect]
+) -> List[pygame.Rect]:
+    """
+    Renders many rectangles with a single transform of all their vertices, skipping the ones off the screen.
 
-    def render(self, display: Surface, camera_shift: pymunk.Vec2d = pymunk.Vec2d(0, 0)) -> None:
-        h = display.get_height()
-        verts = [convert(self.body.local_to_world(v) + camera_shift, h) for v in self.shape.get_vertices()]
-        pygame.draw.polygon(display, self.color, verts)
+    :return: The screen area of every drawn rectangle
+    """
+    if not rects:
+        return []
+    t = to_transform(display, camera_shift)
+    positions, angles = body_arrays([r.body for r in rects])
+    screen = t.bodies(positions, angles, np.array([r.verts for r in rects], dtype=np.float64))
+    xs = screen[..., 0]
+    visible = np.flatnonzero((xs.max(axis=1) >= 0) & (xs.min(axis=1) < display.get_width()))
+    polygons = screen.tolist()
+    return [pygame.draw.polygon(display, rects[i].color, polygons[i]) for i in visible.tolist()]
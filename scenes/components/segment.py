@@ -1,13 +1,17 @@
-from typing import Tuple
+from typing import Tuple, Union
+
+import numpy as np
 
 import pygame
 import pymunk
 from pygame.surface import Surface
 
-from scenes.utils import convert
+from scenes.utils import ScreenTransform, to_transform
 
 
 class Segment:
+    __slots__ = ("body", "shape", "r", "rect")
+
     def __init__(
         self, a: Tuple[int, int], b: Tuple[int, int], r: int, space: pymunk.Space, btype: int = pymunk.Body.DYNAMIC
     ):
@@ -27,8 +31,7 @@ class Segment:
         max_y = max(a[1], b[1]) + r
         self.rect = pygame.Rect(min_x, min_y, max_x - min_x, max_y - min_y)
 
-    def render(self, display: Surface) -> None:
-        h = display.get_height()
-        a = convert(self.shape.a, h)
-        b = convert(self.shape.b, h)
+    def render(self, display: Surface, camera_shift: Union[pymunk.Vec2d, ScreenTransform] = pymunk.Vec2d(0, 0)) -> None:
+        t = to_transform(display, camera_shift)
+        a, b = t.points(np.array((self.shape.a, self.shape.b), dtype=np.float64)).tolist()
         pygame.draw.line(display, (0, 0, 0), a, b, 10)
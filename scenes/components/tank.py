@@ -1,18 +1,52 @@
-from typing import Sequence, Tuple
+from typing import List, Optional, Sequence, Tuple, Union
 
-import pygame
 import pymunk
+from pygame import Rect
 from pygame.surface import Surface
 from pymunk import Body, GearJoint, PivotJoint, RotaryLimitJoint, Shape, ShapeFilter, SimpleMotor, Space
 from pymunk.vec2d import Vec2d
 
+from scenes.collision import Layer, layer_filter
 from scenes.components.bullet import Bullet
+from scenes.components.controller import Controller, KeyboardController, TankCommand
 from scenes.components.visual_part import VisualPart
+from scenes.dirty import get_pose, union
+from scenes.resources import load_image
+from scenes.utils import ScreenTransform, to_transform
+from scenes.sound import (
+    ENGINE_SOUNDS,
+    EXPLOSION_SOUND,
+    PRIORITY_EXPLOSION,
+    PRIORITY_SHOT,
+    SHOT_SOUND,
+    get_sound_bank,
+)
 
 TANK_WIDTH = 250
 TANK_HEIGHT = 74
 WHEEL_R = 9
 
+MOTOR_ACCELERATION = 2
+MOTOR_DECAY = 0.8
+GUN_STEP = 0.01
+GUN_MAX_ANGLE = 1
+
+BODY_IMAGE = "./scenes/assets/body.png"
+WHEEL_IMAGE = "./scenes/assets/wheel.png"
+MOTOR_WHEEL_IMAGE = "./scenes/assets/motor_wheel.png"
+TURRET_IMAGE = "./scenes/assets/turret.png"
+GUN_IMAGE = "./scenes/assets/gun.png"
+TANK_ASSETS = (
+    BODY_IMAGE,
+    WHEEL_IMAGE,
+    MOTOR_WHEEL_IMAGE,
+    TURRET_IMAGE,
+    GUN_IMAGE,
+    SHOT_SOUND,
+    EXPLOSION_SOUND,
+    *ENGINE_SOUNDS,
+)
+
 
 class TankBase(VisualPart):
     def __init__(self, left_x: int, top_y: int, cf: ShapeFilter, space: Space, debug: bool = False):
@@ -29,12 +63,12 @@ class TankBase(VisualPart):
             Vec2d(0, 0),
         )
 
-        super().__init__(left_x, top_y, raw_vertices, cf, "./scenes/assets/body.png", space, debug)
+        super().__init__(left_x, top_y, raw_vertices, cf, BODY_IMAGE, space, debug)
 
 
 class TankWheel(VisualPart):
     def __init__(self, global_x: int, global_y: int, cf: ShapeFilter, space: Space, debug: bool = False) -> None:
-        super().__init__(global_x, global_y, tuple(), cf, "./scenes/assets/wheel.png", space, debug)
+        super().__init__(global_x, global_y, tuple(), cf, WHEEL_IMAGE, space, debug)
 
     def get_obj_dimensions(self, raw_verts: Tuple[Vec2d, ...]):
         return 2 * WHEEL_R, 2 * WHEEL_R
@@ -53,14 +87,15 @@ class TankWheel(VisualPart):
         self.space.add(wheel_attachment)
         return wheel_attachment
 
-    def debug_draw(self, display: Surface):
+    def debug_draw(self, display: Surface, camera_shift: Vec2d = Vec2d(0, 0)):
         pass
 
 
 class MotorWheel(TankWheel):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.image = pygame.image.load("./scenes/assets/motor_wheel.png")
+        self.image_path = MOTOR_WHEEL_IMAGE
+        self.image = load_image(MOTOR_WHEEL_IMAGE)
 
 
 class Turret(VisualPart):
@@ -79,7 +114,7 @@ class Turret(VisualPart):
             Vec2d(71, 0),
             Vec2d(47, 15),
         )
-        super().__init__(left_x, top_y, raw_verts, cf, "./scenes/assets/turret.png", space, debug)
+        super().__init__(left_x, top_y, raw_verts, cf, TURRET_IMAGE, space, debug)
 
     def attach_to(self, tank_base: Body):
         bb = self.shape.bb
@@ -110,7 +145,7 @@ class TankGun(VisualPart):
             Vec2d(25, 2),
             Vec2d(13, 2),
         )
-        super().__init__(left_x, top_y, raw_verts, cf, "./scenes/assets/gun.png", space, debug)
+        super().__init__(left_x, top_y, raw_verts, cf, GUN_IMAGE, space, debug)
 
     def attach_to(self, turret: Turret):
         tr, tt = turret.shape.bb.right, turret.shape.bb.top
@@ -125,19 +160,23 @@ class TankGun(VisualPart):
 
 
 class TankSoundEffects:
-    def __init__(self):
-        self.engine_1 = pygame.mixer.Sound("./scenes/assets/engine1.mp3")
-        self.engine_2 = pygame.mixer.Sound("./scenes/assets/engine2.mp3")
-        self.engine_3 = pygame.mixer.Sound("./scenes/assets/engine3.mp3")
-        self.shot = pygame.mixer.Sound("./scenes/assets/fire_001.mp3")
-        self.explosion = pygame.mixer.Sound("./scenes/assets/DeathFlash.flac")
+    def __init__(self, engine: bool = True):
+        """
+        :param engine: Drive the shared engine loops with the speed of this tank. Only one tank
+            should do it at a time.
+        """
+        self.bank = get_sound_bank()
+        self.engine = engine
+
+    def play_shot(self):
+        self.bank.play(SHOT_SOUND, PRIORITY_SHOT)
 
-        self._current_speed = 0
-        self._last_diff = 0
-        self.engine_sound = self.engine_1
+    def play_explosion(self):
+        self.bank.play(EXPLOSION_SOUND, PRIORITY_EXPLOSION)
 
     def update(self, speed: float = 0):
-        pass
+        if self.engine:
+            self.bank.update_engine(speed)
 
 
 class Tank:
@@ -147,11 +186,29 @@ class Tank:
     motor: SimpleMotor
     turret_shape: Shape
     gun_joint: RotaryLimitJoint
-
-    def __init__(self, x, y, space: Space, debug: bool = False):
-        self.collision_filter = ShapeFilter(group=0b1)
+    controller: Controller
+
+    def __init__(
+        self,
+        x,
+        y,
+        space: Space,
+        debug: bool = False,
+        controller: Optional[Controller] = None,
+        group: int = 0b1,
+        engine_sound: bool = True,
+    ):
+        """
+        :param controller: Source of the driving commands, the keyboard by default
+        :param group: Collision group shared by all the parts of the tank. Tanks that have to
+            collide with each other must have different groups.
+        :param engine_sound: Let this tank drive the engine sound
+        """
+        self.collision_filter = layer_filter(Layer.TANK, group)
+        self.bullet_filter = layer_filter(Layer.BULLET, group)
         self.space = space
         self.debug = debug
+        self.controller = controller or KeyboardController()
 
         self.top_y = y + TANK_HEIGHT / 2
         self.left_x = x - TANK_WIDTH / 2
@@ -164,7 +221,7 @@ class Tank:
         self.gun = self.get_gun()
         self.bullet, self.bullet_holder = self.get_bullet()
 
-        self.sound_effects = TankSoundEffects()
+        self.sound_effects = TankSoundEffects(engine=engine_sound)
 
         self.initial_x = self.tank_base.body.position.x
 
@@ -212,17 +269,15 @@ class Tank:
         bullet = Bullet(x, y, 5, self.space)
         bullet.shape.elasticity = 0.1
         bullet.body.mass = 400
-        bullet.shape.filter = self.collision_filter
+        bullet.shape.filter = self.bullet_filter
         bullet_holder = PivotJoint(self.gun.body, bullet.body, self.gun.body.world_to_local((x, y)), (0, 0))
         self.space.add(bullet_holder)
         return bullet, bullet_holder
 
     def shot(self) -> Bullet:
-        self.sound_effects.shot.play()
-        try:
+        self.sound_effects.play_shot()
+        if self.bullet_holder in self.space.constraints:
             self.space.remove(self.bullet_holder)
-        except AssertionError:
-            pass
         force = self.bullet.start(self.gun.body.angle)
         self.tank_base.body.apply_force_at_local_point((-force[0] * 4, -force[1] * 4), (0, 0))
         prev_bullet = self.bullet
@@ -230,41 +285,87 @@ class Tank:
         self.bullet, self.bullet_holder = self.get_bullet()
         return prev_bullet
 
-    def update_velocity(self, keys: Sequence[bool]):
-        if keys[pygame.K_d]:
-            self.motor.rate += 2
-            return
-        if keys[pygame.K_a]:
-            self.motor.rate -= 2
+    def get_motor_rate(self) -> float:
+        return self.motor.rate
+
+    def get_gun_angle(self) -> float:
+        """
+        :return: Angle of the gun to the turret, 0 is level and GUN_MAX_ANGLE fully raised
+        """
+        return self.gun.body.angle - self.turret.body.angle
+
+    def apply_controls(self, rate: float, gun_delta: float) -> None:
+        self.motor.rate = rate
+        if gun_delta:
+            self.gun_joint.min += gun_delta
+            self.gun_joint.max += gun_delta
+
+    def update_velocity(self, throttle: int):
+        if throttle:
+            self.motor.rate += MOTOR_ACCELERATION * throttle
             return
 
-        self.motor.rate *= 0.8
-
-    def update_gun_angle(self, keys: Sequence[bool]):
-        relative_angle = self.gun.body.angle - self.turret.body.angle
-        if keys[pygame.K_UP] and relative_angle > 0:
-            self.gun_joint.min -= 0.01
-            self.gun_joint.max -= 0.01
-        if keys[pygame.K_DOWN] and relative_angle < 1:
-            self.gun_joint.min += 0.01
-            self.gun_joint.max += 0.01
-
-    def get_camera_shift(self) -> Vec2d:
-        current_x = self.tank_base.body.position.x
-        return Vec2d(self.initial_x - current_x, 0)
-
-    def update(self):
-        keys = pygame.key.get_pressed()
-        self.update_velocity(keys)
-        self.update_gun_angle(keys)
+        self.motor.rate *= MOTOR_DECAY
+
+    def update_gun_angle(self, elevation: int):
+        relative_angle = self.get_gun_angle()
+        if elevation > 0 and relative_angle > 0:
+            self.gun_joint.min -= GUN_STEP
+            self.gun_joint.max -= GUN_STEP
+        if elevation < 0 and relative_angle < GUN_MAX_ANGLE:
+            self.gun_joint.min += GUN_STEP
+            self.gun_joint.max += GUN_STEP
+
+    def get_bodies(self) -> List[Body]:
+        parts = (self.tank_base, *self.wheels, self.motor_wheel, self.turret, self.gun, self.bullet)
+        return [part.body for part in parts]
+
+    def get_pose(self, t: ScreenTransform) -> tuple:
+        return get_pose(self.get_bodies(), t)
+
+    def place(self, position: Vec2d, angle: float, velocity: Vec2d, angular_velocity: float) -> None:
+        """
+        Moves the whole tank rigidly, so that the hull gets the given pose and velocity.
+        """
+        origin = self.tank_base.body.position
+        turn = angle - self.tank_base.body.angle
+        for body in self.get_bodies():
+            offset = (body.position - origin).rotated(turn)
+            # The angle first, pymunk turns the body around its center of gravity
+            body.angle += turn
+            body.position = position + offset
+            body.velocity = velocity + offset.perpendicular() * angular_velocity
+            body.angular_velocity = angular_velocity
+
+    def remove(self) -> None:
+        """
+        Takes the bodies of the tank out of the space, together with their shapes and joints.
+        """
+        bodies = self.get_bodies()
+        present = set(self.space.constraints)
+        constraints = {c for body in bodies for c in body.constraints if c in present}
+        self.space.remove(*constraints, *(s for body in bodies for s in body.shapes), *bodies)
+
+    def get_state(self) -> tuple:
+        return self.bullet, self.bullet_holder, self.gun_joint.min, self.gun_joint.max, self.motor.rate
+
+    def set_state(self, state: tuple) -> None:
+        self.bullet, self.bullet_holder, self.gun_joint.min, self.gun_joint.max, self.motor.rate = state
+
+    def update(self) -> TankCommand:
+        command = self.controller.get_command(self)
+        self.update_velocity(command.throttle)
+        self.update_gun_angle(command.elevation)
         self.sound_effects.update(speed=self.motor.rate)
-
-    def render(self, display: Surface, camera_shift: Vec2d):
-        for wheel in self.wheels:
-            wheel.render(display, camera_shift)
-        self.motor_wheel.render(display, camera_shift)
-        self.tank_base.render(display, camera_shift)
-        self.gun.render(display, camera_shift)
-        self.bullet.render(display, camera_shift)
-        self.turret.render(display, camera_shift)
-        self.bullet.render(display, camera_shift)
+        return command
+
+    def render(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> Rect:
+        t = to_transform(display, camera_shift)
+        areas = [wheel.render(display, t) for wheel in self.wheels]
+        areas.append(self.motor_wheel.render(display, t))
+        areas.append(self.tank_base.render(display, t))
+        areas.append(self.gun.render(display, t))
+        areas.append(self.bullet.render(display, t))
+        areas.append(self.turret.render(display, t))
+        areas.append(self.bullet.render(display, t))
+        return union(areas)
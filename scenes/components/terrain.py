@@ -1,18 +1,112 @@
-from typing import List
+from math import floor, inf
+from queue import Empty, SimpleQueue
+from random import Random
+from typing import Dict, List, Optional, Set, Tuple, Union
 
-import pymunk
+import numpy as np
+import pygame
 from noise.perlin import SimplexNoise
+from pygame import draw
 from pygame.surface import Surface
 from pymunk.body import Body
 from pymunk.space import Space
 from pymunk.vec2d import Vec2d
 
-from scenes.components.rect import Rect
+from scenes.collision import Layer, layer_filter, query_filter
+from scenes.components.rect import Rect, get_verts, render_rects
+from scenes.dirty import get_pose
+from scenes.utils import LOD_REDUCED, ScreenTransform, body_arrays, plot_points, to_transform
+from scenes.worker import get_worker
 
 Y_BOTTOM = 300
 
+TOP_COLOR = (50, 50, 50)
+UNDERLYING_COLOR = (100, 100, 100)
+DETACHED_COLOR = (0, 0, 0)
+
+# Frames detached bricks stay in the world
+DEBRIS_LIFESPAN = 255
+# Columns generated per frame at most, e.g. when zooming out reveals a long stretch at once
+COLUMNS_PER_FRAME = 8
+TRIM_COLUMNS = 32
+# Columns per block of the coarse pass of the batched ray queries
+RAY_BLOCK_COLUMNS = 8
+# At the reduced level of detail the terrain profile is sampled every few pixels, not every column
+LOD_SAMPLE_PIXELS = 4
+# Columns drawn together into one surface by the background worker
+CHUNK_COLUMNS = 32
+# Heights of the columns ahead are computed by the background worker this many columns at a time
+HEIGHTS_AHEAD = 64
+KEY_COLOR = (255, 0, 255)
+
+# Chunk index, the key the surface was drawn for and the surface with the world coordinates of its
+# left and bottom edges
+BakedChunk = Tuple[int, tuple, Surface, float, float]
+
+
+def bake_chunk(
+    index: int, key: tuple, positions: np.ndarray, verts: np.ndarray, colors: List[Tuple[int, int, int]], scale: float
+) -> BakedChunk:
+    """
+    Draws the bricks of a chunk at the given scale with the same transform as `render_rects`, so
+    that at scale 1 the surface looks exactly like the bricks drawn one by one. Runs on the
+    background worker.
+
+    :param positions: Positions of the bricks, (M, 2)
+    :param verts: Local vertices of the bricks, (M, 4, 2)
+    """
+    world = verts + positions[:, None, :]
+    # A pixel of margin, so the edges of the outer bricks are not cut off
+    left, bottom = np.floor(world[..., 0].min()) - 1, np.floor(world[..., 1].min()) - 1
+    right, top = np.ceil(world[..., 0].max()) + 1, np.ceil(world[..., 1].max()) + 1
+    width, height = int((right - left) * scale) + 1, int((top - bottom) * scale) + 1
+    t = ScreenTransform(height, (-left, -bottom), scale)
+    polygons = t.points(world).tolist()
+    surface = Surface((width, height))
+    surface.fill(KEY_COLOR)
+    surface.set_colorkey(KEY_COLOR)
+    for polygon, color in zip(polygons, colors):
+        draw.polygon(surface, color, polygon)
+    return index, key, surface, left, bottom
+
+
+def get_cells(first: np.ndarray, last: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lists the cells from `first` to `last` of every ray, clipped to the `count` cells there are.
+
+    :return: Ray and cell index of every listed cell
+    """
+    first = np.clip(first, 0, count).astype(np.int64)
+    last = np.clip(last, -1, count - 1).astype(np.int64)
+    spans = np.maximum(last - first + 1, 0)
+    rays = np.repeat(np.arange(len(spans)), spans)
+    cells = np.arange(len(rays)) - np.repeat(np.cumsum(spans) - spans - first, spans)
+    return rays, cells
+
+
+def enter_columns(
+    x0: np.ndarray, y0: np.ndarray, dx: np.ndarray, dy: np.ndarray, edges: np.ndarray, width: float, tops: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Whether rays enter columns that are solid below their top, and the fraction of the ray at
+    which they do. A ray enters through the side when it is below the top where it reaches the
+    column, through the top otherwise.
+
+    :param edges: Left edges of the columns
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ta, tb = (edges - x0) / dx, (edges + width - x0) / dx
+        vertical = dx == 0
+        t_in = np.where(vertical, 0.0, np.clip(np.minimum(ta, tb), 0, 1))
+        t_out = np.where(vertical, 1.0, np.clip(np.maximum(ta, tb), 0, 1))
+        y_in, y_out = y0 + t_in * dy, y0 + t_out * dy
+        entered = np.minimum(y_in, y_out) < tops
+        return entered, np.where(y_in < tops, t_in, (tops - y0) / dy)
+
 
 class TerrainSegment:
+    __slots__ = ("space", "width", "height", "top_brick", "underlying_brick", "top_position")
+
     def __init__(self, top: Vec2d, width: int, heigth: int, space: Space):
         self.space = space
         self.width, self.height = width, heigth
@@ -20,13 +114,15 @@ class TerrainSegment:
         self.underlying_brick = self.create_underlying_brick(self.top_brick)
 
     def create_top_brick(self, center: Vec2d) -> Rect:
+        # Where the brick sits while it's part of the column, a rewind puts it back there
+        self.top_position = int(center.x), int(center.y)
         r = Rect(
             int(center.x),
             int(center.y),
             self.width,
             self.height,
             self.space,
-            color=(50, 50, 50),
+            color=TOP_COLOR,
             btype=Body.STATIC,
         )
         r.shape.friction = 1
@@ -37,18 +133,28 @@ class TerrainSegment:
         width = self.width
         height = Y_BOTTOM - top.shape.bb.bottom
         y = top.shape.bb.bottom - height // 2
-        return Rect(x, y, width, height, self.space, (100, 100, 100), btype=Body.STATIC)
+        return Rect(x, y, width, height, self.space, UNDERLYING_COLOR, btype=Body.STATIC)
+
+    def move(self, top: Vec2d) -> None:
+        """
+        Puts a column that was taken out of the space back at another place, with the same bricks.
+        Pymunk bodies are reference cycles, so the bricks of a dropped column are only freed by a
+        full garbage collection, which takes tens of milliseconds once thousands have piled up.
+        """
+        top_brick, underlying = self.top_brick, self.underlying_brick
+        self.top_position = int(top.x), int(top.y)
+        top_brick.body.position = self.top_position
+        top_brick.shape.cache_bb()
+        height = Y_BOTTOM - top_brick.shape.bb.bottom
+        underlying.body.position = top_brick.body.position.x, top_brick.shape.bb.bottom - height // 2
+        underlying.verts = get_verts(self.width, height)
+        underlying.shape.unsafe_set_vertices(underlying.verts)
+        self.space.add(top_brick.body, top_brick.shape, underlying.body, underlying.shape)
 
     def remove_from_space(self):
-        try:
-            self.space.remove(
-                self.top_brick.body,
-                self.top_brick.shape,
-                self.underlying_brick.body,
-                self.underlying_brick.shape,
-            )
-        except AssertionError:
-            pass
+        for brick in (self.top_brick, self.underlying_brick):
+            if brick.body.space is self.space:
+                self.space.remove(brick.body, brick.shape)
 
     def split_off(self):
         ubp = self.underlying_brick.body.position
@@ -64,67 +170,481 @@ class TerrainSegment:
 
 
 class Terrain:
-    def __init__(self, start: Vec2d, end: Vec2d, min_y: int, max_y: int, space: Space) -> None:
+    def __init__(
+        self, start: Vec2d, end: Vec2d, min_y: int, max_y: int, space: Space, seed: Optional[int] = None
+    ) -> None:
         self.min_y, self.max_y = min_y, max_y
-        self.top_group = pymunk.ShapeFilter(group=9)
-        self.underlying_group = pymunk.ShapeFilter(group=10)
+        self.top_filter = layer_filter(Layer.TERRAIN_TOP)
+        self.underlying_filter = layer_filter(Layer.TERRAIN_UNDERLYING)
+        self.debris_filter = layer_filter(Layer.DEBRIS)
+        self.debris_lifespan = DEBRIS_LIFESPAN
         self.step = 5
-        self.noise = SimplexNoise()
+        self.noise = self.create_noise(seed)
         self.space = space
         self.bricks: List[TerrainSegment] = []
         self.detached_bricks: List[Rect] = []
+        # Columns dropped left of the view, reused for the new ones on the right
+        self.spare_columns: List[TerrainSegment] = []
+        self.recycle = True
+        # Built by the first query after the columns change
+        self._tops: Optional[Tuple[float, np.ndarray, np.ndarray]] = None
+        # Bumped whenever a column is added, removed, changed or baked
+        self.revision = 0
+        # Results of the background worker: heights of the columns ahead and baked chunks
+        self.results: SimpleQueue = SimpleQueue()
+        self.heights: Dict[int, float] = {}
+        self.heights_end: Optional[int] = None
+        self.chunks: Dict[int, BakedChunk] = {}
+        self.baking: Set[tuple] = set()
+        # Bumped when the columns of a chunk change, or all of them at once after a rewind
+        self.chunk_versions: Dict[int, int] = {}
+        self.epoch = 0
+        self.last_scale = 0.0
         for x in range(int(start.x), int(end.x), self.step):
             y = self.get_y(x)
             self.bricks.append(self.create_brick(Vec2d(x, y), self.step, self.step))
 
+    @staticmethod
+    def create_noise(seed: Optional[int]) -> SimplexNoise:
+        if seed is None:
+            return SimplexNoise()
+        permutation = list(range(SimplexNoise.period))
+        Random(seed).shuffle(permutation)
+        return SimplexNoise(permutation_table=permutation)
+
     def get_y(self, x: int) -> int:
         return self.min_y + (self.max_y - self.min_y) / 2 * self.noise.noise2(x / 1000, 0)
 
     def create_brick(self, center: Vec2d, width: int, height: int) -> TerrainSegment:
+        if self.spare_columns and (self.spare_columns[-1].width, self.spare_columns[-1].height) == (width, height):
+            segment = self.spare_columns.pop()
+            segment.move(center)
+            return segment
         r = TerrainSegment(center, width, height, self.space)
-        r.top_brick.shape.filter = self.top_group
-        r.underlying_brick.shape.filter = self.underlying_group
+        r.top_brick.shape.filter = self.top_filter
+        r.underlying_brick.shape.filter = self.underlying_filter
         return r
 
-    def update(self, shift: Vec2d) -> None:
+    def get_state(self) -> tuple:
+        # The state holds on to the columns, a reused one would be somewhere else when it's restored
+        self.recycle = False
+        self.spare_columns.clear()
+        columns = tuple((s, s.top_brick, s.underlying_brick, s.top_position) for s in self.bricks)
+        detached = tuple((b, b.lifespan) for b in self.detached_bricks)
+        return columns, detached
+
+    def set_state(self, state: tuple) -> None:
+        """
+        The rewind buffer leaves the static bodies alone: the bricks of the columns are put back
+        into the space here, top bricks detached since then as static bricks at their place.
+        """
+        columns, detached = state
+        kept = {brick for _, top_brick, underlying_brick, _ in columns for brick in (top_brick, underlying_brick)}
+        kept.update(brick for brick, _ in detached)
+        for segment in self.bricks:
+            for brick in (segment.top_brick, segment.underlying_brick):
+                if brick not in kept and brick.body.space is self.space:
+                    self.space.remove(brick.body, brick.shape)
+        self._tops = None
+        self.revision += 1
+        self.epoch += 1
+        self.bricks = []
+        for segment, top_brick, underlying_brick, top_position in columns:
+            segment.top_brick, segment.underlying_brick = top_brick, underlying_brick
+            segment.top_position = top_position
+            top_brick.color = TOP_COLOR
+            top_brick.lifespan = inf
+            top_brick.shape.filter = self.top_filter
+            body = top_brick.body
+            if body.body_type != Body.STATIC:
+                if body.space is self.space:
+                    self.space.remove(body, top_brick.shape)
+                body.body_type = Body.STATIC
+                body.position = top_position
+                body.angle = 0
+            for brick in (top_brick, underlying_brick):
+                if brick.body.space is not self.space:
+                    self.space.add(brick.body, brick.shape)
+            self.bricks.append(segment)
+        self.detached_bricks = []
+        for brick, lifespan in detached:
+            brick.color = DETACHED_COLOR
+            brick.lifespan = lifespan
+            brick.shape.filter = self.debris_filter
+            self.detached_bricks.append(brick)
+
+    def update(self, shift: Vec2d, reach: float = 2100) -> None:
+        """
+        :param shift: Camera shift
+        :param reach: Distance from the left edge of the view up to which columns are generated
+        """
         for brick in self.detached_bricks:
             brick.lifespan -= 1
             if brick.lifespan <= 0:
                 self.space.remove(brick.body, brick.shape)
                 self.detached_bricks.remove(brick)
 
-        ls = self.bricks[0]
-        rs = self.bricks[-1]
         # if ls.shape.a.x < shift.x:
         #     self.segments.insert(0, self.create_segment(
         #         (ls.shape.a.x - self.seg_width, randint(self.min_y, self.max_y)),
         #         (ls.shape.a.x, ls.shape.a.y),
         #     ))
 
-        val = shift.x + rs.top_brick.body.position.x - 2100
-        if val < 0:
-            ax, ay = rs.top_brick.body.position
+        self.collect_results()
+        for _ in range(COLUMNS_PER_FRAME):
+            ax = self.bricks[-1].top_brick.body.position.x
+            if shift.x + ax - reach >= 0:
+                break
             bx = ax + self.step
-            by = self.get_y(bx)
-            self.bricks.append(self.create_brick(Vec2d(bx, by), self.step, self.step))
-            ls.remove_from_space()
-            self.bricks.remove(ls)
+            y = self.heights.pop(int(bx), None)
+            self.bricks.append(self.create_brick(Vec2d(bx, self.get_y(bx) if y is None else y), self.step, self.step))
+            self._tops = None
+            self.revision += 1
+        self.request_heights(int(self.bricks[-1].top_brick.body.position.x))
+        # Columns left of the view are dropped in batches, which keeps the column list unchanged most frames
+        hidden = int((-shift.x - self.bricks[0].top_brick.body.position.x) // self.step)
+        if hidden >= TRIM_COLUMNS:
+            hidden = min(hidden, len(self.bricks) - 1)
+            for segment in self.bricks[:hidden]:
+                segment.remove_from_space()
+            if self.recycle:
+                self.spare_columns.extend(self.bricks[:hidden])
+            del self.bricks[:hidden]
+            self._tops = None
+            self.revision += 1
+            first = self.get_chunk_index(self.bricks[0])
+            for index in [index for index in self.chunks if index < first]:
+                del self.chunks[index]
 
     def detach_tops(self, center: Vec2d, radius: int) -> None:
-        query = self.space.point_query(center, radius, self.underlying_group)
+        query = self.space.point_query(center, radius, query_filter(Layer.TERRAIN_TOP))
         shapes = set([s.shape for s in query])
-        for s in self.bricks:
+        for i, s in enumerate(self.bricks):
             if s.top_brick.shape not in shapes:
                 continue
+            index = self.get_chunk_index(s)
+            self.chunk_versions[index] = self.chunk_versions.get(index, 0) + 1
             s.top_brick.body.body_type = Body.DYNAMIC
-            s.top_brick.color = (0, 0, 0)
+            s.top_brick.color = DETACHED_COLOR
+            s.top_brick.shape.filter = self.debris_filter
             s.top_brick.body.mass = 100
-            s.top_brick.lifespan = 255
+            s.top_brick.lifespan = self.debris_lifespan
             self.detached_bricks.append(s.top_brick)
             s.split_off()
+            s.top_brick.shape.filter = self.top_filter
+            s.underlying_brick.shape.filter = self.underlying_filter
+            self.set_column_top(i)
 
-    def render(self, display: Surface, camera_shift: Vec2d) -> None:
-        for brick in self.bricks:
-            brick.render(display, camera_shift)
-        for brick in self.detached_bricks:
-            brick.render(display, camera_shift)
+    def request_heights(self, last_x: int) -> None:
+        """
+        Keeps the heights of the next HEIGHTS_AHEAD columns after `last_x` computed ahead on the
+        background worker. Columns whose height is not ready yet compute it themselves.
+        """
+        if self.heights_end is not None and self.heights_end > last_x + HEIGHTS_AHEAD // 2 * self.step:
+            return
+        start = max(last_x, self.heights_end or last_x) + self.step
+        xs = range(start, start + HEIGHTS_AHEAD * self.step, self.step)
+        self.heights_end = xs[-1]
+        get_worker().submit(lambda: {x: self.get_y(x) for x in xs}, self.results)
+
+    def collect_results(self) -> None:
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except Empty:
+                return
+            if isinstance(result, dict):
+                self.heights.update(result)
+            else:
+                index, key = result[:2]
+                self.baking.discard(key)
+                # A failed bake hands back only its index and key, the chunk is drawn brick by brick
+                # and baked again on the next frame
+                if len(result) == 2:
+                    continue
+                self.chunks[index] = result
+                # Drawn from the baked surface the columns can be a pixel off from drawn brick by brick
+                self.revision += 1
+
+    def get_chunk_index(self, segment: TerrainSegment) -> int:
+        return int(segment.top_brick.body.position.x // self.step) // CHUNK_COLUMNS
+
+    def get_column_tops(self) -> Tuple[float, np.ndarray, np.ndarray]:
+        """
+        :return: x-coordinate of the left edge of the first column, the y-coordinate of the top of
+            every column and the highest top of every RAY_BLOCK_COLUMNS columns
+        """
+        if self._tops is None:
+            tops = np.fromiter((s.top_brick.shape.bb.top for s in self.bricks), np.float64, len(self.bricks))
+            left = self.bricks[0].top_brick.shape.bb.left if self.bricks else 0.0
+            padded = np.full(-(-len(tops) // RAY_BLOCK_COLUMNS) * RAY_BLOCK_COLUMNS, -np.inf)
+            padded[: len(tops)] = tops
+            self._tops = left, tops, padded.reshape(-1, RAY_BLOCK_COLUMNS).max(axis=1)
+        return self._tops
+
+    def set_column_top(self, i: int) -> None:
+        """
+        Updates the cached top of one column after its top brick changed, instead of dropping the
+        whole cache. Queried every frame, e.g. by the proxy tanks, a rebuild costs milliseconds.
+        """
+        self.revision += 1
+        if self._tops is None:
+            return
+        _, tops, block_tops = self._tops
+        tops[i] = self.bricks[i].top_brick.shape.bb.top
+        block = i // RAY_BLOCK_COLUMNS
+        block_tops[block] = tops[block * RAY_BLOCK_COLUMNS : (block + 1) * RAY_BLOCK_COLUMNS].max()
+
+    def get_heights(self, xs: np.ndarray) -> np.ndarray:
+        """
+        :return: Height of the ground at every x, NaN outside the generated columns
+        """
+        left, tops, _ = self.get_column_tops()
+        columns = np.floor((np.asarray(xs, dtype=np.float64) - left) / self.step).astype(np.int64)
+        inside = (columns >= 0) & (columns < len(tops))
+        return np.where(inside, tops[np.clip(columns, 0, max(len(tops) - 1, 0))] if len(tops) else np.nan, np.nan)
+
+    def raycast(self, starts: np.ndarray, ends: np.ndarray, obstacles: int = 0) -> np.ndarray:
+        """
+        Casts a batch of rays against the column heights instead of the brick shapes: the ground
+        is taken as solid below the top of every column, and parts of rays beyond the generated
+        columns hit nothing. Rays are first tested against the highest column of every block of
+        columns they cross, and against single columns only in the blocks they may enter. Debris
+        and other moving shapes are looked up in the space, one query per ray, for the layers in
+        `obstacles`.
+
+        :param starts: Ray starts, shape (n, 2)
+        :param ends: Ray ends, shape (n, 2)
+        :param obstacles: Layers of the shapes in the space that block the rays as well
+        :return: Fraction of every ray up to the first hit, inf for rays that hit nothing
+        """
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+        hits = np.full(len(starts), np.inf)
+        left, tops, block_tops = self.get_column_tops()
+        if len(tops):
+            x0, y0 = starts[:, 0], starts[:, 1]
+            dx, dy = ends[:, 0] - x0, ends[:, 1] - y0
+            low, high = np.minimum(x0, ends[:, 0]) - left, np.maximum(x0, ends[:, 0]) - left
+            block_width = self.step * RAY_BLOCK_COLUMNS
+            rays, blocks = get_cells(low // block_width, high // block_width, len(block_tops))
+            edges = left + blocks * block_width
+            near, _ = enter_columns(x0[rays], y0[rays], dx[rays], dy[rays], edges, block_width, block_tops[blocks])
+            rays = np.repeat(rays[near], RAY_BLOCK_COLUMNS)
+            columns = (blocks[near, None] * RAY_BLOCK_COLUMNS + np.arange(RAY_BLOCK_COLUMNS)).ravel()
+            # Columns of the block that the ray doesn't reach
+            edges = columns * self.step
+            inside = (edges + self.step > low[rays]) & (edges <= high[rays]) & (columns < len(tops))
+            rays, columns = rays[inside], columns[inside]
+            edges = left + columns * self.step
+            entered, t = enter_columns(x0[rays], y0[rays], dx[rays], dy[rays], edges, self.step, tops[columns])
+            np.minimum.at(hits, rays[entered], t[entered])
+        if obstacles:
+            shape_filter = query_filter(obstacles)
+            for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+                reach = min(hits[i], 1.0)
+                end = start[0] + (end[0] - start[0]) * reach, start[1] + (end[1] - start[1]) * reach
+                info = self.space.segment_query_first(start, end, 0, shape_filter)
+                if info is not None:
+                    hits[i] = info.alpha * reach
+        return hits
+
+    def line_of_sight(self, starts: np.ndarray, ends: np.ndarray, obstacles: int = 0) -> np.ndarray:
+        """
+        :return: For every ray, whether nothing lies between its start and its end
+        """
+        return np.isinf(self.raycast(starts, ends, obstacles))
+
+    def get_visible_range(self, t: ScreenTransform, width: int) -> slice:
+        """
+        Indices of the columns between the screen x-coordinates 0 and `width`. The columns are
+        evenly spaced, so no column has to be looked at.
+        """
+        if not self.bricks:
+            return slice(0, 0)
+        first_x = self.bricks[0].top_brick.body.position.x
+        start = min(max(int((t.world_x(0) - first_x) // self.step) - 1, 0), len(self.bricks))
+        end = min(max(int((t.world_x(width) - first_x) // self.step) + 2, start), len(self.bricks))
+        return slice(start, end)
+
+    def render(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> List[pygame.Rect]:
+        t = to_transform(display, camera_shift)
+        self.render_columns(display, t)
+        return self.render_debris(display, t)
+
+    def render_columns(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> None:
+        """
+        Chunks of columns are blitted from surfaces baked by the background worker. Chunks that
+        are not baked at the current scale yet, e.g. changed by an explosion, are drawn brick by
+        brick meanwhile. The columns only change with the `revision`.
+        """
+        t = to_transform(display, camera_shift)
+        if t.lod >= LOD_REDUCED:
+            self.render_reduced(display, t)
+            return
+        self.collect_results()
+        visible = self.get_visible_range(t, display.get_width())
+        # Scales in the middle of a zoom are not worth baking
+        steady = t.scale == self.last_scale
+        self.last_scale = t.scale
+        unbaked: List[TerrainSegment] = []
+        if visible.stop > visible.start:
+            first_column = int(self.bricks[0].top_brick.body.position.x // self.step)
+            first_chunk = self.get_chunk_index(self.bricks[visible.start])
+            for index in range(first_chunk, self.get_chunk_index(self.bricks[visible.stop - 1]) + 1):
+                start = max(index * CHUNK_COLUMNS - first_column, 0)
+                end = (index + 1) * CHUNK_COLUMNS - first_column
+                columns = self.bricks[start:end]
+                key = (self.epoch, self.chunk_versions.get(index, 0), len(columns), t.scale)
+                baked = self.chunks.get(index)
+                if baked is not None and baked[1] == key:
+                    _, _, surface, left, bottom = baked
+                    # The bricks are at whole pixels of the surface, so it's placed where their
+                    # truncated screen coordinates are, also left of the screen
+                    x = floor((left + t.shift_x) * t.scale)
+                    y = t.screen_h - floor((bottom + t.shift_y) * t.scale) - surface.get_height()
+                    display.blit(surface, (x, y))
+                    continue
+                # The last chunk is still growing
+                if steady and end < len(self.bricks) and key not in self.baking:
+                    self.bake(index, key, columns, t.scale)
+                unbaked.extend(self.bricks[max(start, visible.start) : min(end, visible.stop)])
+        rects = [s.underlying_brick for s in unbaked]
+        rects.extend(s.top_brick for s in unbaked)
+        render_rects(display, t, rects)
+
+    def render_debris(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> List[pygame.Rect]:
+        """
+        Draws the detached bricks, as points when zoomed out.
+
+        :return: The screen area of the debris
+        """
+        t = to_transform(display, camera_shift)
+        if t.lod < LOD_REDUCED:
+            return render_rects(display, t, self.detached_bricks)
+        if not self.detached_bricks:
+            return []
+        positions, _ = body_arrays([b.body for b in self.detached_bricks])
+        points = t.points(positions)
+        plot_points(display, points, DETACHED_COLOR)
+        (left, top), (right, bottom) = points.min(axis=0), points.max(axis=0)
+        return [pygame.Rect(int(left), int(top), int(right - left) + 1, int(bottom - top) + 1)]
+
+    def get_debris_pose(self, t: ScreenTransform) -> tuple:
+        """
+        Changes when the detached bricks would be drawn differently, see `DirtyRenderer`.
+        """
+        return get_pose([brick.body for brick in self.detached_bricks], t)
+
+    def bake(self, index: int, key: tuple, columns: List[TerrainSegment], scale: float) -> None:
+        """
+        Copies the bricks of a chunk and has the background worker draw them.
+        """
+        rects = [s.underlying_brick for s in columns]
+        rects.extend(s.top_brick for s in columns)
+        positions, _ = body_arrays([r.body for r in rects])
+        verts = np.array([r.verts for r in rects], dtype=np.float64)
+        colors = [r.color for r in rects]
+        self.baking.add(key)
+        get_worker().submit(
+            lambda: bake_chunk(index, key, positions, verts, colors, scale), self.results, failed=(index, key)
+        )
+
+    def render_reduced(self, display: Surface, t: ScreenTransform) -> None:
+        """
+        Draws the terrain profile sampled every few pixels, so the cost depends on the width of the
+        display and not on the number of visible columns.
+        """
+        visible = self.get_visible_range(t, display.get_width())
+        if visible.stop > visible.start:
+            stride = max(int(LOD_SAMPLE_PIXELS / (self.step * t.scale)), 1)
+            last = self.bricks[visible.stop - 1]
+            columns = self.bricks[visible.start : visible.stop - 1 : stride] + [last]
+            if len(columns) > 1:
+                profile = np.empty((2, len(columns), 2), dtype=np.float64)
+                for i, s in enumerate(columns):
+                    top, underlying = s.top_brick, s.underlying_brick
+                    x, y = top.body.position
+                    profile[0, i] = x, y + top.verts[2][1]
+                    profile[1, i] = x, underlying.body.position.y + underlying.verts[0][1]
+                tops, bottoms = t.points(profile).tolist()
+                draw.polygon(display, UNDERLYING_COLOR, tops + bottoms[::-1])
+                draw.lines(display, TOP_COLOR, False, tops, max(round(self.step * t.scale), 1))
+
+
+def benchmark_rays(rays: Tuple[int, ...] = (1000, 10000), repeats: int = 5) -> None:
+    """
+    Prints the time of line-of-sight checks from above the ground to targets across the view,
+    batched against the column heights and one segment query per ray against the bricks.
+    """
+    from time import perf_counter
+
+    space = Space()
+    terrain = Terrain(Vec2d(0, 0), Vec2d(2300, 0), 100, 300, space, seed=1)
+    rng = np.random.default_rng(1)
+    bricks = query_filter(Layer.TERRAIN_TOP | Layer.TERRAIN_UNDERLYING)
+    for count in rays:
+        xs = rng.uniform(0, 2300, (2, count))
+        starts = np.column_stack((xs[0], terrain.get_heights(xs[0]) + rng.uniform(5, 60, count)))
+        ends = np.column_stack((xs[1], terrain.get_heights(xs[1]) + rng.uniform(5, 60, count)))
+        times = []
+        for _ in range(repeats):
+            start = perf_counter()
+            batched = terrain.line_of_sight(starts, ends)
+            times.append(perf_counter() - start)
+        start = perf_counter()
+        queried = np.array(
+            [space.segment_query_first(a, b, 0, bricks) is None for a, b in zip(starts.tolist(), ends.tolist())]
+        )
+        query_time = perf_counter() - start
+        print(
+            f"{count:6d} rays: batched {min(times) * 1000:7.2f} ms, segment queries {query_time * 1000:7.2f} ms, "
+            f"{batched.mean() * 100:.0f}% clear, {(batched == queried).mean() * 100:.1f}% agree"
+        )
+
+
+def benchmark_scrolling(speed: float = 30, frames: int = 600, fps: int = 60) -> None:
+    """
+    Prints the frame times of the terrain scrolling by at `speed` pixels per frame, drawn brick by
+    brick and from the baked chunks. The frames wait for the frame clock like the game does, which
+    is when the background worker gets to run.
+    """
+    import time
+
+    import pygame
+
+    pygame.init()
+    display = pygame.display.set_mode((2300, 700))
+    for baked in (False, True):
+        space = Space()
+        terrain = Terrain(Vec2d(0, 0), Vec2d(2300, 0), 100, 300, space, seed=1)
+        times = []
+        for frame in range(frames):
+            start = time.perf_counter()
+            t = ScreenTransform(display.get_height(), (-frame * speed, 0))
+            terrain.update(t.shift, 2300 + 500)
+            display.fill((255, 255, 255))
+            if baked:
+                terrain.render(display, t)
+            else:
+                columns = terrain.bricks[terrain.get_visible_range(t, display.get_width())]
+                rects = [s.underlying_brick for s in columns]
+                rects.extend(s.top_brick for s in columns)
+                render_rects(display, t, rects + terrain.detached_bricks)
+            times.append(time.perf_counter() - start)
+            time.sleep(max(1 / fps - times[-1], 0))
+        times_ms = np.array(times[fps:]) * 1000
+        print(
+            f"{'baked chunks' if baked else 'brick by brick':14s} at {speed:.0f} px per frame: mean "
+            f"{times_ms.mean():.2f} ms, 99th percentile {np.percentile(times_ms, 99):.2f} ms, "
+            f"max {times_ms.max():.2f} ms"
+        )
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    import os
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    benchmark_rays()
+    benchmark_scrolling()
@@ -10,7 +10,8 @@ from pymunk.vec2d import Vec2d
 
 from scenes.components.ball import Ball
 from scenes.components.bullet import Bullet
-from scenes.utils import convert, get_height, get_width, raw_to_poly
+from scenes.resources import load_image, rotate_image
+from scenes.utils import ScreenTransform, get_height, get_width, raw_to_poly, to_transform
 
 
 class VisualPart:
@@ -39,7 +40,8 @@ class VisualPart:
         self.body = self.generate_body(left_x, top_y)
         self.shape = self.generate_shape(raw_verts, cf)
 
-        self.image = pygame.image.load(image_path)
+        self.image_path = image_path
+        self.image = load_image(image_path)
         self.rect = self.image.get_rect()
 
         self.debug = debug
@@ -61,22 +63,22 @@ class VisualPart:
         self.space.add(shape)
         return shape
 
-    def debug_draw(self, display: Surface):
-        h = display.get_height()
+    def debug_draw(self, display: Surface, camera_shift: Union[pymunk.Vec2d, ScreenTransform] = pymunk.Vec2d(0, 0)):
+        t = to_transform(display, camera_shift)
         # Draw the shape
-        verts = [convert(self.body.local_to_world(v), h) for v in self.shape.get_vertices()]
-        draw.polygon(display, (255, 255, 0), verts, 1)
+        draw.polygon(display, (255, 255, 0), t.body(self.body, self.shape.get_vertices()), 1)
         # Draw the center of mass
-        draw.circle(display, (255, 255, 0), convert(self.body.position, h), 2, 1)
+        draw.circle(display, (255, 255, 0), t.point(self.body.position), 2, 1)
 
-    def get_render_position(self, camera_shift: pymunk.Vec2d = pymunk.Vec2d(0, 0)) -> pymunk.Vec2d:
-        return self.body.position + camera_shift
+    def get_render_position(self) -> pymunk.Vec2d:
+        return self.body.position
 
-    def render(self, display: Surface, camera_shift: pymunk.Vec2d):
-        h = display.get_height()
-        rotated_image = pygame.transform.rotate(self.image, degrees(self.body.angle))
-        new_rect = rotated_image.get_rect(center=convert(self.get_render_position(camera_shift), h))
-        display.blit(rotated_image, new_rect)
+    def render(self, display: Surface, camera_shift: Union[pymunk.Vec2d, ScreenTransform]) -> pygame.Rect:
+        t = to_transform(display, camera_shift)
+        rotated_image = rotate_image(self.image_path, t.scale, degrees(self.body.angle))
+        new_rect = rotated_image.get_rect(center=t.point(self.get_render_position()))
+        area = display.blit(rotated_image, new_rect)
 
         if self.debug:
-            self.debug_draw(display)
+            self.debug_draw(display, t)
+        return area
@@ -0,0 +1,15 @@
+from pymunk import Vec2d
+
+from scenes.components.bitmap_terrain import BitmapTerrain
+from scenes.tank import TankScene
+
+
+class CraterScene(TankScene):
+    """
+    The tank scene on bitmap terrain, explosions leave round craters, overhangs and tunnels.
+    """
+
+    floor: BitmapTerrain
+
+    def create_terrain(self) -> BitmapTerrain:
+        return BitmapTerrain(Vec2d(0, 0), Vec2d(self.display.get_width(), 0), 100, 300, self.space, seed=self.seed)
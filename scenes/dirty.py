@@ -0,0 +1,236 @@
+from math import radians
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from pygame import Rect
+from pygame.surface import Surface
+from pymunk import Body
+
+from scenes.utils import ScreenTransform, body_arrays
+
+# What a renderer reports it drew to: a rectangle, one per sprite, or None when it can't tell,
+# which makes the whole display dirty
+DirtyArea = Union[Rect, List[Rect], None]
+
+# What the scene draws over the static layer: the entity, its pose and how to draw it. A sprite whose
+# pose is the same as when it was last drawn stays on the display, a None pose draws it every frame.
+Sprite = Tuple[Any, Optional[tuple], Callable[[Surface, ScreenTransform], DirtyArea]]
+
+# Bodies turned by less than this since they were last drawn are left as they are
+POSE_ANGLE_STEP = radians(0.5)
+
+# Above this share of the display changed, one update of the whole display is cheaper
+FULL_UPDATE_SHARE = 0.5
+
+
+def union(areas: Sequence[Rect]) -> Rect:
+    """
+    The area covering all given areas, except the empty ones, which would stretch it to their
+    position. Empty when all of them are.
+    """
+    areas = [area for area in areas if area.width and area.height]
+    return areas[0].unionall(areas[1:]) if areas else Rect(0, 0, 0, 0)
+
+
+def get_pose(bodies: Sequence[Body], t: ScreenTransform) -> tuple:
+    """
+    The screen pixels of the bodies and their angles in POSE_ANGLE_STEP, which change when the drawn
+    bodies would look different. A tank rocking at rest moves by less.
+    """
+    if not bodies:
+        return ()
+    positions, angles = body_arrays(bodies)
+    points = np.round(t.points(positions)).astype(np.int64)
+    steps = np.round(angles / POSE_ANGLE_STEP).astype(np.int64)
+    return tuple(points.ravel().tolist()), tuple(steps.tolist())
+
+
+def get_sprite(entity: Any, t: ScreenTransform) -> Sprite:
+    """
+    An entity drawn with its `render`, which is drawn every frame unless it has a `get_pose`.
+    """
+    pose = entity.get_pose(t) if hasattr(entity, "get_pose") else None
+    return entity, pose, entity.render
+
+
+def get_rects(area: DirtyArea) -> List[Rect]:
+    if area is None:
+        return []
+    return [area] if isinstance(area, Rect) else list(area)
+
+
+# The view follows the camera once it is this many pixels away. A tank rocking at rest moves the
+# camera back and forth by a few pixels, which would redraw the static layer every few frames.
+VIEW_DEAD_ZONE = 4
+
+
+def snap_transform(t: ScreenTransform) -> ScreenTransform:
+    """
+    The transform with its shift rounded to whole screen pixels, so that the static layer and the
+    sprites drawn over it line up.
+    """
+    return ScreenTransform(
+        t.screen_h, (round(t.shift_x * t.scale) / t.scale, round(t.shift_y * t.scale) / t.scale), t.scale, t.lod
+    )
+
+
+class DirtyRenderer:
+    """
+    Draws a scene in two layers. The static layer, e.g. the background and the settled terrain,
+    is drawn on a cached surface whenever its key changes, which includes the camera transform.
+    The sprites are drawn over it. A sprite that moved, or has no pose, is erased by restoring the
+    static layer under where it was drawn, and drawn again. A sprite that kept its pose is left on
+    the display, unless something drawn or erased before it in this frame overlaps it. Only the
+    erased and drawn areas need to be passed to `pygame.display.update`.
+    """
+
+    def __init__(self) -> None:
+        self.static: Optional[Surface] = None
+        self.static_key: Any = None
+        self.view: Optional[ScreenTransform] = None
+        # Sprites on the display by the id of their entity: the entity, its pose and where it was drawn
+        self.drawn: Dict[int, Tuple[Any, Optional[tuple], List[Rect]]] = {}
+        # Whether a sprite drew somewhere it couldn't tell in the last frame
+        self.unknown = False
+        self.full_frames = 0
+        self.dirty_frames = 0
+
+    def get_view(self, t: ScreenTransform) -> ScreenTransform:
+        view = self.view
+        if (
+            view is None
+            or (view.screen_h, view.scale, view.lod) != (t.screen_h, t.scale, t.lod)
+            or abs(t.shift_x - view.shift_x) * t.scale >= VIEW_DEAD_ZONE
+            or abs(t.shift_y - view.shift_y) * t.scale >= VIEW_DEAD_ZONE
+        ):
+            self.view = view = snap_transform(t)
+        return view
+
+    def render(
+        self,
+        display: Surface,
+        t: ScreenTransform,
+        static_key: Any,
+        render_static: Callable[[Surface, ScreenTransform], None],
+        get_sprites: Callable[[ScreenTransform], Iterable[Sprite]],
+    ) -> Optional[List[Rect]]:
+        """
+        :param t: Transform of the camera, the view follows it as described at VIEW_DEAD_ZONE
+        :param static_key: Changes whenever the static layer has to be redrawn
+        :param get_sprites: What is drawn over the static layer, in drawing order
+        :return: The areas of the display that changed, None for all of it
+        """
+        t = self.get_view(t)
+        screen = display.get_rect()
+        key = (t.shift_x, t.shift_y, t.scale, t.lod, screen.size, static_key)
+        sprites = list(get_sprites(t))
+        full = key != self.static_key
+        if full:
+            if self.static is None or self.static.get_size() != screen.size:
+                self.static = Surface(screen.size).convert(display)
+            render_static(self.static, t)
+            self.static_key = key
+        restored = full or self.unknown
+        if restored:
+            display.blit(self.static, (0, 0))
+            self.drawn = {}
+        still = set()
+        for entity, pose, _ in sprites:
+            last = self.drawn.get(id(entity))
+            if pose is not None and last is not None and last[0] is entity and last[1] == pose:
+                still.add(id(entity))
+        dirty = [rect for i, (_, _, rects) in self.drawn.items() if i not in still for rect in rects]
+        for rect in dirty:
+            display.blit(self.static, rect, rect)
+
+        drawn = {}
+        complete = True
+        for entity, pose, draw in sprites:
+            i = id(entity)
+            if i in still:
+                rects = self.drawn[i][2]
+                if all(rect.collidelist(dirty) == -1 for rect in rects):
+                    drawn[i] = self.drawn[i]
+                    continue
+            area = draw(display, t)
+            complete = complete and area is not None
+            rects = [rect.clip(screen) for rect in get_rects(area)]
+            rects = [rect for rect in rects if rect.width and rect.height]
+            dirty.extend(rects)
+            drawn[i] = entity, pose, rects
+        self.drawn = drawn
+        # Unknown areas can't be restored selectively in the next frame
+        self.unknown = not complete
+        changed = sum(r.width * r.height for r in dirty)
+        if restored or not complete or changed > screen.width * screen.height * FULL_UPDATE_SHARE:
+            self.full_frames += 1
+            return None
+        self.dirty_frames += 1
+        return dirty
+
+    def report(self) -> str:
+        return f"{self.dirty_frames} frames updated in parts, {self.full_frames} in full"
+
+
+# Frames the tank scene runs before the benchmark, until the tank has come to rest
+SETTLE_FRAMES = 300
+
+
+def benchmark(frames: int = 600) -> None:
+    """
+    Renders the tank scene with the tank at rest, idle and with a shot every 2 s, once redrawing and
+    updating the whole display every frame and once with a `DirtyRenderer`, and prints the frame
+    times and the share of the display updated.
+    """
+    import random
+    from time import perf_counter
+
+    import pygame
+    from pygame.event import Event
+
+    from scenes.tank import TankScene
+
+    pygame.init()
+    display = pygame.display.set_mode((2300, 700))
+    pixels = display.get_width() * display.get_height()
+    for shots in (False, True):
+        for dirty in (False, True):
+            random.seed(1)
+            # On this terrain the tank comes to rest, on some others, e.g. seed 1, it keeps rocking
+            scene = TankScene(display, 60, seed=2)
+            if dirty:
+                scene.dirty_renderer = DirtyRenderer()
+            for _ in range(SETTLE_FRAMES):
+                scene.update()
+            times = []
+            updated = 0
+            for frame in range(frames):
+                if shots and frame % 120 == 60:
+                    scene.handle_event(Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+                scene.update()
+                start = perf_counter()
+                rects = scene.render()
+                if rects is None:
+                    pygame.display.update()
+                    updated += pixels
+                else:
+                    pygame.display.update(rects)
+                    updated += sum(r.width * r.height for r in rects)
+                times.append(perf_counter() - start)
+            times.sort()
+            print(
+                f"{'shots' if shots else 'idle':5s} {'dirty' if dirty else 'full':5s}: render and update mean "
+                f"{sum(times) / frames * 1000:5.2f} ms, median {times[frames // 2] * 1000:5.2f} ms, "
+                f"{updated / frames / pixels * 100:5.1f}% of the display updated per frame"
+            )
+            if dirty:
+                print(scene.dirty_renderer.report())
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    import os
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    benchmark()
@@ -0,0 +1,200 @@
+from collections import deque
+from logging import getLogger
+from typing import Any, Deque, List, Sequence, Tuple
+
+from scenes import resources
+from scenes.components.explosion import Explosion
+from scenes.components.terrain import DEBRIS_LIFESPAN
+
+log = getLogger()
+
+# Frames averaged before deciding, and waited after every change before deciding again
+WINDOW = 30
+# Share of the frame budget above which the quality goes down, and below which it goes up
+STEP_DOWN_LOAD = 0.95
+STEP_UP_LOAD = 0.6
+# Pymunk's default
+PHYSICS_ITERATIONS = 10
+
+
+class QualityLevel:
+    """
+    :param debris_lifespan: Frames detached terrain bricks stay in the world
+    :param budget_factor: Share of the scene's entity budgets kept, e.g. of the particles
+    :param explosion_step: Explosion stages advanced per frame
+    :param rotation_step: Degrees the sprite rotations are rounded to and cached at, 0 rotates exactly
+    :param iterations: Iterations of the physics solver per step
+    """
+
+    def __init__(
+        self,
+        name: str,
+        debris_lifespan: int = DEBRIS_LIFESPAN,
+        budget_factor: float = 1.0,
+        explosion_step: int = 1,
+        rotation_step: float = 0.0,
+        iterations: int = PHYSICS_ITERATIONS,
+    ) -> None:
+        self.name = name
+        self.debris_lifespan = debris_lifespan
+        self.budget_factor = budget_factor
+        self.explosion_step = explosion_step
+        self.rotation_step = rotation_step
+        self.iterations = iterations
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.name}: debris {self.debris_lifespan} frames, budgets x{self.budget_factor}, "
+            f"explosion step {self.explosion_step}, rotation step {self.rotation_step} deg, "
+            f"{self.iterations} solver iterations"
+        )
+
+
+# Best first, every level gives up a little more than the one before
+LEVELS: Tuple[QualityLevel, ...] = (
+    QualityLevel("full"),
+    QualityLevel("short debris", debris_lifespan=120),
+    QualityLevel("fewer particles", debris_lifespan=120, budget_factor=0.5),
+    QualityLevel("short explosions", debris_lifespan=120, budget_factor=0.5, explosion_step=2),
+    QualityLevel("coarse rotations", debris_lifespan=60, budget_factor=0.5, explosion_step=2, rotation_step=6),
+    QualityLevel(
+        "coarse physics", debris_lifespan=60, budget_factor=0.25, explosion_step=2, rotation_step=6, iterations=6
+    ),
+    QualityLevel("minimum", debris_lifespan=30, budget_factor=0.25, explosion_step=4, rotation_step=12, iterations=4),
+)
+
+
+def apply_level(scene: Any, level: QualityLevel) -> None:
+    """
+    Sets the knobs of a level on whatever the scene has of them.
+    """
+    space = getattr(scene, "space", None)
+    if space is not None:
+        space.iterations = level.iterations
+    lifecycle = getattr(scene, "lifecycle", None)
+    if lifecycle is not None:
+        # The class attribute keeps the budgets of the full quality
+        lifecycle.budgets = {t: max(int(n * level.budget_factor), 1) for t, n in type(scene).budgets.items()}
+    floor = getattr(scene, "floor", None)
+    if hasattr(floor, "debris_lifespan"):
+        floor.debris_lifespan = level.debris_lifespan
+        for brick in floor.detached_bricks:
+            brick.lifespan = min(brick.lifespan, level.debris_lifespan)
+    for entity in getattr(scene, "objects", ()):
+        if isinstance(entity, Explosion):
+            entity.stage_step = level.explosion_step
+    resources.set_rotation_step(level.rotation_step)
+
+
+class Governor:
+    """
+    Keeps the frames within their time budget by trading quality for time. When the frames of the
+    last WINDOW frames took on average more than STEP_DOWN_LOAD of the budget, the next level down
+    is applied; when they took less than STEP_UP_LOAD, the next level up. The new level is given
+    another WINDOW frames to show its effect before the next change.
+
+    :param fps: Frame rate the budget is derived from
+    """
+
+    def __init__(self, fps: int, levels: Sequence[QualityLevel] = LEVELS) -> None:
+        self.budget = 1 / fps
+        self.levels = levels
+        self.level = 0
+        self.frame_times: Deque[float] = deque(maxlen=WINDOW)
+        self.frame = 0
+        # Frame, previous and new level, mean frame time that caused the change
+        self.transitions: List[Tuple[int, int, int, float]] = []
+        self.scene: Any = None
+        self.space: Any = None
+        log.info("Quality levels:\n" + "\n".join(f"  {i}. {level}" for i, level in enumerate(levels)))
+
+    def set_level(self, level: int, mean: float) -> None:
+        log.info(
+            f"Quality {self.level} ({self.levels[self.level].name}) -> {level} ({self.levels[level].name}) "
+            f"at frame {self.frame}: {mean * 1000:.1f} ms per frame, the budget is {self.budget * 1000:.1f} ms"
+        )
+        self.transitions.append((self.frame, self.level, level, mean))
+        self.level = level
+        self.frame_times.clear()
+        apply_level(self.scene, self.levels[level])
+
+    def update(self, scene: Any, frame_time: float) -> None:
+        """
+        :param frame_time: Seconds the last frame took, without the wait for the frame clock
+        """
+        self.frame += 1
+        if scene is not self.scene or getattr(scene, "space", None) is not self.space:
+            # A new scene, or a reset one, comes with its default settings, the current level is applied again
+            self.scene, self.space = scene, getattr(scene, "space", None)
+            self.frame_times.clear()
+            apply_level(scene, self.levels[self.level])
+            return
+        self.frame_times.append(frame_time)
+        if len(self.frame_times) < WINDOW:
+            return
+        mean = sum(self.frame_times) / len(self.frame_times)
+        if mean > self.budget * STEP_DOWN_LOAD and self.level < len(self.levels) - 1:
+            self.set_level(self.level + 1, mean)
+        elif mean < self.budget * STEP_UP_LOAD and self.level > 0:
+            self.set_level(self.level - 1, mean)
+
+    def report(self) -> str:
+        return (
+            f"Quality {self.level} ({self.levels[self.level].name}) after {len(self.transitions)} changes: "
+            + ", ".join(f"{old}->{new} at {frame}" for frame, old, new, _ in self.transitions)
+        )
+
+
+def benchmark(frames: int = 1800, fps: int = 60) -> None:
+    """
+    Plays the battle scene under a steady stream of shots and clicks with and without the governor
+    and prints the frame times and the levels it went through.
+    """
+    import random
+    from time import perf_counter
+
+    import pygame
+    from pygame.event import Event
+
+    from scenes.battle import BattleScene
+
+    pygame.init()
+    display = pygame.display.set_mode((2300, 700))
+    for governed in (False, True):
+        random.seed(1)
+        scene = BattleScene(display, fps, seed=1)
+        governor = Governor(fps) if governed else None
+        times: List[float] = []
+        for frame in range(frames):
+            start = perf_counter()
+            if frame % 10 == 0:
+                scene.handle_event(Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+            if frame % 3 == 0:
+                pos = (200 + frame * 37 % 1800, 100)
+                scene.handle_event(Event(pygame.MOUSEBUTTONDOWN, button=1, pos=pos))
+            scene.update()
+            scene.render()
+            times.append(perf_counter() - start)
+            if governor:
+                governor.update(scene, times[-1])
+        late = sorted(times[frames // 2 :])
+        over = sum(t > 1 / fps for t in times) / frames
+        print(
+            f"{'governed' if governed else 'fixed':8s}: mean {sum(times) / frames * 1000:5.1f} ms, second half median "
+            f"{late[len(late) // 2] * 1000:5.1f} ms, {over * 100:.0f}% of frames over budget"
+        )
+        if governor:
+            print(governor.report())
+    resources.set_rotation_step(0)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    import logging
+    import os
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    benchmark(fps=int(sys.argv[1]) if len(sys.argv) > 1 else 60)
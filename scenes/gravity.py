@@ -13,6 +13,10 @@ log = getLogger()
 
 
 class GravityScene(AbstractScene):
+    budgets = {Ball: 200}
+    despawn_types = (Ball,)
+    world_margin = 0
+
     space: pymunk.Space
     circle: Ball
     segment: Segment
@@ -85,10 +89,7 @@ class GravityScene(AbstractScene):
         self.clean_up()
 
     def clean_up(self):
-        for i in self.renders_objs:
-            if not isinstance(i, Segment):
-                if i.pos[0] < 0 or i.pos[0] > self.size_sc[0] or i.pos[1] < 0 or i.pos[1] > self.size_sc[1]:
-                    del i
+        self.lifecycle.update([self.renders_objs], self.space, self.get_world_bounds())
 
     def render(self, obj=None):
         self.display.fill((255, 255, 255))
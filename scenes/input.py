@@ -0,0 +1,56 @@
+from typing import List, Sequence
+
+import pygame
+from pygame.event import Event
+
+
+class InputSource:
+    """
+    Provides the events and the key state of a frame. `poll` is called once at the beginning of
+    every frame, `get_pressed` may be called any number of times and returns the state sampled by `poll`.
+    """
+
+    realtime: bool = True
+
+    def poll(self) -> List[Event]:
+        raise NotImplementedError()
+
+    def get_pressed(self) -> Sequence[bool]:
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        pass
+
+
+class LiveInput(InputSource):
+    def __init__(self) -> None:
+        self.pressed: Sequence[bool] = ()
+
+    def poll(self) -> List[Event]:
+        events = pygame.event.get()
+        self.pressed = pygame.key.get_pressed()
+        return events
+
+    def get_pressed(self) -> Sequence[bool]:
+        if not self.pressed:
+            self.pressed = pygame.key.get_pressed()
+        return self.pressed
+
+
+_source: InputSource = LiveInput()
+
+
+def set_source(source: InputSource) -> None:
+    global _source
+    _source = source
+
+
+def get_source() -> InputSource:
+    return _source
+
+
+def get_pressed() -> Sequence[bool]:
+    """
+    Drop-in replacement for `pygame.key.get_pressed` that returns the state of the active input source.
+    """
+    return _source.get_pressed()
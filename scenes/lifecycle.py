@@ -0,0 +1,140 @@
+from collections import Counter
+from math import inf
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pymunk import Space
+
+# left, bottom, right, top
+Bounds = Tuple[float, float, float, float]
+
+
+def despawn(entity: Any, space: Optional[Space]) -> None:
+    """
+    Removes the body of an entity from the space together with its shapes and constraints.
+    """
+    body = getattr(entity, "body", None)
+    if space is None or body is None or body.space is not space:
+        return
+    constraints = [c for c in body.constraints if c in space.constraints]
+    space.remove(*constraints, body, *(s for s in body.shapes if s.space is space))
+
+
+class Lifecycle:
+    """
+    Keeps the number of entities in a scene bounded. Every update despawns the entities that left
+    the world bounds and, for every type over its budget, the oldest entities of that type.
+    Entities are despawned from the object list and from the space at once.
+
+    :param budgets: Most entities of a type kept at once. Types are matched exactly, so a budget
+        for `Ball` does not cover its subclasses.
+    :param despawn_types: Entities of these types (and their subclasses) are despawned outside the bounds
+    """
+
+    def __init__(self, budgets: Dict[type, int], despawn_types: Tuple[type, ...]) -> None:
+        self.budgets = budgets
+        self.despawn_types = despawn_types
+        self.counts: Counter = Counter()
+        self.despawned_outside = 0
+        self.despawned_over_budget = 0
+
+    def is_outside(self, entity: Any, bounds: Bounds) -> bool:
+        body = getattr(entity, "body", None)
+        if body is None or not isinstance(entity, self.despawn_types):
+            return False
+        left, bottom, right, top = bounds
+        x, y = body.position
+        return not (left <= x <= right and bottom <= y <= top)
+
+    def update(self, groups: Sequence[List[Any]], space: Optional[Space], bounds: Bounds) -> None:
+        """
+        :param groups: Lists of the entities of the scene, each one oldest first. The lists are updated in place.
+        """
+        kept_groups = []
+        for objects in groups:
+            kept = []
+            for entity in objects:
+                if self.is_outside(entity, bounds):
+                    despawn(entity, space)
+                    self.despawned_outside += 1
+                else:
+                    kept.append(entity)
+            kept_groups.append(kept)
+
+        counts = Counter(type(entity) for kept in kept_groups for entity in kept)
+        excess = {t: counts[t] - budget for t, budget in self.budgets.items() if counts[t] > budget}
+        for objects, kept in zip(groups, kept_groups):
+            if excess:
+                oldest_kept = []
+                for entity in kept:
+                    t = type(entity)
+                    if excess.get(t, 0) > 0:
+                        excess[t] -= 1
+                        counts[t] -= 1
+                        despawn(entity, space)
+                        self.despawned_over_budget += 1
+                    else:
+                        oldest_kept.append(entity)
+                kept = oldest_kept
+            if len(kept) != len(objects):
+                objects[:] = kept
+        self.counts = counts
+
+    def report(self) -> str:
+        counts = ", ".join(
+            f"{t.__name__} {n}/{self.budgets[t]}" if t in self.budgets else f"{t.__name__} {n}"
+            for t, n in sorted(self.counts.items(), key=lambda item: item[0].__name__)
+        )
+        return (
+            f"Entities: {counts or 'none'}; despawned {self.despawned_outside} outside the world, "
+            f"{self.despawned_over_budget} over budget"
+        )
+
+
+def get_default_bounds(width: float, height: float, margin: float) -> Bounds:
+    """
+    The display area widened by the margin, open to the top since thrown entities fall back.
+    """
+    return -margin, -margin, width + margin, inf
+
+
+def soak(minutes: float = 2, fps: int = 60) -> None:
+    """
+    Runs the scenes that spawn entities for a long time and prints the entity and body counts
+    and the step time, which should level off instead of growing.
+    """
+    import pygame
+    from pygame.event import Event
+
+    from scenes.car import CarScene
+    from scenes.particles import ParticleScene
+    from scenes.tank import TankScene
+
+    pygame.init()
+    display = pygame.display.set_mode((2300, 700))
+    frames = int(minutes * 60 * fps)
+    for scene_type in (ParticleScene, CarScene, TankScene):
+        scene = scene_type(display, fps)
+        step_time = 0.0
+        for frame in range(1, frames + 1):
+            if frame % 5 == 0:
+                pos = (200 + frame * 37 % 1800, 100)
+                scene.handle_event(Event(pygame.MOUSEBUTTONDOWN, button=1, pos=pos))
+            start = perf_counter()
+            scene.update()
+            step_time += perf_counter() - start
+            if frame % (frames // 4) == 0:
+                print(
+                    f"{scene_type.__name__} {frame / fps:5.0f} s: {len(scene.space.bodies)} bodies, "
+                    f"update {step_time / (frames // 4) * 1000:.2f} ms. {scene.lifecycle.report()}"
+                )
+                step_time = 0.0
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    import os
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    soak()
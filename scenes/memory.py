@@ -0,0 +1,120 @@
+import gc
+import sys
+import tracemalloc
+from collections import defaultdict
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from pymunk import Space
+
+# Not owned by any entity, never counted
+SKIPPED_TYPES = (type, ModuleType, FunctionType, MethodType, BuiltinFunctionType, Space)
+
+
+def get_size(obj: Any, seen: Set[int], entities: Set[int] = frozenset()) -> int:
+    """
+    Size of an object and everything it references that is not in `seen` yet. Objects shared by
+    several entities, e.g. colours and vertex tuples, are counted for the first entity only.
+    Memory allocated by chipmunk is not included.
+
+    :param entities: Ids of the other entities, which are counted on their own
+    """
+    if id(obj) in seen or id(obj) in entities or isinstance(obj, SKIPPED_TYPES):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(get_size(k, seen, entities) + get_size(v, seen, entities) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(get_size(item, seen, entities) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += get_size(obj.__dict__, seen, entities)
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if name != "__weakref__" and hasattr(obj, name):
+                size += get_size(getattr(obj, name), seen, entities)
+    return size
+
+
+def get_entity_sizes(entities: Iterable[Any]) -> Dict[str, Tuple[int, int]]:
+    """
+    :return: Number of entities and bytes per entity type
+    """
+    entities = list(entities)
+    ids = {id(entity) for entity in entities}
+    sizes: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    seen: Set[int] = set()
+    for entity in entities:
+        entry = sizes[type(entity).__name__]
+        entry[0] += 1
+        ids.discard(id(entity))
+        entry[1] += get_size(entity, seen, ids)
+        ids.add(id(entity))
+    return {name: (count, size) for name, (count, size) in sizes.items()}
+
+
+def get_scene_entities(scene: Any) -> List[Any]:
+    lists = scene.get_entity_lists() if hasattr(scene, "get_entity_lists") else []
+    entities = [entity for entities in lists for entity in entities]
+    floor = getattr(scene, "floor", None)
+    if floor is not None and hasattr(floor, "bricks"):
+        entities.extend(floor.bricks)
+        entities.extend(floor.detached_bricks)
+    return entities
+
+
+def report(scene: Any) -> str:
+    """
+    Bytes per entity type in a live scene. A terrain column is counted with its two bricks.
+    """
+    sizes = get_entity_sizes(get_scene_entities(scene))
+    lines = [
+        f"{name:16s} {count:6d} x {size / count:7.0f} B = {size / 1024:8.1f} KiB"
+        for name, (count, size) in sorted(sizes.items(), key=lambda item: -item[1][1])
+    ]
+    total = sum(size for _, size in sizes.values())
+    lines.append(f"{'total':16s} {sum(count for count, _ in sizes.values()):6d} {'':11s} = {total / 1024:8.1f} KiB")
+    return "\n".join(lines)
+
+
+def measure_terrain_columns(columns: int = 1000) -> int:
+    """
+    :return: Bytes of Python heap taken by `columns` terrain columns, measured with tracemalloc
+    """
+    from pymunk import Vec2d
+
+    from scenes.components.terrain import Terrain
+
+    space = Space()
+    terrain = Terrain(Vec2d(0, 0), Vec2d(10, 0), 100, 300, space)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    x = terrain.bricks[-1].top_brick.body.position.x
+    for _ in range(columns):
+        x += terrain.step
+        terrain.bricks.append(terrain.create_brick(Vec2d(x, terrain.get_y(x)), terrain.step, terrain.step))
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+if __name__ == "__main__":
+    import os
+
+    import pygame
+
+    from scenes.tank import TankScene
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    print(f"Python heap per 1000 terrain columns: {measure_terrain_columns() / 1024:.1f} KiB")
+    pygame.init()
+    scene = TankScene(pygame.display.set_mode((2300, 700)), 60)
+    for frame in range(600):
+        if frame % 30 == 0:
+            scene.handle_event(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+        scene.update()
+    print(report(scene))
+    pygame.quit()
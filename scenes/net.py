@@ -0,0 +1,557 @@
+import asyncio
+import socket
+import struct
+from logging import getLogger
+from math import atan2, cos, pi, sin
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pygame
+from pygame.event import Event
+from pymunk import Body, Circle, Poly, Segment, Shape, Vec2d
+
+from scenes.abstract import AbstractScene
+from scenes.components.controller import KeyboardController, RemoteController, TankCommand
+from scenes.components.terrain import TOP_COLOR, UNDERLYING_COLOR
+from scenes.tank import TankScene
+from scenes.utils import ScreenTransform
+
+log = getLogger()
+
+PORT = 47800
+MAX_PACKET = 1200
+KEYFRAME_INTERVAL = 120
+CLIENT_TIMEOUT = 5.0
+
+# Positions are sent in 1/8 px, angles in 1/65536 of a turn
+POS_SCALE = 8
+ANGLE_SCALE = 65536 / (2 * pi)
+
+PACKET_STATE = b"S"
+PACKET_HELLO = b"H"
+PACKET_INPUT = b"I"
+PACKET_BYE = b"B"
+
+STATE_HEADER = struct.Struct("<cI")
+HELLO = struct.Struct("<cB")
+INPUT = struct.Struct("<cIbbB")
+
+R_SPAWN, R_MOVE, R_DESPAWN, R_TERRAIN, R_TERRAIN_RANGE, R_WELCOME = range(1, 7)
+SPAWN = struct.Struct("<BHB3BB")
+VERTEX = struct.Struct("<hh")
+MOVE = struct.Struct("<BHiiH")
+DESPAWN = struct.Struct("<BH")
+TERRAIN = struct.Struct("<Bih")
+TERRAIN_RANGE = struct.Struct("<Bii")
+WELCOME = struct.Struct("<BH")
+
+SHAPE_POLY, SHAPE_CIRCLE, SHAPE_SEGMENT = range(3)
+
+TANK_COLOR = (75, 83, 32)
+DEFAULT_COLOR = (200, 200, 200)
+BACKGROUND_COLOR = (235, 146, 52)
+
+RGB = Tuple[int, int, int]
+Transform = Tuple[int, int, int]
+
+
+def quantize(body: Body) -> Transform:
+    x, y = body.position
+    return round(x * POS_SCALE), round(y * POS_SCALE), round(body.angle % (2 * pi) * ANGLE_SCALE) & 0xFFFF
+
+
+def dequantize(transform: Transform) -> Tuple[float, float, float]:
+    x, y, a = transform
+    return x / POS_SCALE, y / POS_SCALE, a / ANGLE_SCALE
+
+
+def describe_shape(shape: Shape) -> Tuple[int, List[Tuple[int, int]]]:
+    if isinstance(shape, Circle):
+        return SHAPE_CIRCLE, [(round(shape.radius), 0)]
+    if isinstance(shape, Segment):
+        (ax, ay), (bx, by) = shape.a, shape.b
+        return SHAPE_SEGMENT, [(round(ax), round(ay)), (round(bx), round(by)), (round(shape.radius), 0)]
+    if isinstance(shape, Poly):
+        return SHAPE_POLY, [(round(x), round(y)) for x, y in shape.get_vertices()]
+    return SHAPE_CIRCLE, [(1, 0)]
+
+
+def packetize(tick: int, records: List[bytes]) -> List[bytes]:
+    header = STATE_HEADER.pack(PACKET_STATE, tick)
+    packets = []
+    chunk: List[bytes] = [header]
+    size = len(header)
+    for record in records:
+        if size + len(record) > MAX_PACKET and len(chunk) > 1:
+            packets.append(b"".join(chunk))
+            chunk, size = [header], len(header)
+        chunk.append(record)
+        size += len(record)
+    if len(chunk) > 1 or not packets:
+        packets.append(b"".join(chunk))
+    return packets
+
+
+class StateReplicator:
+    """
+    Turns the state of a TankScene into replication records. Static bodies (the terrain columns)
+    are not replicated as bodies; the terrain is sent as the height of every column instead.
+    """
+
+    def __init__(self, scene: TankScene) -> None:
+        self.scene = scene
+        self.ids: Dict[Body, int] = {}
+        self.free_ids: List[int] = []
+        self.next_id = 0
+        self.spawns: Dict[int, bytes] = {}
+        self.transforms: Dict[int, Transform] = {}
+        self.terrain: Dict[int, int] = {}
+        self.terrain_range = (0, -1)
+
+    def allocate_id(self, body: Body) -> int:
+        i = self.free_ids.pop() if self.free_ids else self.next_id
+        if i == self.next_id:
+            self.next_id += 1
+        self.ids[body] = i
+        return i
+
+    def get_id(self, body: Body) -> Optional[int]:
+        return self.ids.get(body)
+
+    def get_colors(self) -> Dict[Body, RGB]:
+        colors: Dict[Body, RGB] = {}
+        for tank in self.scene.get_tanks():
+            for body in tank.get_bodies():
+                colors[body] = TANK_COLOR
+        for obj in (*self.scene.objects, *self.scene.floor.detached_bricks):
+            body = getattr(obj, "body", None)
+            color = getattr(obj, "color", None)
+            if body is not None and color is not None:
+                colors[body] = color
+        return colors
+
+    def create_spawn(self, i: int, body: Body, color: RGB) -> bytes:
+        shapes = list(body.shapes)
+        kind, verts = describe_shape(shapes[0]) if shapes else (SHAPE_CIRCLE, [(1, 0)])
+        verts = verts[:255]
+        return SPAWN.pack(R_SPAWN, i, kind, *color, len(verts)) + b"".join(VERTEX.pack(*v) for v in verts)
+
+    def iter_terrain(self) -> Iterator[Tuple[int, int]]:
+        floor = self.scene.floor
+        for column in floor.bricks:
+            top = column.top_brick
+            yield round(top.body.position.x / floor.step), round(top.shape.bb.top)
+
+    def collect(self) -> Tuple[List[bytes], List[bytes]]:
+        """
+        Returns the records of the changes since the previous call and the records of a full snapshot.
+        """
+        delta: List[bytes] = []
+        current: Dict[int, Transform] = {}
+        colors: Optional[Dict[Body, RGB]] = None
+        for body in self.scene.space.bodies:
+            if body.body_type == Body.STATIC:
+                continue
+            i = self.ids.get(body)
+            if i is None:
+                if colors is None:
+                    colors = self.get_colors()
+                i = self.allocate_id(body)
+                self.spawns[i] = self.create_spawn(i, body, colors.get(body, DEFAULT_COLOR))
+                delta.append(self.spawns[i])
+            current[i] = quantize(body)
+
+        for body, i in list(self.ids.items()):
+            if i not in current:
+                delta.append(DESPAWN.pack(R_DESPAWN, i))
+                del self.ids[body]
+                del self.spawns[i]
+                self.free_ids.append(i)
+        for i, transform in current.items():
+            if self.transforms.get(i) != transform:
+                delta.append(MOVE.pack(R_MOVE, i, *transform))
+        self.transforms = current
+
+        terrain = dict(self.iter_terrain())
+        terrain_range = (min(terrain), max(terrain)) if terrain else (0, -1)
+        if terrain_range != self.terrain_range:
+            delta.append(TERRAIN_RANGE.pack(R_TERRAIN_RANGE, *terrain_range))
+        for column, y in terrain.items():
+            if self.terrain.get(column) != y:
+                delta.append(TERRAIN.pack(R_TERRAIN, column, y))
+        self.terrain, self.terrain_range = terrain, terrain_range
+
+        full = list(self.spawns.values())
+        full.extend(MOVE.pack(R_MOVE, i, *t) for i, t in current.items())
+        full.append(TERRAIN_RANGE.pack(R_TERRAIN_RANGE, *terrain_range))
+        full.extend(TERRAIN.pack(R_TERRAIN, column, y) for column, y in terrain.items())
+        return delta, full
+
+
+class ClientInfo:
+    def __init__(self, addr: Tuple[str, int], controller: Optional[RemoteController], focus: Body) -> None:
+        self.addr = addr
+        self.controller = controller
+        self.focus = focus
+        self.last_seen = perf_counter()
+        self.last_seq = -1
+        self.needs_keyframe = True
+
+
+class ServerStats:
+    def __init__(self) -> None:
+        self.ticks = 0
+        self.bytes_sent = 0
+        self.packets_sent = 0
+        self.replication_time = 0.0
+
+    def get_bytes_per_tick(self, clients: int) -> float:
+        return self.bytes_sent / max(clients, 1) / self.ticks if self.ticks else 0.0
+
+    def get_tick_time(self) -> float:
+        """
+        :return: Seconds the replication took per tick
+        """
+        return self.replication_time / self.ticks if self.ticks else 0.0
+
+    def report(self, fps: int, clients: int) -> str:
+        if not self.ticks:
+            return "No ticks"
+        return (
+            f"{self.ticks} ticks, {self.packets_sent} packets, {self.bytes_sent / 1024:.0f} KiB sent, "
+            f"{self.get_bytes_per_tick(clients) * fps / 1024:.1f} KiB/s per client, "
+            f"replication {self.get_tick_time() * 1000:.3f} ms per tick"
+        )
+
+
+class StateServer(asyncio.DatagramProtocol):
+    """
+    Server side of the localhost mode. The owner steps the scene and calls `tick` after every step;
+    the protocol receives the inputs of the clients in between.
+    """
+
+    transport: Optional[asyncio.DatagramTransport]
+
+    def __init__(self, scene: TankScene, host: str = "127.0.0.1", port: int = PORT) -> None:
+        self.scene = scene
+        self.host, self.port = host, port
+        self.replicator = StateReplicator(scene)
+        self.clients: Dict[Tuple[str, int], ClientInfo] = {}
+        self.stats = ServerStats()
+        self.transport = None
+        self.tick_count = 0
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, self.port))
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+        self.host, self.port = transport.get_extra_info("sockname")[:2]
+        log.info(f"Serving on {self.host}:{self.port}")
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        kind = data[:1]
+        client = self.clients.get(addr)
+        if kind == PACKET_HELLO and len(data) >= HELLO.size:
+            if client is None:
+                _, player = HELLO.unpack_from(data)
+                client = self.add_client(addr, bool(player))
+            client.needs_keyframe = True
+        if client is None:
+            return
+        client.last_seen = perf_counter()
+        if kind == PACKET_INPUT and len(data) >= INPUT.size and client.controller:
+            _, seq, throttle, elevation, fire = INPUT.unpack_from(data)
+            if seq > client.last_seq:
+                client.last_seq = seq
+                client.controller.push(TankCommand(throttle, elevation, bool(fire)))
+        elif kind == PACKET_BYE:
+            self.drop_client(client)
+
+    def add_client(self, addr: Tuple[str, int], player: bool) -> ClientInfo:
+        controller = None
+        focus = self.scene.tank.tank_base.body
+        if player:
+            controller = RemoteController()
+            focus = self.scene.add_tank(controller).tank_base.body
+        client = ClientInfo(addr, controller, focus)
+        self.clients[addr] = client
+        log.info(f"Client {addr} joined as a {'player' if player else 'spectator'}")
+        return client
+
+    def drop_client(self, client: ClientInfo) -> None:
+        self.clients.pop(client.addr, None)
+        if client.controller:
+            client.controller.push(TankCommand())
+        log.info(f"Client {client.addr} left")
+
+    def tick(self) -> None:
+        start = perf_counter()
+        self.tick_count += 1
+        delta, full = self.replicator.collect()
+        keyframe = self.tick_count % KEYFRAME_INTERVAL == 0
+        delta_packets: Optional[List[bytes]] = None
+        now = perf_counter()
+        for client in list(self.clients.values()):
+            if now - client.last_seen > CLIENT_TIMEOUT:
+                self.drop_client(client)
+                continue
+            if client.needs_keyframe or keyframe:
+                focus = self.replicator.get_id(client.focus)
+                welcome = [WELCOME.pack(R_WELCOME, focus)] if focus is not None else []
+                packets = packetize(self.tick_count, welcome + full)
+                client.needs_keyframe = False
+            else:
+                if delta_packets is None:
+                    delta_packets = packetize(self.tick_count, delta)
+                packets = delta_packets
+            for packet in packets:
+                self.send(packet, client.addr)
+        self.stats.ticks += 1
+        self.stats.replication_time += perf_counter() - start
+
+    def send(self, packet: bytes, addr: Tuple[str, int]) -> None:
+        if self.transport is None:
+            return
+        self.transport.sendto(packet, addr)
+        self.stats.bytes_sent += len(packet)
+        self.stats.packets_sent += 1
+
+    def close(self) -> None:
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+
+class RemoteEntity:
+    __slots__ = ("kind", "verts", "color", "previous", "current")
+
+    def __init__(self, kind: int, verts: List[Tuple[int, int]], color: RGB) -> None:
+        self.kind = kind
+        self.verts = verts
+        self.color = color
+        self.previous: Optional[Tuple[float, float, float]] = None
+        self.current: Optional[Tuple[float, float, float]] = None
+
+    def interpolate(self, t: float) -> Optional[Tuple[float, float, float]]:
+        if self.current is None:
+            return None
+        if self.previous is None:
+            return self.current
+        (x0, y0, a0), (x1, y1, a1) = self.previous, self.current
+        da = atan2(sin(a1 - a0), cos(a1 - a0))
+        return x0 + (x1 - x0) * t, y0 + (y1 - y0) * t, a0 + da * t
+
+
+class StateClient:
+    """
+    Client side of the localhost mode: sends the input of the player and keeps the replicated state.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = PORT, player: bool = True) -> None:
+        self.addr = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.entities: Dict[int, RemoteEntity] = {}
+        self.terrain: Dict[int, int] = {}
+        self.terrain_range = (0, -1)
+        self.focus: Optional[int] = None
+        self.tick = -1
+        self.tick_time = perf_counter()
+        self.seq = 0
+        self.bytes_received = 0
+        self.sock.sendto(HELLO.pack(PACKET_HELLO, int(player)), self.addr)
+
+    def send_input(self, command: TankCommand) -> None:
+        self.seq += 1
+        packet = INPUT.pack(PACKET_INPUT, self.seq, command.throttle, command.elevation, int(command.fire))
+        self.sock.sendto(packet, self.addr)
+
+    def receive(self) -> int:
+        count = 0
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, ConnectionRefusedError):
+                return count
+            self.bytes_received += len(data)
+            self.apply(data)
+            count += 1
+
+    def start_tick(self, tick: int) -> None:
+        self.tick = tick
+        self.tick_time = perf_counter()
+        for entity in self.entities.values():
+            entity.previous = entity.current
+
+    def apply(self, data: bytes) -> None:
+        if data[:1] != PACKET_STATE:
+            return
+        _, tick = STATE_HEADER.unpack_from(data)
+        if tick < self.tick:
+            return
+        if tick > self.tick:
+            self.start_tick(tick)
+        offset = STATE_HEADER.size
+        while offset < len(data):
+            record = data[offset]
+            if record == R_MOVE:
+                _, i, *transform = MOVE.unpack_from(data, offset)
+                offset += MOVE.size
+                entity = self.entities.get(i)
+                if entity:
+                    entity.current = dequantize(transform)
+            elif record == R_SPAWN:
+                _, i, kind, r, g, b, count = SPAWN.unpack_from(data, offset)
+                offset += SPAWN.size
+                verts = [VERTEX.unpack_from(data, offset + n * VERTEX.size) for n in range(count)]
+                offset += count * VERTEX.size
+                if i not in self.entities or self.entities[i].verts != verts:
+                    self.entities[i] = RemoteEntity(kind, verts, (r, g, b))
+            elif record == R_DESPAWN:
+                _, i = DESPAWN.unpack_from(data, offset)
+                offset += DESPAWN.size
+                self.entities.pop(i, None)
+            elif record == R_TERRAIN:
+                _, column, y = TERRAIN.unpack_from(data, offset)
+                offset += TERRAIN.size
+                self.terrain[column] = y
+            elif record == R_TERRAIN_RANGE:
+                _, first, last = TERRAIN_RANGE.unpack_from(data, offset)
+                offset += TERRAIN_RANGE.size
+                self.terrain_range = first, last
+                self.terrain = {c: y for c, y in self.terrain.items() if first <= c <= last}
+            elif record == R_WELCOME:
+                _, self.focus = WELCOME.unpack_from(data, offset)
+                offset += WELCOME.size
+            else:
+                log.warning(f"Unknown record {record}, dropping the rest of the packet")
+                return
+
+    def close(self) -> None:
+        try:
+            self.sock.sendto(PACKET_BYE, self.addr)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class NetClientScene(AbstractScene):
+    """
+    Renders the state received from a server with interpolation between the two latest ticks.
+    """
+
+    focus_screen_x = 250
+    terrain_step = 5
+
+    def __init__(self, *args, client: StateClient, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.client = client
+        self.controller = KeyboardController()
+        self.fire = False
+        self.camera_shift = Vec2d(0, 0)
+
+    def handle_event(self, event: Event) -> None:
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+            self.fire = True
+
+    def update(self):
+        self.client.receive()
+        command = self.controller.get_command(None)
+        command.fire = self.fire
+        self.fire = False
+        self.client.send_input(command)
+
+    def render(self):
+        self.display.fill(BACKGROUND_COLOR)
+        alpha = min(max((perf_counter() - self.client.tick_time) * self.fps, 0), 1)
+        focus = self.client.entities.get(self.client.focus) if self.client.focus is not None else None
+        focus_state = focus.interpolate(alpha) if focus else None
+        if focus_state:
+            self.camera_shift = Vec2d(self.focus_screen_x - focus_state[0], 0)
+        t = ScreenTransform(self.display.get_height(), self.camera_shift)
+        self.render_terrain(t)
+
+        # Entities are grouped by the number of vertices, so every group is transformed in one pass
+        groups: Dict[Tuple[int, int], List[Tuple[RemoteEntity, Tuple[float, float, float]]]] = {}
+        for entity in self.client.entities.values():
+            state = entity.interpolate(alpha)
+            if state:
+                groups.setdefault((entity.kind, len(entity.verts)), []).append((entity, state))
+        for (kind, _), items in groups.items():
+            positions = np.array([(x, y) for _, (x, y, _) in items], dtype=np.float64)
+            if kind == SHAPE_CIRCLE:
+                for (entity, _), center in zip(items, t.points(positions).tolist()):
+                    pygame.draw.circle(self.display, entity.color, center, max(entity.verts[0][0] * t.scale, 1))
+                continue
+            angles = np.array([a for _, (_, _, a) in items], dtype=np.float64)
+            local = np.array([entity.verts for entity, _ in items], dtype=np.float64)
+            for (entity, _), points in zip(items, t.bodies(positions, angles, local).tolist()):
+                if kind == SHAPE_SEGMENT:
+                    width = max(int(entity.verts[2][0] * 2 * t.scale), 1)
+                    pygame.draw.line(self.display, entity.color, points[0], points[1], width)
+                elif len(points) >= 3:
+                    pygame.draw.polygon(self.display, entity.color, points)
+
+    def render_terrain(self, t: ScreenTransform):
+        if not self.client.terrain:
+            return
+        columns = np.array(list(self.client.terrain.items()), dtype=np.float64)
+        columns[:, 0] *= self.terrain_step
+        columns[:, 0] -= self.terrain_step / 2
+        tops = t.points(columns).tolist()
+        width = max(int(self.terrain_step * t.scale), 1)
+        bottom = self.display.get_height()
+        for x, y in tops:
+            pygame.draw.rect(self.display, UNDERLYING_COLOR, (x, y, width, bottom - y))
+            pygame.draw.rect(self.display, TOP_COLOR, (x, y, width, width))
+
+
+def measure_loopback(clients: int = 4, ticks: int = 600, fps: int = 60) -> None:
+    """
+    Runs a headless server with loopback player clients and reports bandwidth and server tick time.
+    """
+    import os
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.init()
+    display = pygame.display.set_mode((2300, 700))
+    scene = TankScene(display, fps)
+    server = StateServer(scene, port=0)
+
+    async def run() -> float:
+        await server.start()
+        connected = [StateClient(server.host, server.port) for _ in range(clients)]
+        await asyncio.sleep(0.05)
+        step_time = 0.0
+        for n in range(ticks):
+            start = perf_counter()
+            scene.update()
+            step_time += perf_counter() - start
+            server.tick()
+            await asyncio.sleep(0)
+            for i, client in enumerate(connected):
+                client.receive()
+                phase = (n // 120 + i) % 3 - 1
+                client.send_input(TankCommand(phase, 0, n % 90 == i * 10))
+        for client in connected:
+            client.receive()
+            client.close()
+        await asyncio.sleep(0.05)
+        server.close()
+        received = sum(c.bytes_received for c in connected) / max(clients, 1)
+        print(f"{len(connected[0].entities) if connected else 0} entities on the first client")
+        print(f"received {received / ticks * fps / 1024:.1f} KiB/s per client")
+        return step_time
+
+    step_time = asyncio.run(run())
+    print(server.stats.report(fps, clients))
+    print(f"scene step {step_time / ticks * 1000:.3f} ms per tick")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    measure_loopback()
@@ -1,4 +1,4 @@
-from typing import List, Tuple
+from typing import Any, List, Tuple
 
 from pygame.event import Event
 from pygame.surface import Surface
@@ -7,11 +7,18 @@ from pymunk import Body, Shape, Space, Vec2d
 from scenes.abstract import AbstractPymunkScene
 from scenes.components.ball import Ball
 from scenes.components.random_floor import RandomFloor
+from scenes.lifecycle import despawn
 
 RGB = Tuple[int, int, int]
 
 
+# Shared colours of the fading particles, indexed by the remaining lifetime
+GREYS: Tuple[RGB, ...] = tuple((v, v, v) for v in range(255))
+
+
 class Particle(Ball):
+    __slots__ = ("lifetime",)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.lifetime = 512
@@ -40,7 +47,6 @@ class ParticlePool:
             body.velocity = body.velocity * scale
 
     def update_particles(self) -> None:
-        print(f"Particles {len(self.particles)}")
         p = Particle(
             *self.source,
             3,
@@ -52,14 +58,10 @@ class ParticlePool:
         self.particles.append(p)
         for p in self.particles:
             p.lifetime -= 2
-            p.color = (p.lifetime % 255, p.lifetime % 255, p.lifetime % 255)
+            p.color = GREYS[p.lifetime % 255]
             if not p.is_alive:
-                try:
-                    self.space.remove(p.body)
-                    self.space.remove(p.shape)
-                except AssertionError:
-                    pass
-                self.particles.remove(p)
+                despawn(p, self.space)
+        self.particles = [p for p in self.particles if p.is_alive]
 
     def render(self, display: Surface, camera_shift: Vec2d) -> None:
         for p in self.particles:
@@ -67,6 +69,8 @@ class ParticlePool:
 
 
 class ParticleScene(AbstractPymunkScene):
+    budgets = {Particle: 200}
+    despawn_types = (Particle,)
 
     pool: ParticlePool
     floor: RandomFloor
@@ -80,6 +84,9 @@ class ParticleScene(AbstractPymunkScene):
         self.floor = RandomFloor(0, self.display.get_width(), 250, 250, 10, self.space)
         self.objects.extend((self.pool, self.floor))
 
+    def get_entity_lists(self) -> List[List[Any]]:
+        return [self.objects, self.pool.particles]
+
     def update(self):
-        super().update()
         self.pool.update_particles()
+        super().update()
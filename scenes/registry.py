@@ -0,0 +1,130 @@
+import importlib
+import threading
+from logging import getLogger
+from queue import Queue
+from time import perf_counter
+from typing import TYPE_CHECKING, Dict, List, Optional, Type
+
+from scenes.resources import load_asset
+
+if TYPE_CHECKING:
+    from scenes.abstract import AbstractScene
+
+log = getLogger()
+
+# Scene names and the classes behind them. Modules are imported only when a scene is used.
+SCENES: Dict[str, str] = {
+    "tank": "scenes.tank:TankScene",
+    "battle": "scenes.battle:BattleScene",
+    "craters": "scenes.craters:CraterScene",
+    "car": "scenes.car:CarScene",
+    "particles": "scenes.particles:ParticleScene",
+    "gravity": "scenes.gravity:GravityScene",
+    "constraints": "scenes.constraints:ConstraintScene",
+}
+DEFAULT_SCENE = "tank"
+
+
+def get_scene_class(name: str) -> Type["AbstractScene"]:
+    try:
+        module_name, class_name = SCENES[name].split(":")
+    except KeyError:
+        raise ValueError(f"Unknown scene {name!r}, expected one of {', '.join(SCENES)}") from None
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def get_next_scene(name: str) -> str:
+    names = list(SCENES)
+    return names[(names.index(name) + 1) % len(names)]
+
+
+class ScenePreloader:
+    """
+    Imports scene modules and decodes their assets on a background thread, so building the scene
+    later only has to create its bodies. Image and sound decoding release the GIL, so the current
+    scene keeps running meanwhile.
+    """
+
+    def __init__(self) -> None:
+        self.queue: "Queue[Optional[str]]" = Queue()
+        self.done: Dict[str, threading.Event] = {}
+        self.durations: Dict[str, float] = {}
+        self.thread = threading.Thread(target=self.work, name="scene-preloader", daemon=True)
+        self.thread.start()
+
+    def request(self, name: str) -> None:
+        if name in self.done:
+            return
+        self.done[name] = threading.Event()
+        self.queue.put(name)
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> bool:
+        """
+        Waits for a requested scene, so switching to a scene that is still loading doesn't decode
+        its assets twice.
+        """
+        done = self.done.get(name)
+        return done is None or done.wait(timeout)
+
+    def work(self) -> None:
+        while True:
+            name = self.queue.get()
+            if name is None:
+                return
+            start = perf_counter()
+            try:
+                for path in get_scene_class(name).assets:
+                    load_asset(path)
+            except Exception as e:
+                log.warning(f"Can't preload the scene {name}: {e}")
+            finally:
+                self.durations[name] = perf_counter() - start
+                self.done[name].set()
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+
+
+def measure_switch(name: str, preload: bool) -> None:
+    """
+    Prints how long the main thread is blocked by building a scene in a fresh process.
+    """
+    import pygame
+
+    pygame.init()
+    pygame.mixer.init()
+    display = pygame.display.set_mode((2300, 700))
+    if preload:
+        preloader = ScenePreloader()
+        preloader.request(name)
+        preloader.wait(name)
+    start = perf_counter()
+    get_scene_class(name)(display, 60)
+    print(f"{perf_counter() - start:.4f}")
+    pygame.quit()
+
+
+def measure(names: Optional[List[str]] = None) -> None:
+    import subprocess
+    import sys
+
+    for name in names or list(SCENES):
+        results = []
+        for preload in (False, True):
+            args = [sys.executable, "-m", "scenes.registry", name, "preload" if preload else "cold"]
+            output = subprocess.run(args, capture_output=True, text=True, check=True).stdout.split()
+            results.append(float(output[-1]) * 1000)
+        print(f"{name:12s} switch stall: cold {results[0]:7.1f} ms, preloaded {results[1]:7.1f} ms")
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    if len(sys.argv) == 3:
+        measure_switch(sys.argv[1], sys.argv[2] == "preload")
+    else:
+        measure(sys.argv[1:])
@@ -0,0 +1,183 @@
+import gzip
+import struct
+from array import array
+from typing import BinaryIO, List, Optional, Sequence, Tuple
+
+import pygame
+from pygame.event import Event
+
+from scenes.input import InputSource, LiveInput
+
+MAGIC = b"TNKR"
+VERSION = 1
+
+# magic, version, rng seed, noise seed (-1 when the default noise is used), fps, width, height
+HEADER = struct.Struct("<4sBqqHHH")
+FRAME = struct.Struct("<BB")
+KEY = struct.Struct("<H")
+EVENT = struct.Struct("<BIhh")
+
+RECORDED_EVENTS = (
+    pygame.QUIT,
+    pygame.KEYDOWN,
+    pygame.KEYUP,
+    pygame.MOUSEBUTTONDOWN,
+    pygame.MOUSEBUTTONUP,
+    # The zoom decides how far the terrain is generated and which tanks are proxies
+    pygame.MOUSEWHEEL,
+)
+EVENT_CODES = {event_type: code for code, event_type in enumerate(RECORDED_EVENTS)}
+
+
+class ReplayHeader:
+    def __init__(self, rng_seed: int, noise_seed: Optional[int], fps: int, size: Tuple[int, int]) -> None:
+        self.rng_seed = rng_seed
+        self.noise_seed = noise_seed
+        self.fps = fps
+        self.size = size
+
+    def pack(self) -> bytes:
+        noise_seed = -1 if self.noise_seed is None else self.noise_seed
+        return HEADER.pack(MAGIC, VERSION, self.rng_seed, noise_seed, self.fps, *self.size)
+
+    @classmethod
+    def read(cls, f: BinaryIO) -> "ReplayHeader":
+        magic, version, rng_seed, noise_seed, fps, width, height = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a replay log of version {VERSION}")
+        return cls(rng_seed, None if noise_seed < 0 else noise_seed, fps, (width, height))
+
+
+def pack_event(event: Event) -> bytes:
+    code = EVENT_CODES[event.type]
+    if event.type in (pygame.KEYDOWN, pygame.KEYUP):
+        return EVENT.pack(code, event.key, 0, 0)
+    if event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        x, y = event.pos
+        return EVENT.pack(code, event.button, x, y)
+    if event.type == pygame.MOUSEWHEEL:
+        return EVENT.pack(code, 0, event.x, event.y)
+    return EVENT.pack(code, 0, 0, 0)
+
+
+def unpack_event(code: int, value: int, x: int, y: int) -> Event:
+    event_type = RECORDED_EVENTS[code]
+    if event_type in (pygame.KEYDOWN, pygame.KEYUP):
+        return Event(event_type, key=value)
+    if event_type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        return Event(event_type, button=value, pos=(x, y))
+    if event_type == pygame.MOUSEWHEEL:
+        return Event(event_type, x=x, y=y, flipped=False)
+    return Event(event_type)
+
+
+class InputRecorder(InputSource):
+    """
+    Passes the live input through and writes every frame to a gzip-compressed binary log:
+    the scancodes of the pressed keys followed by the events of the frame.
+    """
+
+    def __init__(self, path: str, header: ReplayHeader) -> None:
+        self.live = LiveInput()
+        self.file = gzip.open(path, "wb")
+        self.file.write(header.pack())
+        self.frames = 0
+
+    def poll(self) -> List[Event]:
+        events = self.live.poll()
+        recorded = [e for e in events if e.type in EVENT_CODES]
+        pressed = [i for i, down in enumerate(self.live.pressed) if down][:255]
+        chunks = [FRAME.pack(len(pressed), len(recorded))]
+        chunks.extend(KEY.pack(i) for i in pressed)
+        chunks.extend(pack_event(e) for e in recorded)
+        self.file.write(b"".join(chunks))
+        self.frames += 1
+        return events
+
+    def get_pressed(self) -> Sequence[bool]:
+        return self.live.get_pressed()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class InputReplay(InputSource):
+    """
+    Feeds a recorded log back frame by frame. After the last frame it emits QUIT.
+    """
+
+    realtime = False
+
+    def __init__(self, path: str) -> None:
+        self.file = gzip.open(path, "rb")
+        self.header = ReplayHeader.read(self.file)
+        self.key_count = len(pygame.key.get_pressed())
+        self.pressed: Sequence[bool] = pygame.key.ScancodeWrapper((False,) * self.key_count)
+        self.frames = 0
+
+    def poll(self) -> List[Event]:
+        pygame.event.pump()
+        raw = self.file.read(FRAME.size)
+        if len(raw) < FRAME.size:
+            return [Event(pygame.QUIT)]
+        key_count, event_count = FRAME.unpack(raw)
+        state = [False] * self.key_count
+        for _ in range(key_count):
+            (i,) = KEY.unpack(self.file.read(KEY.size))
+            state[i] = True
+        self.pressed = pygame.key.ScancodeWrapper(state)
+        events = [unpack_event(*EVENT.unpack(self.file.read(EVENT.size))) for _ in range(event_count)]
+        self.frames += 1
+        return events
+
+    def get_pressed(self) -> Sequence[bool]:
+        return self.pressed
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def save_trace(path: str, frame_times: Sequence[float]) -> None:
+    with open(path, "wb") as f:
+        array("d", frame_times).tofile(f)
+
+
+def load_trace(path: str) -> array:
+    trace = array("d")
+    with open(path, "rb") as f:
+        trace.frombytes(f.read())
+    return trace
+
+
+def summarize(trace: Sequence[float]) -> dict:
+    ordered = sorted(trace)
+    if not ordered:
+        return {"frames": 0}
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {
+        "frames": len(ordered),
+        "mean": sum(ordered) / len(ordered) * 1000,
+        "p50": pct(0.5),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": ordered[-1] * 1000,
+    }
+
+
+def compare_traces(baseline_path: str, candidate_path: str) -> None:
+    baseline = summarize(load_trace(baseline_path))
+    candidate = summarize(load_trace(candidate_path))
+    print(f"{'':6s} {'baseline':>10s} {'candidate':>10s} {'change':>8s}")
+    for key in ("mean", "p50", "p95", "p99", "max"):
+        a, b = baseline.get(key, 0), candidate.get(key, 0)
+        change = (b - a) / a * 100 if a else 0
+        print(f"{key:6s} {a:8.2f}ms {b:8.2f}ms {change:+7.1f}%")
+
+
+if __name__ == "__main__":
+    import sys
+
+    compare_traces(sys.argv[1], sys.argv[2])
@@ -0,0 +1,105 @@
+from functools import lru_cache
+from math import log2
+from typing import Dict, List
+
+import pygame
+from pygame.mixer import Sound
+from pygame.surface import Surface
+
+from scenes.audio_cache import SOUND_EXTENSIONS, load_cached_sound
+from scenes.bundle import get_bundle, resolve
+
+_images: Dict[str, Surface] = {}
+_sounds: Dict[str, Sound] = {}
+_mipmaps: Dict[str, List[Surface]] = {}
+
+MIPMAP_LEVELS = 4
+# Rotated sprites are cached when the rotation is quantized to this many degrees, 0 rotates exactly
+_rotation_step = 0.0
+
+
+def load_image(path: str) -> Surface:
+    """
+    Loads an image once per process, from the asset bundle when it is up to date. The returned
+    surface is shared between all the callers, so it must not be drawn on.
+    """
+    image = _images.get(path)
+    if image is None:
+        bundle = get_bundle()
+        image = bundle and bundle.get_image(path)
+        if image is None:
+            image = pygame.image.load(resolve(path))
+        _images[path] = image
+    return image
+
+
+def load_mipmaps(path: str) -> List[Surface]:
+    """
+    The image and its copies smoothly downscaled by 2, 4, 8... Like `load_image` they are shared.
+    """
+    mipmaps = _mipmaps.get(path)
+    if mipmaps is None:
+        mipmaps = [load_image(path)]
+        for _ in range(MIPMAP_LEVELS):
+            width, height = mipmaps[-1].get_size()
+            if width < 2 or height < 2:
+                break
+            mipmaps.append(pygame.transform.smoothscale(mipmaps[-1], (width // 2, height // 2)))
+        _mipmaps[path] = mipmaps
+    return mipmaps
+
+
+def scale_image(path: str, scale: float) -> Surface:
+    """
+    The image at the given scale. Downscaling starts from the nearest larger mipmap, so the cheap
+    nearest-neighbour scaling never skips more than every other pixel.
+    """
+    if scale == 1:
+        return load_image(path)
+    mipmaps = load_mipmaps(path)
+    level = min(int(log2(1 / scale)), len(mipmaps) - 1) if scale < 1 else 0
+    image = mipmaps[level]
+    width, height = load_image(path).get_size()
+    return pygame.transform.scale(image, (max(round(width * scale), 1), max(round(height * scale), 1)))
+
+
+def set_rotation_step(step: float) -> None:
+    global _rotation_step
+    _rotation_step = step
+
+
+@lru_cache(maxsize=512)
+def _rotate_cached(path: str, scale: float, angle: float) -> Surface:
+    return pygame.transform.rotate(scale_image(path, scale), angle)
+
+
+def rotate_image(path: str, scale: float, angle: float) -> Surface:
+    """
+    The image at the given scale, rotated by `angle` degrees. With a rotation step set, the angle
+    is rounded to it and the rotated copies are cached, which trades smooth rotation for time.
+    """
+    if not _rotation_step:
+        return pygame.transform.rotate(scale_image(path, scale), angle)
+    return _rotate_cached(path, scale, round(angle / _rotation_step) * _rotation_step % 360)
+
+
+def load_asset(path: str) -> None:
+    """
+    Decodes an image or a sound into the cache, picked by the file extension.
+    """
+    if path.lower().endswith(SOUND_EXTENSIONS):
+        if pygame.mixer.get_init():
+            load_sound(path)
+    else:
+        load_image(path)
+
+
+def load_sound(path: str) -> Sound:
+    sound = _sounds.get(path)
+    if sound is None:
+        bundle = get_bundle()
+        sound = bundle and bundle.get_sound(path)
+        if sound is None:
+            sound = load_cached_sound(resolve(path))
+        _sounds[path] = sound
+    return sound
@@ -0,0 +1,323 @@
+import struct
+import sys
+from array import array
+from collections import deque
+from logging import getLogger
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from pymunk import Body, Constraint, Shape, Space
+
+log = getLogger()
+
+# x, y, angle, velocity x, velocity y, angular velocity, mass and body type
+BODY_STATE = struct.Struct("<7fB")
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Size of the containers that make up a scene state. The objects they refer to are shared with
+    the live scene and are not counted.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(estimate_size(v) for v in value if isinstance(v, (tuple, list, dict)))
+    elif isinstance(value, dict):
+        size += sum(estimate_size(v) for v in value.values() if isinstance(v, (tuple, list, dict)))
+    return size
+
+
+def share(value: Any, previous: Any) -> Tuple[Any, int]:
+    """
+    Replaces the parts of a scene state that are equal to the previous state with the previous
+    objects, so unchanged parts are stored once. Returns the shared value and the size of the new parts.
+    """
+    if value == previous:
+        return previous, 0
+    if type(value) is tuple and type(previous) is tuple and len(value) == len(previous):
+        parts = [share(v, p) for v, p in zip(value, previous)]
+        return tuple(p for p, _ in parts), sys.getsizeof(value) + sum(size for _, size in parts)
+    return value, estimate_size(value)
+
+
+def pack_body(body: Body) -> bytes:
+    x, y = body.position
+    vx, vy = body.velocity
+    mass = body.mass if body.body_type == Body.DYNAMIC else 0
+    return BODY_STATE.pack(x, y, body.angle, vx, vy, body.angular_velocity, mass, body.body_type)
+
+
+class Snapshot:
+    """
+    A keyframe holds the state of every body in the space that isn't static. A delta holds only the
+    bodies whose state differs from the previous snapshot plus the bodies and constraints added or
+    removed since then. Static bodies, e.g. the terrain, are put back by the scene state.
+    """
+
+    __slots__ = (
+        "frame",
+        "keyframe",
+        "changed",
+        "states",
+        "added",
+        "removed",
+        "added_c",
+        "removed_c",
+        "scene",
+        "nbytes",
+    )
+
+    def __init__(self, frame: int, keyframe: bool) -> None:
+        self.frame = frame
+        self.keyframe = keyframe
+        self.changed = array("I")
+        self.states = b""
+        self.added = array("I")
+        self.removed = array("I")
+        self.added_c = array("I")
+        self.removed_c = array("I")
+        self.scene: Any = None
+        self.nbytes = 0
+
+    def measure(self, scene_bytes: int) -> int:
+        arrays = (self.changed, self.added, self.removed, self.added_c, self.removed_c)
+        self.nbytes = sys.getsizeof(self) + sys.getsizeof(self.states) + sum(sys.getsizeof(a) for a in arrays)
+        self.nbytes += scene_bytes
+        return self.nbytes
+
+
+class RewindBuffer:
+    """
+    Memory-bounded ring of delta-compressed snapshots of a pymunk space.
+
+    :param get_scene_state: Returns the Python-side state of the scene (object lists etc.). It is stored
+        only when it differs from the previous one, so it should be an immutable value that compares cheaply.
+    :param set_scene_state: Restores a state returned by get_scene_state
+    :param recording: Take snapshots, off they cost nothing and there is nothing to rewind
+    :param interval: Frames between two snapshots
+    :param keyframe_interval: Snapshots between two keyframes
+    :param max_bytes: Memory cap of the buffer, the oldest keyframe and its deltas are dropped above it
+    """
+
+    def __init__(
+        self,
+        space: Space,
+        get_scene_state: Callable[[], Any],
+        set_scene_state: Callable[[Any], None],
+        fps: int,
+        recording: bool = True,
+        interval: int = 4,
+        keyframe_interval: int = 30,
+        max_bytes: int = 32 * 1024 * 1024,
+    ) -> None:
+        self.space = space
+        self.get_scene_state = get_scene_state
+        self.set_scene_state = set_scene_state
+        self.fps = fps
+        self.recording = recording
+        self.interval = interval
+        self.keyframe_interval = keyframe_interval
+        self.max_bytes = max_bytes
+
+        self.snapshots: Deque[Snapshot] = deque()
+        self.nbytes = 0
+        self.frame = 0
+        self.paused = False
+        self.cursor = -1
+
+        self.bodies: List[Optional[Body]] = []
+        self.body_shapes: List[Tuple[Shape, ...]] = []
+        self.body_index: Dict[Body, int] = {}
+        self.constraints: List[Optional[Constraint]] = []
+        self.constraint_index: Dict[Constraint, int] = {}
+
+        self._states: Dict[int, bytes] = {}
+        self._members: Set[int] = set()
+        self._constraint_members: Set[int] = set()
+        self._scene_state: Any = None
+        self._since_keyframe = 0
+
+    def get_body_id(self, body: Body) -> int:
+        i = self.body_index.get(body)
+        if i is None:
+            i = len(self.bodies)
+            self.body_index[body] = i
+            self.bodies.append(body)
+            self.body_shapes.append(tuple(body.shapes))
+        return i
+
+    def get_constraint_id(self, constraint: Constraint) -> int:
+        i = self.constraint_index.get(constraint)
+        if i is None:
+            i = len(self.constraints)
+            self.constraint_index[constraint] = i
+            self.constraints.append(constraint)
+        return i
+
+    def update(self) -> None:
+        """
+        Called at the beginning of every frame, so a snapshot holds the state left by the previous frame.
+        """
+        if self.paused or not self.recording:
+            return
+        self.frame += 1
+        if self.frame % self.interval == 0:
+            self.capture()
+
+    def capture(self) -> Snapshot:
+        keyframe = not self.snapshots or self._since_keyframe >= self.keyframe_interval
+        self._since_keyframe = 0 if keyframe else self._since_keyframe + 1
+        snapshot = Snapshot(self.frame, keyframe)
+
+        states: Dict[int, bytes] = {}
+        for body in self.space.bodies:
+            if body.body_type == Body.STATIC:
+                continue
+            i = self.get_body_id(body)
+            state = self._states.get(i)
+            # A sleeping body is where it was in the last snapshot
+            states[i] = state if state is not None and body.is_sleeping else pack_body(body)
+        members = set(states)
+        constraint_members = {self.get_constraint_id(c) for c in self.space.constraints}
+        if keyframe:
+            changed = sorted(states)
+            snapshot.added.extend(sorted(members))
+            snapshot.added_c.extend(sorted(constraint_members))
+        else:
+            changed = sorted(i for i, state in states.items() if self._states.get(i) != state)
+            snapshot.added.extend(sorted(members - self._members))
+            snapshot.removed.extend(sorted(self._members - members))
+            snapshot.added_c.extend(sorted(constraint_members - self._constraint_members))
+            snapshot.removed_c.extend(sorted(self._constraint_members - constraint_members))
+        snapshot.changed.extend(changed)
+        snapshot.states = b"".join(states[i] for i in changed)
+
+        if keyframe:
+            scene_state = self.get_scene_state()
+            scene_bytes = estimate_size(scene_state)
+        else:
+            scene_state, scene_bytes = share(self.get_scene_state(), self._scene_state)
+        snapshot.scene = scene_state
+
+        self._states, self._members, self._constraint_members = states, members, constraint_members
+        self._scene_state = scene_state
+        self.snapshots.append(snapshot)
+        self.nbytes += snapshot.measure(scene_bytes)
+        self.enforce_cap()
+        return snapshot
+
+    def enforce_cap(self) -> None:
+        evicted = False
+        while self.nbytes > self.max_bytes and len(self.snapshots) > 1:
+            self.nbytes -= self.snapshots.popleft().nbytes
+            while self.snapshots and not self.snapshots[0].keyframe:
+                self.nbytes -= self.snapshots.popleft().nbytes
+            evicted = True
+        if evicted:
+            self.prune()
+
+    def prune(self) -> None:
+        """
+        Drops the references to bodies and constraints that no stored snapshot mentions any more.
+        """
+        used_bodies: Set[int] = set(self._members)
+        used_constraints: Set[int] = set(self._constraint_members)
+        for snapshot in self.snapshots:
+            used_bodies.update(snapshot.added)
+            used_bodies.update(snapshot.changed)
+            used_constraints.update(snapshot.added_c)
+        for i in range(len(self.bodies)):
+            if i not in used_bodies and self.bodies[i] is not None:
+                del self.body_index[self.bodies[i]]
+                self.bodies[i] = None
+                self.body_shapes[i] = ()
+        for i in range(len(self.constraints)):
+            if i not in used_constraints and self.constraints[i] is not None:
+                del self.constraint_index[self.constraints[i]]
+                self.constraints[i] = None
+
+    def reconstruct(self, position: int) -> Tuple[Dict[int, bytes], Set[int], Set[int], Any]:
+        start = position
+        while not self.snapshots[start].keyframe:
+            start -= 1
+        states: Dict[int, bytes] = {}
+        members: Set[int] = set()
+        constraint_members: Set[int] = set()
+        for i in range(start, position + 1):
+            snapshot = self.snapshots[i]
+            members.difference_update(snapshot.removed)
+            members.update(snapshot.added)
+            constraint_members.difference_update(snapshot.removed_c)
+            constraint_members.update(snapshot.added_c)
+            size = BODY_STATE.size
+            for n, body_id in enumerate(snapshot.changed):
+                states[body_id] = snapshot.states[n * size : (n + 1) * size]
+        return states, members, constraint_members, self.snapshots[position].scene
+
+    def restore(self, position: int) -> None:
+        states, members, constraint_members, scene_state = self.reconstruct(position)
+        space = self.space
+
+        wanted_bodies = {self.bodies[i] for i in members}
+        wanted_constraints = {self.constraints[i] for i in constraint_members}
+        space.remove(*(c for c in space.constraints if c not in wanted_constraints))
+        for body in space.bodies:
+            if body not in wanted_bodies and body.body_type != Body.STATIC:
+                space.remove(body, *(s for s in body.shapes if s.space is space))
+
+        present_shapes = set(space.shapes)
+        for i in members:
+            body = self.bodies[i]
+            if body.space is not space:
+                space.add(body)
+            space.add(*(s for s in self.body_shapes[i] if s not in present_shapes))
+            x, y, angle, vx, vy, w, mass, body_type = BODY_STATE.unpack(states[i])
+            if body.body_type != body_type:
+                body.body_type = body_type
+            if body_type == Body.DYNAMIC and mass > 0:
+                body.mass = mass
+            body.position = x, y
+            body.angle = angle
+            body.velocity = vx, vy
+            body.angular_velocity = w
+        space.add(*(c for c in wanted_constraints if c not in space.constraints))
+
+        self.set_scene_state(scene_state)
+        self._states, self._members, self._constraint_members = states, members, constraint_members
+        self._scene_state = scene_state
+        self.frame = self.snapshots[position].frame
+
+    def toggle_pause(self) -> None:
+        if not self.paused:
+            if not self.snapshots:
+                return
+            self.paused = True
+            self.cursor = len(self.snapshots) - 1
+            log.info(self.report())
+            return
+        self.paused = False
+        while len(self.snapshots) > self.cursor + 1:
+            self.nbytes -= self.snapshots.pop().nbytes
+        self._since_keyframe = self.keyframe_interval
+
+    def scrub(self, step: int) -> None:
+        if not self.paused or not self.snapshots:
+            return
+        self.cursor = min(max(self.cursor + step, 0), len(self.snapshots) - 1)
+        self.restore(self.cursor)
+
+    def get_covered_seconds(self) -> float:
+        if not self.snapshots:
+            return 0
+        return (self.snapshots[-1].frame - self.snapshots[0].frame + self.interval) / self.fps
+
+    def get_bytes_per_minute(self) -> float:
+        seconds = self.get_covered_seconds()
+        return self.nbytes / seconds * 60 if seconds else 0
+
+    def report(self) -> str:
+        keyframes = sum(1 for s in self.snapshots if s.keyframe)
+        return (
+            f"Rewind: {len(self.snapshots)} snapshots ({keyframes} keyframes), {self.get_covered_seconds():.1f} s, "
+            f"{self.nbytes / 1024:.0f} KiB of {self.max_bytes / 1024:.0f} KiB, "
+            f"{self.get_bytes_per_minute() / 1024:.0f} KiB per minute"
+        )
@@ -0,0 +1,149 @@
+from logging import getLogger
+from typing import Dict, List, Optional, Sequence
+
+import pygame
+from pygame.mixer import Channel, Sound
+
+from scenes.resources import load_sound
+
+log = getLogger()
+
+ENGINE_SOUNDS = (
+    "./scenes/assets/engine1.mp3",
+    "./scenes/assets/engine2.mp3",
+    "./scenes/assets/engine3.mp3",
+)
+SHOT_SOUND = "./scenes/assets/fire_001.mp3"
+EXPLOSION_SOUND = "./scenes/assets/DeathFlash.flac"
+
+PRIORITY_SHOT = 1
+PRIORITY_EXPLOSION = 2
+
+# Motor rates at which each of the engine loops is heard alone
+ENGINE_RATES = (0, 20, 40)
+
+
+class EngineMixer:
+    """
+    Keeps the engine loops playing on reserved channels and crossfades between them by the motor rate.
+    """
+
+    def __init__(self, sounds: Sequence[Sound], channels: Sequence[Channel], rates: Sequence[float] = ENGINE_RATES):
+        self.sounds = sounds
+        self.channels = channels
+        self.rates = rates
+
+    def get_volumes(self, rate: float) -> List[float]:
+        rate = min(max(abs(rate), self.rates[0]), self.rates[-1])
+        volumes = [0.0] * len(self.rates)
+        for i in range(len(self.rates) - 1):
+            low, high = self.rates[i], self.rates[i + 1]
+            if low <= rate <= high:
+                t = (rate - low) / (high - low)
+                volumes[i], volumes[i + 1] = 1 - t, t
+                break
+        return volumes
+
+    def update(self, rate: float) -> None:
+        for sound, channel, volume in zip(self.sounds, self.channels, self.get_volumes(rate)):
+            if not channel.get_busy():
+                channel.play(sound, loops=-1)
+            channel.set_volume(volume)
+
+    def stop(self) -> None:
+        for channel in self.channels:
+            channel.stop()
+
+
+class SoundBank:
+    """
+    Process-wide owner of the decoded sounds and the mixer channels.
+
+    The first channels are reserved for the engine loops, the rest form a pool for one-shot effects.
+    When the pool is full, a new sound takes over the channel of the oldest sound with the lowest
+    priority, as long as that priority is not higher than its own; otherwise the new sound is dropped.
+    """
+
+    def __init__(self, pool_size: int = 12) -> None:
+        self.enabled = pygame.mixer.get_init() is not None
+        self.sounds: Dict[str, Sound] = {}
+        self.engine: Optional[EngineMixer] = None
+        self.pool: List[Channel] = []
+        self.priorities: List[int] = []
+        self.started: List[int] = []
+        self.channel_count = 0
+        self.dropped = 0
+        self._played = 0
+        if not self.enabled:
+            log.info("Mixer is not initialised, sounds are disabled")
+            return
+
+        reserved = len(ENGINE_SOUNDS)
+        self.channel_count = reserved + pool_size
+        pygame.mixer.set_num_channels(self.channel_count)
+        pygame.mixer.set_reserved(reserved)
+        engine_channels = [Channel(i) for i in range(reserved)]
+        self.engine = EngineMixer([self.get(path) for path in ENGINE_SOUNDS], engine_channels)
+        self.pool = [Channel(i) for i in range(reserved, reserved + pool_size)]
+        self.priorities = [0] * pool_size
+        self.started = [0] * pool_size
+
+    def get(self, path: str) -> Optional[Sound]:
+        if not self.enabled:
+            return None
+        sound = self.sounds.get(path)
+        if sound is None:
+            sound = load_sound(path)
+            self.sounds[path] = sound
+        return sound
+
+    def find_channel(self, priority: int) -> Optional[int]:
+        victim = None
+        for i, channel in enumerate(self.pool):
+            if not channel.get_busy():
+                return i
+            if self.priorities[i] > priority:
+                continue
+            # The least important sound goes first, the oldest of them
+            rank = self.priorities[i], self.started[i]
+            if victim is None or rank < (self.priorities[victim], self.started[victim]):
+                victim = i
+        return victim
+
+    def play(self, path: str, priority: int = 0) -> Optional[Channel]:
+        sound = self.get(path)
+        if sound is None:
+            return None
+        i = self.find_channel(priority)
+        if i is None:
+            self.dropped += 1
+            return None
+        self._played += 1
+        channel = self.pool[i]
+        channel.play(sound)
+        self.priorities[i] = priority
+        self.started[i] = self._played
+        return channel
+
+    def update_engine(self, rate: float) -> None:
+        if self.engine:
+            self.engine.update(rate)
+
+    def stop(self) -> None:
+        if self.enabled:
+            pygame.mixer.stop()
+
+
+_bank: Optional[SoundBank] = None
+
+
+def get_sound_bank() -> SoundBank:
+    global _bank
+    mixer_ready = pygame.mixer.get_init() is not None
+    if (
+        _bank is None
+        or _bank.enabled != mixer_ready
+        or (mixer_ready and pygame.mixer.get_num_channels() != _bank.channel_count)
+    ):
+        _bank = SoundBank()
+    return _bank
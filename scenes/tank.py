@@ -1,4 +1,7 @@
+from itertools import count
+from math import degrees
 from random import random
+from typing import Any, List, Sequence, Union
 
 import pygame
 from pygame.event import Event
@@ -6,46 +9,147 @@ from pygame.surface import Surface
 from pymunk import Vec2d
 
 from scenes.abstract import AbstractPymunkScene
+from scenes.ballistics import AimAssist, load_firing_table
+from scenes.broadphase import BROADPHASE_HASH
+from scenes.camera import ZOOM_STEP, Camera
+from scenes.collision import Layer, layer_filter
 from scenes.components.ball import Ball
 from scenes.components.bullet import Bullet
+from scenes.components.controller import Controller
 from scenes.components.rect import Rect
-from scenes.components.tank import Tank
+from scenes.components.tank import TANK_ASSETS, Tank
 from scenes.components.terrain import Terrain
-from scenes.utils import convert
+from scenes.input import get_pressed
+from scenes.resources import rotate_image
+from scenes.sound import get_sound_bank
+from scenes.utils import ScreenTransform, to_transform
 from scenes.components.explosion import Explosion
+from scenes.dirty import Sprite, get_sprite
+
+DUCK_IMAGE = "./scenes/assets/rubber_duck.png"
+EXPLOSION_IMAGE = "./scenes/assets/explosion_tiles.png"
+# Pygame also reports the wheel as clicks of these buttons, the zoom reads the MOUSEWHEEL events
+WHEEL_BUTTONS = (pygame.BUTTON_WHEELUP, pygame.BUTTON_WHEELDOWN)
 
 
 class Duck(Ball):
-    image = pygame.image.load("./scenes/assets/rubber_duck.png")
+    __slots__ = ()
+
+    def render(self, display: Surface, camera_shift: Union[Vec2d, ScreenTransform] = Vec2d(0, 0)) -> pygame.Rect:
+        t = to_transform(display, camera_shift)
+        s = rotate_image(DUCK_IMAGE, t.scale, degrees(self.body.angle))
+        dest = s.get_rect(center=t.point(self.body.position))
+        return display.blit(s, dest)
+
 
-    def render(self, display: Surface, camera_shift: Vec2d = Vec2d(0, 0)) -> None:
-        s = pygame.transform.rotate(self.image, self.body.angle)
-        dest = s.get_rect(center=convert(self.body.position, display.get_height()) + camera_shift)
-        display.blit(s, dest)
+# The player tank uses the group 1
+TANK_GROUP_BASE = 16
+
+CAMERA_SMOOTHING = 0.15
+# Terrain is generated up to this far (in pixels) from the right edge of the view
+TERRAIN_LOOKAHEAD = -200
 
 
 class TankScene(AbstractPymunkScene):
     tank: Tank
+    extra_tanks: List[Tank]
     floor: Terrain
     explosion: Explosion
 
+    assets = (*TANK_ASSETS, DUCK_IMAGE, EXPLOSION_IMAGE)
+    budgets = {Duck: 64, Bullet: 128}
+    despawn_types = (Ball, Rect)
+    # Hundreds of equally sized terrain and debris bricks, see `python -m scenes.broadphase`
+    broadphase_mode = BROADPHASE_HASH
+
     def reset_scene(self):
         super().reset_scene()
-        pygame.mixer.stop()
+        get_sound_bank().stop()
+        self.groups = count(TANK_GROUP_BASE)
+        self.extra_tanks = []
         self.tank = Tank(250, 360, self.space, debug=False)
-        self.floor = Terrain(Vec2d(0, 0), Vec2d(self.display.get_width(), 0), 100, 300, self.space)
-        self.explosion = Explosion("./scenes/assets/explosion_tiles.png", 64)
+        self.floor = self.create_terrain()
+        self.explosion = Explosion(EXPLOSION_IMAGE, 64)
         self.objects.extend((self.tank, self.floor, self.explosion))
+        table = load_firing_table()
+        if table is not None:
+            self.objects.append(AimAssist(table, self.tank, self.seed))
+        # The player's tank stays where it was spawned on the screen
+        self.camera.anchor_x = self.tank.initial_x
+        self.camera.follow(self.tank.initial_x)
+        self.camera.snap()
+
+    def create_camera(self) -> Camera:
+        return Camera(self.display.get_rect(), smoothing=CAMERA_SMOOTHING)
+
+    def create_terrain(self) -> Terrain:
+        return Terrain(Vec2d(0, 0), Vec2d(self.display.get_width(), 0), 100, 300, self.space, seed=self.seed)
+
+    def get_tanks(self) -> Sequence[Tank]:
+        return (self.tank, *self.extra_tanks)
+
+    def add_tank(self, controller: Controller) -> Tank:
+        """
+        Adds a tank driven by the given controller next to the player's one.
+        """
+        x = self.tank.tank_base.body.position.x + 300 * (len(self.extra_tanks) + 1)
+        tank = Tank(x, 360, self.space, controller=controller, group=next(self.groups), engine_sound=False)
+        self.extra_tanks.append(tank)
+        self.objects.append(tank)
+        return tank
+
+    def get_rewind_state(self) -> Any:
+        tanks = tuple(tank.get_state() for tank in self.get_tanks())
+        return super().get_rewind_state(), self.floor.get_state(), tanks, self.explosion.get_state()
+
+    def set_rewind_state(self, state: Any) -> None:
+        base, floor, tanks, explosion = state
+        super().set_rewind_state(base)
+        self.floor.set_state(floor)
+        for tank, tank_state in zip(self.get_tanks(), tanks):
+            tank.set_state(tank_state)
+        self.explosion.set_state(explosion)
+
+    def get_static_key(self) -> Any:
+        return self.floor, self.floor.revision
+
+    def render_static(self, display: Surface, t: ScreenTransform) -> None:
+        super().render_static(display, t)
+        self.floor.render_columns(display, t)
+
+    def get_sprites(self, t: ScreenTransform) -> List[Sprite]:
+        # The settled terrain is on the static layer, under the tanks
+        sprites: List[Sprite] = [(self.floor, self.floor.get_debris_pose(t), self.floor.render_debris)]
+        sprites.extend(get_sprite(obj, t) for obj in self.objects if obj is not self.floor)
+        return sprites
 
     def update(self):
+        if self.rewind.paused:
+            return
+        bullets = [obj for obj in self.objects if isinstance(obj, Bullet)]
+        for bullet in bullets:
+            bullet.begin_step()
         super().update()
-        self.camera_shift = self.tank.get_camera_shift()
-        self.floor.update(self.camera_shift)
-        self.tank.update()
+        self.sweep_bullets(bullets)
+        self.camera.follow(self.tank.tank_base.body.position.x)
+        self.camera.update()
+        self.floor.update(self.camera_shift, self.camera.get_visible_width() + TERRAIN_LOOKAHEAD)
+        self.update_tanks()
         self.update_bullets()
-        self.update_balls()
         self.explosion.update()
-        self.handle_pressed(pygame.key.get_pressed())
+        self.handle_pressed(get_pressed())
+
+    def update_tanks(self):
+        for tank in self.get_tanks():
+            if tank.update().fire:
+                self.fire(tank)
+
+    def sweep_bullets(self, bullets: List[Bullet]) -> None:
+        """
+        Stops the bullets that hit something during the last step where they hit it, see `Bullet.sweep`.
+        """
+        for bullet in bullets:
+            bullet.sweep(self.space)
 
     def update_bullets(self):
         for obj in self.objects:
@@ -57,43 +161,49 @@ class TankScene(AbstractPymunkScene):
                 self.objects.remove(bullet)
                 continue
             if bullet.ready_to_explode(self.space):
-                self.tank.sound_effects.explosion.play()
+                self.tank.sound_effects.play_explosion()
                 self.floor.detach_tops(bullet.body.position, 30)
                 bullet.explode(self.space)
                 self.objects.remove(bullet)
 
-    def update_balls(self):
-        for obj in self.objects:
-            if type(obj) in (
-                Ball,
-                Rect,
-                Bullet,
-            ):
-                if obj.body.position.y < 0:
-                    self.space.remove(obj.body, obj.shape)
-                    self.objects.remove(obj)
-                    print(f"Obj {type(obj)} is removed")
-
     def handle_pressed(self, keys) -> None:
         pass
 
+    def fire(self, tank: Tank) -> None:
+        if self.explosion.active:
+            return
+        bullet = tank.shot()
+        self.explosion.play(bullet.body.position)
+        self.objects.append(bullet)
+
     def handle_event(self, event: Event) -> None:
+        if self.handle_rewind_event(event) or self.rewind.paused:
+            return
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_r:
                 self.reset_scene()
 
             if event.key == pygame.K_SPACE:
-                if not self.explosion.active:
-                    bullet = self.tank.shot()
-                    self.explosion.play(convert(bullet.body.position, self.display.get_height()))
-                    self.objects.append(bullet)
-
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            h = self.display.get_height()
-            pos = Vec2d(*event.pos) - self.camera_shift
-            obj = Duck(*convert(pos, h), 15, self.space, color=(55, 252, 10))
+                self.fire(self.tank)
+
+            if event.key == pygame.K_t:
+                for obj in self.objects:
+                    if isinstance(obj, AimAssist):
+                        obj.enabled = not obj.enabled
+
+            if event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                self.camera.zoom_by(1 / ZOOM_STEP)
+            if event.key in (pygame.K_EQUALS, pygame.K_KP_PLUS):
+                self.camera.zoom_by(ZOOM_STEP)
+
+        if event.type == pygame.MOUSEWHEEL:
+            self.camera.zoom_by(ZOOM_STEP**event.y)
+
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button not in WHEEL_BUTTONS:
+            obj = Duck(*self.camera.to_world(event.pos), 15, self.space, color=(55, 252, 10))
             obj.body.mass = 50000
             obj.shape.friction = 1
             obj.shape.density = 0.1
+            obj.shape.filter = layer_filter(Layer.PROP)
             obj.body.angle = 3.14 * random()
             self.objects.append(obj)
@@ -1,5 +1,9 @@
 from typing import List, Sequence, Tuple, Union
 
+import numpy as np
+import pygame
+from pygame.surface import Surface
+from pymunk import Body
 from pymunk.vec2d import Vec2d
 
 
@@ -36,3 +40,103 @@ def get_width(verts: Sequence[Vec2d]) -> int:
 def get_height(verts: Sequence[Vec2d]) -> int:
     _, ys = unpack_coords(verts)
     return max(ys) - min(ys)
+
+
+# Levels of detail: everything is drawn in full, or cheaper stand-ins are drawn when zoomed out
+LOD_FULL = 0
+LOD_REDUCED = 1
+
+
+class ScreenTransform:
+    """
+    Affine map from world coordinates to screen pixels: shift by the camera, scale and flip the y axis.
+    The array methods apply it to whole vertex arrays at once and truncate like `convert`.
+    """
+
+    __slots__ = ("screen_h", "shift_x", "shift_y", "scale", "lod")
+
+    def __init__(
+        self,
+        screen_h: int,
+        shift: Union[Tuple[float, float], Vec2d] = (0, 0),
+        scale: float = 1,
+        lod: int = LOD_FULL,
+    ) -> None:
+        self.screen_h = screen_h
+        self.shift_x, self.shift_y = shift
+        self.scale = scale
+        self.lod = lod
+
+    @property
+    def shift(self) -> Vec2d:
+        return Vec2d(self.shift_x, self.shift_y)
+
+    def point(self, vector: Union[Tuple[float, float], Vec2d]) -> Tuple[int, int]:
+        x, y = vector
+        return int((x + self.shift_x) * self.scale), self.screen_h - int((y + self.shift_y) * self.scale)
+
+    def world_x(self, screen_x: float) -> float:
+        return screen_x / self.scale - self.shift_x
+
+    def points(self, points: np.ndarray) -> np.ndarray:
+        """
+        :param points: World coordinates of shape (..., 2)
+        :return: Integer screen coordinates of the same shape
+        """
+        out = np.empty(points.shape, dtype=np.int32)
+        out[..., 0] = ((points[..., 0] + self.shift_x) * self.scale).astype(np.int32)
+        out[..., 1] = self.screen_h - ((points[..., 1] + self.shift_y) * self.scale).astype(np.int32)
+        return out
+
+    def bodies(self, positions: np.ndarray, angles: np.ndarray, local: np.ndarray) -> np.ndarray:
+        """
+        Transforms the local vertices of many bodies in one pass.
+
+        :param positions: Body positions, (M, 2)
+        :param angles: Body angles, (M,)
+        :param local: Local vertices, (M, K, 2) or (K, 2) when all the bodies share them
+        :return: Screen coordinates, (M, K, 2)
+        """
+        cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+        lx, ly = local[..., 0], local[..., 1]
+        world = np.empty((len(positions),) + local.shape[-2:], dtype=np.float64)
+        world[..., 0] = lx * cos - ly * sin + positions[:, 0:1]
+        world[..., 1] = lx * sin + ly * cos + positions[:, 1:2]
+        return self.points(world)
+
+    def body(self, body: Body, local: Sequence[Tuple[float, float]]) -> List[List[int]]:
+        positions = np.array((body.position,), dtype=np.float64)
+        angles = np.array((body.angle,), dtype=np.float64)
+        return self.bodies(positions, angles, np.asarray(local, dtype=np.float64))[0].tolist()
+
+
+def to_transform(display: Surface, camera_shift: Union[Vec2d, ScreenTransform]) -> ScreenTransform:
+    """
+    Renderers receive either a plain camera shift or a transform prepared by the scene.
+    """
+    if isinstance(camera_shift, ScreenTransform):
+        return camera_shift
+    return ScreenTransform(display.get_height(), camera_shift)
+
+
+def body_arrays(bodies: Sequence[Body]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Positions (M, 2) and angles (M,) of the bodies.
+    """
+    positions = np.array([b.position for b in bodies], dtype=np.float64).reshape(len(bodies), 2)
+    angles = np.fromiter((b.angle for b in bodies), dtype=np.float64, count=len(bodies))
+    return positions, angles
+
+
+def plot_points(display: Surface, points: np.ndarray, color: Tuple[int, int, int]) -> None:
+    """
+    Sets single pixels at the given screen coordinates, (N, 2), skipping the ones outside the surface.
+    """
+    width, height = display.get_size()
+    xs, ys = points[:, 0], points[:, 1]
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    if not inside.any():
+        return
+    pixels = pygame.surfarray.pixels2d(display)
+    pixels[xs[inside], ys[inside]] = display.map_rgb(color)
+    del pixels
@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+from logging import getLogger
+from queue import Queue, SimpleQueue
+from typing import Any, Callable, Optional, Tuple
+
+log = getLogger()
+
+Job = Callable[[], Any]
+
+
+class BackgroundWorker:
+    """
+    A thread that runs jobs off the main thread and hands their results back through the queue
+    given with every job, which the main thread drains between frames. Jobs must not touch the
+    pymunk space or anything the main thread changes meanwhile, they get copies of what they need.
+    """
+
+    def __init__(self, name: str = "background-worker") -> None:
+        self.queue: "Queue[Optional[Tuple[Job, SimpleQueue, Any]]]" = Queue()
+        self.thread = threading.Thread(target=self.work, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, job: Job, results: SimpleQueue, failed: Any = None) -> None:
+        """
+        :param failed: Handed back instead of the result when the job raises, None hands back nothing
+        """
+        self.queue.put((job, results, failed))
+
+    def work(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            job, results, failed = item
+            try:
+                results.put(job())
+            except Exception as e:
+                log.warning(f"Background job {job} failed: {e}")
+                if failed is not None:
+                    results.put(failed)
+            # Hands the GIL back to the main thread after every job, instead of after the switch interval
+            time.sleep(0)
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+
+
+_worker: Optional[BackgroundWorker] = None
+_worker_pid = 0
+_lock = threading.Lock()
+
+
+def get_worker() -> BackgroundWorker:
+    """
+    The worker of this process, started on first use. A forked process starts its own, the
+    thread of the parent doesn't exist in the child.
+    """
+    global _worker, _worker_pid
+    with _lock:
+        if _worker is None or _worker_pid != os.getpid():
+            _worker = BackgroundWorker()
+            _worker_pid = os.getpid()
+        return _worker
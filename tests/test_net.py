@@ -0,0 +1,105 @@
+import asyncio
+import random
+
+from scenes.components.controller import TankCommand
+from scenes.net import (
+    MOVE,
+    POS_SCALE,
+    R_MOVE,
+    R_SPAWN,
+    R_TERRAIN,
+    R_TERRAIN_RANGE,
+    SHAPE_POLY,
+    SPAWN,
+    TERRAIN,
+    TERRAIN_RANGE,
+    VERTEX,
+    StateClient,
+    StateReplicator,
+    StateServer,
+    dequantize,
+    packetize,
+    quantize,
+)
+from scenes.tank import TankScene
+
+TICKS = 30
+
+
+def test_records_round_trip():
+    client = StateClient(port=9)
+    try:
+        verts = [(-10, -5), (10, -5), (10, 5), (-10, 5)]
+        spawn = SPAWN.pack(R_SPAWN, 7, SHAPE_POLY, 1, 2, 3, len(verts)) + b"".join(VERTEX.pack(*v) for v in verts)
+        transform = (1234, -5678, 4321)
+        records = [
+            spawn,
+            MOVE.pack(R_MOVE, 7, *transform),
+            TERRAIN_RANGE.pack(R_TERRAIN_RANGE, 10, 12),
+            *(TERRAIN.pack(R_TERRAIN, column, -column * 3) for column in range(10, 13)),
+        ]
+        for packet in packetize(5, records):
+            client.apply(packet)
+    finally:
+        client.close()
+
+    entity = client.entities[7]
+    assert (entity.kind, entity.verts, entity.color) == (SHAPE_POLY, verts, (1, 2, 3))
+    assert entity.current == dequantize(transform)
+    assert client.terrain_range == (10, 12)
+    assert client.terrain == {10: -30, 11: -33, 12: -36}
+    assert client.tick == 5
+
+
+def test_scene_round_trip(display):
+    random.seed(1)
+    scene = TankScene(display, 60, seed=1)
+    replicator = StateReplicator(scene)
+    _, full = replicator.collect()
+    client = StateClient(port=9)
+    try:
+        for packet in packetize(1, full):
+            client.apply(packet)
+    finally:
+        client.close()
+
+    assert set(client.entities) == set(replicator.ids.values())
+    for body, i in replicator.ids.items():
+        x, y, _ = client.entities[i].current
+        assert abs(x - body.position.x) <= 1 / POS_SCALE
+        assert abs(y - body.position.y) <= 1 / POS_SCALE
+        assert client.entities[i].current == dequantize(quantize(body))
+    assert client.terrain == replicator.terrain
+
+
+def test_loopback_bytes_and_tick_time(display):
+    random.seed(1)
+    scene = TankScene(display, 60, seed=1)
+    server = StateServer(scene, port=0)
+
+    async def run() -> StateClient:
+        await server.start()
+        client = StateClient(server.host, server.port)
+        await asyncio.sleep(0.05)
+        for n in range(TICKS):
+            scene.update()
+            server.tick()
+            await asyncio.sleep(0)
+            client.receive()
+            client.send_input(TankCommand(1, 0, False))
+        await asyncio.sleep(0.05)
+        client.receive()
+        client.close()
+        server.close()
+        return client
+
+    client = asyncio.run(run())
+    stats = server.stats
+    assert stats.ticks == TICKS
+    assert stats.packets_sent >= TICKS
+    # The first tick sends the whole state, the others only what moved
+    bytes_per_tick = stats.get_bytes_per_tick(1)
+    assert 0 < bytes_per_tick < 2 * 1024
+    assert client.bytes_received == stats.bytes_sent
+    assert 0 < stats.get_tick_time() < 0.05
+    assert client.focus is not None and client.focus in client.entities
@@ -0,0 +1,55 @@
+import random
+
+import pygame
+from pygame.event import Event
+
+from scenes.input import LiveInput, set_source
+from scenes.replay import InputRecorder, InputReplay, ReplayHeader
+from scenes.tank import TankScene
+
+FRAMES = 90
+SEED = 7
+# Frame, event posted before it
+EVENTS = [
+    (10, Event(pygame.MOUSEWHEEL, x=0, y=-1, flipped=False)),
+    (20, Event(pygame.MOUSEWHEEL, x=0, y=-2, flipped=False)),
+    (30, Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(900, 200))),
+    (60, Event(pygame.MOUSEWHEEL, x=0, y=1, flipped=False)),
+]
+
+
+def play(display, source, post: bool = False) -> TankScene:
+    set_source(source)
+    random.seed(SEED)
+    scene = TankScene(display, 60, seed=SEED)
+    pending = list(EVENTS) if post else []
+    for frame in range(FRAMES):
+        while pending and pending[0][0] == frame:
+            pygame.event.post(pending.pop(0)[1])
+        for event in source.poll():
+            scene.handle_event(event)
+        scene.update()
+    return scene
+
+
+def test_replay_reproduces_zoom(display, tmp_path):
+    path = str(tmp_path / "zoom.log")
+    pygame.event.clear()
+    recorder = InputRecorder(path, ReplayHeader(SEED, SEED, 60, display.get_size()))
+    try:
+        recorded = play(display, recorder, post=True)
+    finally:
+        recorder.close()
+    replay = InputReplay(path)
+    try:
+        replayed = play(display, replay)
+    finally:
+        replay.close()
+        set_source(LiveInput())
+
+    assert recorded.camera.target_zoom != 1
+    assert replayed.camera.get_state() == recorded.camera.get_state()
+    # The zoom decides how far ahead the terrain is generated
+    assert len(replayed.floor.bricks) == len(recorded.floor.bricks)
+    assert replayed.floor.bricks[-1].top_position == recorded.floor.bricks[-1].top_position
+    assert len(replayed.objects) == len(recorded.objects)